@@ -0,0 +1,159 @@
+"""
+Minimal futures and a thread pool to resolve them, modelled on the
+concurrent.futures API.
+"""
+import Queue
+import os
+import sys
+import threading
+
+class Future(object):
+    """
+    The result of a call that may not have finished yet.
+
+    Callbacks added with add_done_callback are run with the future as their
+    only argument once it completes, or immediately if it already has.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    @classmethod
+    def completed(cls, result):
+        """Return a future that already holds result"""
+        future = cls()
+        future.set_result(result)
+        return future
+
+    @classmethod
+    def failed(cls, exc_info):
+        """Return a future that already holds the exception in exc_info"""
+        future = cls()
+        future.set_exc_info(exc_info)
+        return future
+
+    def _complete(self):
+        with self._lock:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._complete()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._complete()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait up to timeout seconds for the result.  Raises the exception of a
+        failed call, or a RuntimeError on timeout.
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for result")
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait up to timeout seconds and return the exception raised, if any"""
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for result")
+        if self._exc_info:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+def call(func, *args):
+    """Run func now and return a completed future holding its outcome"""
+    try:
+        return Future.completed(func(*args))
+    except:
+        return Future.failed(sys.exc_info())
+
+def chain(future, func, errback=None):
+    """
+    Return a future for func applied to the result of future.  A failure of
+    either is passed on, unless errback is given: a failure of future is then
+    passed to errback and the returned future holds its outcome instead.
+    func and errback run on whichever thread completes future.
+    """
+    result = Future()
+    def on_done(f):
+        try:
+            if not f._exc_info:
+                result.set_result(func(f._result))
+            elif errback is not None:
+                result.set_result(errback(f._exc_info[1]))
+            else:
+                result.set_exc_info(f._exc_info)
+        except:
+            result.set_exc_info(sys.exc_info())
+    future.add_done_callback(on_done)
+    return result
+
+class Executor(object):
+    """
+    A fixed size pool of daemon threads that run submitted calls.
+
+    The threads do not survive a fork, so a child process that submits a
+    call starts a pool of its own.
+    """
+    def __init__(self, num_threads=4):
+        self.num_threads = num_threads
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = Queue.Queue()
+        self._threads = []
+        for i in range(self.num_threads):
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, func, args = item
+            try:
+                result = func(*args)
+            except:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+    def submit(self, func, *args):
+        """Schedule func(*args) and return a future for its result"""
+        if self._pid != os.getpid():
+            self._start()
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the threads once the queued calls have run"""
+        for t in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -0,0 +1,165 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+# sentinel for missing entries
+_MISSING = object()
+
+class CacheStats(object):
+    """
+    Hit, miss and eviction counters for one or more caches.
+
+    A single instance may be shared by several caches (such as the per
+    subject caches of a client) to report them as one.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def to_dict(self):
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'evictions' : self.evictions,
+            'expirations' : self.expirations
+        }
+
+    def __repr__(self):
+        return "CacheStats(%s)" % (self.to_dict())
+
+class LRUCache(object):
+    """
+    A thread safe dictionary bounded by entry count and estimated size.
+
+    When either max_size entries or max_bytes (as measured by the sizeof
+    callable) is exceeded, the least recently used entries are evicted.
+    If ttl is set, entries older than ttl seconds are treated as missing.
+    Expired entries are kept until they are evicted or replaced and can still
+    be read with get_stale().  A limit of None means unbounded.
+
+    get() and item access count as a hit or a miss and mark the entry as
+    recently used.  Membership tests do neither.
+    """
+    def __init__(self, max_size=None, max_bytes=None, ttl=None, sizeof=None, stats=None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.stats = stats or CacheStats()
+        self.total_bytes = 0
+
+        self._lock = threading.RLock()
+        # key => (value, size, time added)
+        self._data = OrderedDict()
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry[2] > self.ttl
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self.total_bytes -= entry[1]
+        return entry
+
+    def _evict(self):
+        while self._data and ((self.max_size is not None and len(self._data) > self.max_size) or
+                              (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.stats.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return default
+            if self._expired(entry, time.time()):
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+            # mark as most recently used
+            del self._data[key]
+            self._data[key] = entry
+            self.stats.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """
+        Return the value of an entry even if it has expired.  This neither
+        counts as a hit or a miss nor marks the entry as recently used.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[0]
+
+    def __getitem__(self, key):
+        result = self.get(key, _MISSING)
+        if result is _MISSING:
+            raise KeyError(key)
+        return result
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, size=None):
+        """
+        Add or replace an entry.  size overrides the size computed by the
+        sizeof callable.
+        """
+        if size is None:
+            size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.time())
+            self.total_bytes += size
+            self._evict()
+
+    def setdefault(self, key, value):
+        """Add value if key is not present and return the cached value"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and not self._expired(entry, time.time()):
+                return entry[0]
+            self[key] = value
+            return value
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry, time.time())
+
+    def __len__(self):
+        return len(self._data)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        with self._lock:
+            return [ (k, e[0]) for k, e in self._data.items() ]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __repr__(self):
+        return "LRUCache(size=%d, bytes=%d, %s)" % (len(self._data), self.total_bytes, self.stats)
@@ -0,0 +1,121 @@
+import bisect
+import threading
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Metrics(object):
+    """
+    Hooks called by a CachedSchemaRegistryClient as it works.
+
+    This default implementation does nothing.  Subclass it and override the
+    hooks of interest to feed a metrics system.  Hooks are called on the
+    thread doing the work, so they must be thread safe and quick.
+    """
+    def cache_hit(self, cache):
+        """A lookup was answered from the named cache"""
+        pass
+
+    def cache_miss(self, cache):
+        """A lookup missed the named cache"""
+        pass
+
+    def request(self, endpoint, method, code, seconds, bytes_sent, bytes_received):
+        """
+        An HTTP request to the registry at endpoint finished with code after
+        seconds.  code is -1 if no response was received.
+        """
+        pass
+
+    def schema_parsed(self, seconds):
+        """A schema string was parsed in seconds"""
+        pass
+
+class Histogram(object):
+    """A count of observations per bucket with their sum and maximum"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # the last count is for observations above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        bounds = list(self.buckets) + ['+inf']
+        return {
+            'buckets' : dict(zip(bounds, self.counts)),
+            'count' : self.count,
+            'sum' : self.sum,
+            'max' : self.max
+        }
+
+class InMemoryMetrics(Metrics):
+    """
+    Metrics kept in memory, for tests, debugging or periodic export.
+
+    snapshot() returns a copy of everything recorded so far.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # cache name => count
+            self.hits = { }
+            self.misses = { }
+            # (endpoint, method) => Histogram
+            self.latencies = { }
+            # http code => count of errors
+            self.errors = { }
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.parse_time = Histogram(self.buckets)
+
+    def cache_hit(self, cache):
+        with self._lock:
+            self.hits[cache] = self.hits.get(cache, 0) + 1
+
+    def cache_miss(self, cache):
+        with self._lock:
+            self.misses[cache] = self.misses.get(cache, 0) + 1
+
+    def request(self, endpoint, method, code, seconds, bytes_sent, bytes_received):
+        with self._lock:
+            key = (endpoint, method)
+            histogram = self.latencies.get(key)
+            if histogram is None:
+                histogram = self.latencies[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+            if code == -1 or code >= 400:
+                self.errors[code] = self.errors.get(code, 0) + 1
+
+    def schema_parsed(self, seconds):
+        with self._lock:
+            self.parse_time.observe(seconds)
+
+    def snapshot(self):
+        """Return a dict of all the metrics recorded"""
+        with self._lock:
+            return {
+                'cache_hits' : dict(self.hits),
+                'cache_misses' : dict(self.misses),
+                'latency' : dict((key, h.to_dict()) for key, h in self.latencies.items()),
+                'errors' : dict(self.errors),
+                'bytes_sent' : self.bytes_sent,
+                'bytes_received' : self.bytes_received,
+                'parse_time' : self.parse_time.to_dict()
+            }
+
+# shared default that records nothing
+NO_METRICS = Metrics()
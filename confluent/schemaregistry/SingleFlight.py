@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+
+class _Call(object):
+    """An in flight call and its outcome"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls that share a key.
+
+    The first thread to call do() for a key runs the function.  Threads that
+    call do() with the same key while it is running wait for it to finish
+    and receive the same result, or have the same exception raised.
+
+    Calls in flight when the process forks are forgotten by the child, as
+    they will never finish there.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = { }
+        self._pid = os.getpid()
+
+    def do(self, key, func, *args):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._calls = { }
+                self._pid = os.getpid()
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result
+
+        try:
+            call.result = func(*args)
+            return call.result
+        except:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """Return the number of calls currently running"""
+        with self._lock:
+            return len(self._calls)
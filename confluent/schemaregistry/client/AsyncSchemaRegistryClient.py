@@ -0,0 +1,101 @@
+import time
+
+from .CachedSchemaRegistryClient import CachedSchemaRegistryClient
+from ..Futures import Executor, Future
+
+class AsyncSchemaRegistryClient(object):
+    """
+    A non blocking counterpart of CachedSchemaRegistryClient.
+
+    Every method returns a Future instead of a result.  Lookups that hit the
+    cache return an already completed future without leaving the calling
+    thread.  Misses are sent by a small pool of I/O threads over the shared
+    pool of keep-alive connections, so the caller (typically an event loop)
+    never waits on the network and can attach a callback or poll instead.
+
+    The underlying blocking client is available as the client attribute and
+    shares its caches with this one.
+    """
+    def __init__(self, url, num_threads=4, **kwargs):
+        """
+        Construct a client by passing in the base URL of the schema registry
+        server.  num_threads requests may be in flight at once; any other
+        keyword arguments are passed to CachedSchemaRegistryClient.
+        """
+        self.client = CachedSchemaRegistryClient(url, **kwargs)
+        self.executor = Executor(num_threads)
+
+    def close(self):
+        """Stop the I/O threads and close idle connections"""
+        self.executor.shutdown()
+        self.client.close()
+
+    def register(self, subject, avro_schema):
+        """
+        Register a schema with the registry under the given subject.
+        The future holds the schema id.
+        """
+        client = self.client
+        schema_id = client._get_from_cache(client.subject_to_schema_ids, subject, avro_schema, -1)
+        if schema_id != -1:
+            return Future.completed(schema_id)
+        return self.executor.submit(client.register, subject, avro_schema)
+
+    def get_by_id(self, schema_id):
+        """
+        The future holds the parsed avro schema with the given id or None if
+        not found.
+        """
+        schema = self.client.id_to_schema.get(schema_id)
+        if schema is not None:
+            return Future.completed(schema)
+        return self.executor.submit(self.client.get_by_id, schema_id)
+
+    def get_latest_schema(self, subject):
+        """
+        The future holds the latest 3-tuple of:
+        (the schema id, the parsed avro schema, the schema version)
+        for a particular subject, or (None,None,None) if not found.
+        """
+        client = self.client
+        if client.latest_schema_ttl is not None:
+            cached = client.subject_to_latest_schema.get(subject)
+            if cached is not None and time.time() - cached[1] <= client.latest_schema_ttl:
+                client._latest_in_use.add(subject)
+                client.metrics.cache_hit('subject_to_latest_schema')
+                return Future.completed(cached[0])
+        return self.executor.submit(client.get_latest_schema, subject)
+
+    def get_version(self, subject, avro_schema):
+        """
+        The future holds the version of a schema for a given subject or -1 if
+        not found.
+        """
+        client = self.client
+        version = client._get_from_cache(client.subject_to_schema_versions, subject, avro_schema, -1)
+        if version != -1:
+            return Future.completed(version)
+        return self.executor.submit(client.get_version, subject, avro_schema)
+
+    def test_compatibility(self, subject, avro_schema, version='latest', level=None):
+        """
+        The future holds whether a candidate parsed schema is compatible with
+        a version of the subject, by default the latest.  If level is given
+        the check is done locally, as CachedSchemaRegistryClient.test_compatibility.
+        """
+        return self.executor.submit(self.client.test_compatibility, subject, avro_schema,
+                                    version, level)
+
+    def update_compatibility(self, level, subject=None):
+        """
+        Update the compatibility level for a subject.  Level must be one of:
+
+        'NONE','FULL','FORWARD', or 'BACKWARD'
+        """
+        return self.executor.submit(self.client.update_compatibility, level, subject)
+
+    def get_compatibility(self, subject=None):
+        """
+        The future holds the current compatibility level for a subject.
+        """
+        return self.executor.submit(self.client.get_compatibility, subject)
@@ -1,8 +1,19 @@
-import urllib2
 import json
+import os
+import random
 import sys
+import threading
+import time
 
 from . import ClientError, VALID_LEVELS
+from .CircuitBreaker import CircuitBreaker
+from .Compatibility import CompatibilityChecker
+from .EndpointRouter import EndpointRouter
+from .SchemaStore import SchemaStore
+from ..LRUCache import LRUCache, CacheStats
+from ..Metrics import NO_METRICS
+from ..Futures import Executor
+from ..SingleFlight import SingleFlight
 from ..serializers import Util
 
 # Common accept header sent
@@ -15,79 +26,342 @@ class CachedSchemaRegistryClient(object):
     See http://confluent.io/docs/current/schema-registry/docs/intro.html
 
     Errors communicating to the server will result in a ClientError being raised.
+
+    A client is safe to share between threads.  Concurrent lookups that miss
+    the cache for the same key send a single request and share its result.
     """
-    def __init__(self, url, max_schemas_per_subject=1000):
-        """Construct a client by passing in the base URL of the schema registry server"""
+    def __init__(self, url, max_schemas_per_subject=1000, pool_size=10, idle_timeout=60,
+                 max_subjects=None, max_schemas=None, max_schema_bytes=None, cache_ttl=None,
+                 latest_schema_ttl=None, latest_schema_refresh=None,
+                 cache_path=None, store_revalidate=300, cache_read_only=False,
+                 hedge_percentile=None, unhealthy_period=30,
+                 negative_cache_ttl=None, max_negative_entries=10000,
+                 request_timeout=30, request_budget=None, max_retries=2, retry_backoff=0.1,
+                 breaker_threshold=5, breaker_reset=30, metrics=None):
+        """
+        Construct a client by passing in the base URL of the schema registry server,
+        or a list of URLs of its replicas.
+
+        Requests are sent over a pool of persistent connections.  pool_size is the
+        maximum number of idle connections kept open and idle_timeout the number of
+        seconds an idle connection may be reused for.
+
+        With several replicas, writes go to the first URL and reads to the healthy
+        replica with the lowest observed latency.  A replica that fails is skipped
+        for unhealthy_period seconds.  If hedge_percentile is set, a read slower
+        than that percentile of the replica's recent latencies is also sent to the
+        next replica and the first answer is used.  See EndpointRouter.
+
+        Cached lookups are evicted least recently used first.  At most
+        max_schemas_per_subject schemas are cached for each of at most max_subjects
+        subjects, and at most max_schemas parsed schemas with an estimated size of
+        max_schema_bytes are kept by id.  If cache_ttl is set, entries older than
+        that many seconds are fetched again.  A limit of None means unbounded.
+
+        If latest_schema_ttl is set, get_latest_schema answers from a cache that is
+        at most that many seconds stale.  A background thread refetches the latest
+        schema of subjects in use every latest_schema_refresh seconds (by default
+        half the ttl) so readers rarely wait on the registry.
+
+        If cache_path is given, schemas are also written through to a persistent
+        store in that file which processes on the host can share.  Schemas by id
+        never change and are served from it without contacting the registry.  Subject
+        lookups are served from it for store_revalidate seconds after they were last
+        confirmed by the registry.  If cache_read_only is set, the store is only
+        read, for workers attached to a store that another process populates.
+
+        A client may be created before forking worker processes.  Each process
+        then opens its own connections and threads.  With a shared cache_path,
+        a schema fetched by any process is found by the others in the store
+        without contacting the registry.
+
+        If negative_cache_ttl is set, lookups the registry answered with not found
+        (unknown schema ids, subjects or versions) keep returning not found for that
+        many seconds without contacting the registry.  At most max_negative_entries
+        are remembered.  Registering a schema forgets those of its subject.
+
+        Each attempt to reach the registry times out after request_timeout seconds.
+        Connection errors, timeouts and server errors are retried up to max_retries
+        times after a random backoff of up to retry_backoff seconds, doubled after
+        each attempt.  If request_budget is set, a call gives up once that many
+        seconds have passed in total.  After breaker_threshold consecutive failures
+        a circuit breaker fails calls immediately for breaker_reset seconds.  While
+        the registry cannot be reached, lookups are answered from cached entries
+        even if they are stale or expired.
+
+        metrics is a Metrics instance told about cache hits and misses, requests
+        to the registry and schema parsing.  By default nothing is recorded.
+        """
 
-        self.url = url.rstrip('/')
+        self.metrics = metrics or NO_METRICS
+        self.router = EndpointRouter(url, pool_size, idle_timeout, hedge_percentile,
+                                     unhealthy_period, metrics=self.metrics)
+        # the primary replica
+        self.url = self.router.primary.url
+        self.pool = self.router.primary.pool
 
         self.max_schemas_per_subject = max_schemas_per_subject
-        # subj => { schema => id }
-        self.subject_to_schema_ids = { }
+        self.cache_ttl = cache_ttl
+        # subj => { schema full fingerprint => id }
+        self.subject_to_schema_ids = LRUCache(max_subjects, ttl=cache_ttl)
         # id => avro_schema
-        self.id_to_schema = {}
-        # subj => { schema => version }
-        self.subject_to_schema_versions = {}
-
-    def _send_request(self, url, method='GET', body=None, headers=None):
+        self.id_to_schema = LRUCache(max_schemas, max_schema_bytes, cache_ttl,
+                                     sizeof=Util.schema_size)
+        # subj => { schema full fingerprint => version }
+        self.subject_to_schema_versions = LRUCache(max_subjects, ttl=cache_ttl)
+        # subj => sorted list of its versions, which other clients may add to,
+        # so it is kept for latest_schema_ttl like the latest schema
+        self.subject_to_versions = LRUCache(max_subjects, ttl=latest_schema_ttl)
+        # counters shared by all the per subject caches
+        self.subject_ids_stats = CacheStats()
+        self.subject_versions_stats = CacheStats()
+        # coalesces concurrent requests for the same schema
+        self._flights = SingleFlight()
+
+        self.latest_schema_ttl = latest_schema_ttl
+        self.latest_schema_refresh = latest_schema_refresh
+        if latest_schema_refresh is None and latest_schema_ttl is not None:
+            self.latest_schema_refresh = latest_schema_ttl / 2.0
+        # subj => ((id, schema, version), time fetched)
+        # also kept without latest_schema_ttl as the last known answer
+        self.subject_to_latest_schema = LRUCache(max_subjects)
+        # subjects read since their last refresh
+        self._latest_in_use = set()
+        self._refresher = None
+        self._refresher_pid = None
+        self._refresher_lock = threading.Lock()
+        self._stop_refresh = threading.Event()
+
+        self.store = SchemaStore(cache_path, read_only=cache_read_only) if cache_path else None
+        self.store_revalidate = store_revalidate
+
+        self.request_timeout = request_timeout
+        self.request_budget = request_budget
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+        # lookup key => True for lookups that were not found
+        self.negative_cache = None
+        if negative_cache_ttl is not None:
+            self.negative_cache = LRUCache(max_negative_entries, ttl=negative_cache_ttl)
+
+        self.compatibility_checker = CompatibilityChecker()
+
+    def _send_request(self, path, method='GET', body=None, headers=None, write=False):
         if body:
             body = json.dumps(body)
 
-        new_req = urllib2.Request(url, data=body)
-        # must be callable
-        new_req.get_method = lambda: method
         # set the accept header
-        new_req.add_header("Accept",ACCEPT_HDR)
+        req_headers = { "Accept" : ACCEPT_HDR }
         if body:
-            new_req.add_header("Content-Length",str(len(body)))
-            new_req.add_header("Content-Type","application/json")
+            req_headers["Content-Length"] = str(len(body))
+            req_headers["Content-Type"] = "application/json"
         # add additional headers if present
         if headers:
-            for header_name in headers:
-                new_req.add_header(header_name, headers[header_name])
+            req_headers.update(headers)
+
+        deadline = None
+        if self.request_budget is not None:
+            deadline = time.time() + self.request_budget
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ClientError("Circuit breaker open: schema registry is unavailable")
+            timeout = self.request_timeout
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ClientError("Request budget of %.3fs exceeded" % (self.request_budget))
+                timeout = min(timeout, remaining) if timeout else remaining
+
+            try:
+                outcome = self._request_once(method, path, body, req_headers, write, timeout)
+            except ClientError as e:
+                # the registry answered - no point retrying
+                self.breaker.record_success()
+                raise e
+            if not isinstance(outcome, ClientError):
+                self.breaker.record_success()
+                return outcome
+            error = outcome
+
+            self.breaker.record_failure()
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            # full jitter backoff
+            backoff = random.uniform(0, self.retry_backoff * (2 ** (attempt - 1)))
+            if deadline is not None and time.time() + backoff >= deadline:
+                raise error
+            time.sleep(backoff)
+
+    def _request_once(self, method, path, body, headers, write, timeout):
+        """
+        Send a request and return the (result, meta, code) of a success, raise
+        a ClientError for a client error or return one for an error that is
+        worth retrying.
+        """
+        try:
+            code, meta, data = self.router.request(method, path, body, headers, write, timeout)
+        except:
+            msg = "An unexpected error occurred: %s" % (str(sys.exc_info()[1]))
+            return ClientError(msg)
         try:
-            response = urllib2.urlopen(new_req)
             # read response
-            result = json.loads(response.read())
-            # build meta with headers as a dict
-            meta = response.info().dict
-            # http code
-            code = response.getcode()
-            # return result + meta tuple
-            return (result, meta, code)
-        except urllib2.HTTPError as e:
-            code = e.code
-            result = json.loads(e.read())
-            message = "HTTP Error (%d) from schema registry: %s %d" % (code,
+            result = json.loads(data)
+        except ValueError:
+            if code < 400:
+                return ClientError("Received bad response from registry.")
+            result = { }
+
+        if code >= 400:
+            message = "HTTP Error (%d) from schema registry: %s %s" % (code,
                                                                        result.get('message'),
                                                                        result.get('error_code'))
+            if code >= 500:
+                return ClientError(message, code)
             raise ClientError(message, code)
-        except ClientError as e:
-            raise e
-        except:
-            msg = "An unexpected error occurred: %s" % (str(sys.exc_info()[1]))
-            raise ClientError(msg)
-
-    def _add_to_cache(self, cache, subject, schema, value):
-        if subject not in cache:
-            cache[subject] = { }
-        sub_cache = cache[subject]
-        sub_cache[schema] = value
+        # return result + meta tuple
+        return (result, meta, code)
+
+    def _is_transient(self, error):
+        """Return True if a ClientError means the registry could not be reached"""
+        return error.http_code == -1 or error.http_code >= 500
+
+    def close(self):
+        """Stop refreshing latest schemas and close any idle connections to the registry"""
+        self._stop_refresh.set()
+        if self._refresher:
+            self._refresher.join()
+        self.router.close()
+        if self.store:
+            self.store.close()
+
+    def _start_refresher(self):
+        with self._refresher_lock:
+            if self._stop_refresh.is_set():
+                return
+            # a refresher started before a fork does not run in the child
+            if self._refresher and self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+            self._refresher = threading.Thread(target=self._refresh_latest_schemas)
+            self._refresher.daemon = True
+            self._refresher.start()
+
+    def _refresh_latest_schemas(self):
+        while not self._stop_refresh.wait(self.latest_schema_refresh):
+            while self._latest_in_use:
+                try:
+                    subject = self._latest_in_use.pop()
+                except KeyError:
+                    break
+                try:
+                    self._flights.do(('latest', subject), self._get_latest_schema, subject)
+                except ClientError:
+                    # leave the cached answer to go stale
+                    pass
+
+    def _get_from_cache(self, cache, subject, schema, default):
+        sub_cache = cache.get(subject)
+        if sub_cache is None:
+            return default
+        return sub_cache.get(Util.full_fingerprint(schema), default)
+
+    def _add_to_cache(self, cache, stats, subject, schema, value):
+        sub_cache = cache.get(subject)
+        if sub_cache is None:
+            sub_cache = cache.setdefault(subject,
+                                         LRUCache(self.max_schemas_per_subject,
+                                                  ttl=self.cache_ttl, stats=stats))
+        sub_cache[Util.full_fingerprint(schema)] = value
 
     def _cache_schema(self, schema, schema_id, subject=None, version=None):
         # don't overwrite anything
-        if schema_id in self.id_to_schema:
-            schema = self.id_to_schema[schema_id]
-        else:
-            self.id_to_schema[schema_id] = schema
+        schema = self.id_to_schema.setdefault(schema_id, schema)
 
         if subject:
-            self._add_to_cache(self.subject_to_schema_ids,
+            self._add_to_cache(self.subject_to_schema_ids, self.subject_ids_stats,
                                subject, schema, schema_id)
-            if version:
-                self._add_to_cache(self.subject_to_schema_versions,
+            if version is not None:
+                self._add_to_cache(self.subject_to_schema_versions, self.subject_versions_stats,
                                    subject, schema, version)
 
+    def _get_from_store(self, subject, avro_schema, need_version=False, stale=False):
+        """
+        Return the (id, version) of a schema under a subject from the persistent
+        store, if it was confirmed recently enough or stale is True, and cache it.
+        Otherwise None.
+        """
+        if not self.store:
+            return None
+        entry = self.store.get_subject_entry(subject, Util.full_fingerprint(avro_schema))
+        if not entry:
+            return None
+        schema_id, version, updated = entry
+        if need_version and version is None:
+            return None
+        if not stale and time.time() - updated > self.store_revalidate:
+            return None
+        self._cache_schema(avro_schema, schema_id, subject, version)
+        return (schema_id, version)
+
+    def _get_last_known(self, error, cache, subject, avro_schema, need_version=False):
+        """
+        Called when a subject lookup failed with error.  If the registry could
+        not be reached, return the last known id or version of the schema
+        under the subject even if stale.  Otherwise raise error.
+        """
+        if not self._is_transient(error):
+            raise error
+        sub_cache = cache.get_stale(subject)
+        if sub_cache is not None:
+            value = sub_cache.get_stale(Util.full_fingerprint(avro_schema))
+            if value is not None:
+                return value
+        stored = self._get_from_store(subject, avro_schema, need_version, stale=True)
+        if not stored:
+            raise error
+        return stored[1] if need_version else stored[0]
+
+    def _persist(self, schema_id, schema_str, subject=None, schema=None, version=None):
+        if not self.store:
+            return
+        self.store.put_schema(schema_id, schema_str)
+        if subject:
+            self.store.put_subject_entry(subject, Util.full_fingerprint(schema), schema_id, version)
+
+    def _is_missing(self, key):
+        """Return True if the registry recently answered not found for a lookup"""
+        return self.negative_cache is not None and self.negative_cache.get(key) is not None
+
+    def _set_missing(self, key):
+        if self.negative_cache is not None:
+            self.negative_cache[key] = True
+
+    def cache_stats(self):
+        """
+        Return a dict of hit, miss, eviction and expiration counts and the
+        current size of each cache.
+        """
+        result = { }
+        for name, cache, stats in [('id_to_schema', self.id_to_schema, self.id_to_schema.stats),
+                                   ('subject_to_schema_ids', self.subject_to_schema_ids,
+                                    self.subject_ids_stats),
+                                   ('subject_to_schema_versions', self.subject_to_schema_versions,
+                                    self.subject_versions_stats),
+                                   ('subject_to_versions', self.subject_to_versions,
+                                    self.subject_to_versions.stats)]:
+            counts = stats.to_dict()
+            counts['size'] = len(cache)
+            result[name] = counts
+        result['id_to_schema']['bytes'] = self.id_to_schema.total_bytes
+        if self.negative_cache is not None:
+            counts = self.negative_cache.stats.to_dict()
+            counts['size'] = len(self.negative_cache)
+            result['negative'] = counts
+        return result
 
     def register(self, subject, avro_schema):
         """
@@ -96,48 +370,91 @@ class CachedSchemaRegistryClient(object):
 
         avro_schema must be a parsed schema from the python avro library
 
-        Multiple instances of the same schema will result in cache misses.
+        Schemas are cached by the fingerprint of their full JSON form, so any
+        equal instance of a registered schema is a cache hit, while one that
+        only adds a default, doc, alias or logicalType is sent to the
+        registry, which makes it a new version.
         """
-        schemas_to_id = self.subject_to_schema_ids.get(subject, { })
-        schema_id = schemas_to_id.get(avro_schema, -1)
+        schema_id = self._get_from_cache(self.subject_to_schema_ids, subject, avro_schema, -1)
         if schema_id != -1:
+            self.metrics.cache_hit('subject_to_schema_ids')
             return schema_id
+        self.metrics.cache_miss('subject_to_schema_ids')
+        key = ('register', subject, Util.full_fingerprint(avro_schema))
+        return self._flights.do(key, self._register, subject, avro_schema)
+
+    def _register(self, subject, avro_schema):
+        # may have been cached while waiting to send
+        schema_id = self._get_from_cache(self.subject_to_schema_ids, subject, avro_schema, -1)
+        if schema_id != -1:
+            return schema_id
+        stored = self._get_from_store(subject, avro_schema)
+        if stored:
+            return stored[0]
 
         # send it up
-        url = '/'.join([self.url,'subjects',subject,'versions'])
+        path = '/'.join(['','subjects',subject,'versions'])
         # body is { schema : json_string }
         body = { 'schema' : json.dumps(avro_schema.to_json()) }
-        result,meta,code = self._send_request(url, method='POST', body=body)
+        try:
+            result,meta,code = self._send_request(path, method='POST', body=body, write=True)
+        except ClientError as e:
+            return self._get_last_known(e, self.subject_to_schema_ids, subject, avro_schema)
         # result is a dict
         schema_id = result['id']
         # cache it
         self._cache_schema(avro_schema, schema_id, subject)
+        self._persist(schema_id, body['schema'], subject, avro_schema)
+        # it may be a new version
+        self.subject_to_versions.pop(subject)
+        if self.negative_cache is not None:
+            self.negative_cache.pop(('id', schema_id))
+            self.negative_cache.pop(('latest', subject))
+            self.negative_cache.pop(('version', subject, Util.full_fingerprint(avro_schema)))
         return schema_id
 
     def get_by_id(self, schema_id):
         """Retrieve a parsed avro schema by id or None if not found"""
+        schema = self.id_to_schema.get(schema_id)
+        if schema is not None:
+            self.metrics.cache_hit('id_to_schema')
+            return schema
+        self.metrics.cache_miss('id_to_schema')
+        if self._is_missing(('id', schema_id)):
+            return None
+        return self._flights.do(('id', schema_id), self._get_by_id, schema_id)
+
+    def _get_by_id(self, schema_id):
+        # may have been cached while waiting to send
         if schema_id in self.id_to_schema:
-            return self.id_to_schema[schema_id]
-        # fetch from the registry
-        url = '/'.join([self.url,'schemas','ids',str(schema_id)])
-        try:
-            result,meta,code = self._send_request(url)
-        except ClientError as e:
-            if e.http_code == 404:
-                return None
-            else:
-                raise e
-        else:
-            # need to parse the schema
-            schema_str = result.get("schema")
+            return self.id_to_schema.get(schema_id)
+        schema_str = self.store.get_schema(schema_id) if self.store else None
+        if schema_str is None:
+            # fetch from the registry
+            path = '/'.join(['','schemas','ids',str(schema_id)])
             try:
-                result = Util.parse_schema_from_string(schema_str)
-                # cache it
-                self._cache_schema(result, schema_id)
-                return result
-            except:
-                # bad schema - should not happen
-                raise ClientError("Received bad schema from registry.")
+                result,meta,code = self._send_request(path)
+            except ClientError as e:
+                if e.http_code == 404:
+                    self._set_missing(('id', schema_id))
+                    return None
+                # schemas never change so an expired one is as good
+                schema = self.id_to_schema.get_stale(schema_id)
+                if schema is None or not self._is_transient(e):
+                    raise e
+                return schema
+            schema_str = result.get("schema")
+            self._persist(schema_id, schema_str)
+
+        # need to parse the schema
+        try:
+            result = Util.parse_schema_from_string(schema_str, self.metrics)
+        except:
+            # bad schema - should not happen
+            raise ClientError("Received bad schema from registry.")
+        # cache it
+        self._cache_schema(result, schema_id)
+        return result
 
     def get_latest_schema(self, subject):
         """
@@ -145,31 +462,190 @@ class CachedSchemaRegistryClient(object):
         (the schema id, the parsed avro schema, the schema version)
         for a particular subject.
 
-        This call always contacts the registry.
+        Unless latest_schema_ttl was given, this call always contacts the
+        registry, although concurrent calls for the same subject share a single
+        request.
 
         If the subject is not found, (None,None,None) is returned.
         """
-        url = '/'.join([self.url, 'subjects',subject,'versions','latest'])
+        if self.latest_schema_ttl is not None:
+            cached = self.subject_to_latest_schema.get(subject)
+            if cached is not None and time.time() - cached[1] <= self.latest_schema_ttl:
+                self._latest_in_use.add(subject)
+                self.metrics.cache_hit('subject_to_latest_schema')
+                return cached[0]
+            self.metrics.cache_miss('subject_to_latest_schema')
+        if self._is_missing(('latest', subject)):
+            return (None, None, None)
+        return self._flights.do(('latest', subject), self._get_latest_schema, subject)
+
+    def _get_latest_schema(self, subject):
         try:
-            result,meta,code = self._send_request(url)
+            latest = self._get_subject_version(subject, 'latest')
+        except ClientError as e:
+            cached = self.subject_to_latest_schema.get_stale(subject)
+            if cached is None or not self._is_transient(e):
+                raise e
+            # serve the last known answer while the registry is unreachable
+            return cached[0]
+        if latest[0] is not None:
+            # swap in the new answer in one step
+            self.subject_to_latest_schema[subject] = (latest, time.time())
+            if self.latest_schema_ttl is not None:
+                self._start_refresher()
+        return latest
+
+    def _get_cached_version(self, subject, version):
+        """Return the (id, schema, version) of a cached version of a subject or None"""
+        versions = self.subject_to_schema_versions.get(subject)
+        ids = self.subject_to_schema_ids.get(subject)
+        if versions is None or ids is None:
+            return None
+        for fingerprint, v in versions.items():
+            if v == version:
+                schema_id = ids.get(fingerprint)
+                schema = self.id_to_schema.get(schema_id) if schema_id is not None else None
+                if schema is None:
+                    return None
+                return (schema_id, schema, version)
+        return None
+
+    def _get_subject_version(self, subject, version):
+        path = '/'.join(['', 'subjects',subject,'versions',str(version)])
+        try:
+            result,meta,code = self._send_request(path)
         except ClientError as e:
             if e.http_code == 404:
+                if version == 'latest':
+                    self._set_missing(('latest', subject))
+                else:
+                    self._set_missing(('by_version', subject, version))
                 return (None, None, None)
             raise e
         schema_id = result['id']
         version = result['version']
-        if schema_id in self.id_to_schema:
-            schema = self.id_to_schema[schema_id]
-        else:
+        schema = self.id_to_schema.get(schema_id)
+        if schema is None:
             try:
-                schema = Util.parse_schema_from_string(result['schema'])
+                schema = Util.parse_schema_from_string(result['schema'], self.metrics)
             except:
                 # bad schema - should not happen
                 raise ClientError("Received bad schema from registry.")
 
         self._cache_schema(schema, schema_id, subject, version)
+        self._persist(schema_id, result['schema'], subject, schema, version)
         return (schema_id, schema, version)
 
+    def get_by_version(self, subject, version):
+        """
+        Return the 3-tuple of:
+        (the schema id, the parsed avro schema, the schema version)
+        for a version of a subject.
+
+        If the subject or version is not found, (None,None,None) is returned.
+        """
+        if version != 'latest':
+            cached = self._get_cached_version(subject, version)
+            if cached:
+                return cached
+        if self._is_missing(('by_version', subject, version)):
+            return (None, None, None)
+        return self._flights.do(('by_version', subject, version),
+                                self._get_subject_version, subject, version)
+
+    def get_all_versions(self, subject):
+        """
+        Return the list of versions registered under a subject, or an empty
+        list if the subject is not found.
+
+        Other clients may register new versions, so unless latest_schema_ttl
+        was given this call always contacts the registry, like
+        get_latest_schema.  Otherwise the list is cached for that many seconds,
+        and forgotten when a schema is registered under the subject through
+        this client.
+        """
+        if self.latest_schema_ttl is not None:
+            versions = self.subject_to_versions.get(subject)
+            if versions is not None:
+                self.metrics.cache_hit('subject_to_versions')
+                return list(versions)
+            self.metrics.cache_miss('subject_to_versions')
+        return list(self._flights.do(('versions', subject), self._get_all_versions, subject))
+
+    def _get_all_versions(self, subject):
+        path = '/'.join(['', 'subjects', subject, 'versions'])
+        try:
+            result,meta,code = self._send_request(path)
+        except ClientError as e:
+            if e.http_code == 404:
+                return []
+            versions = self.subject_to_versions.get_stale(subject)
+            if versions is None or not self._is_transient(e):
+                raise e
+            return versions
+        versions = sorted(result)
+        if versions:
+            self.subject_to_versions[subject] = versions
+        return versions
+
+    def prefetch(self, subjects=None, ids=None, max_workers=8):
+        """
+        Load every version of the given subjects and the given schema ids into
+        the cache ahead of time, with at most max_workers requests in flight.
+
+        Returns a dict with the sorted list of schema 'ids' loaded, the number
+        of 'schemas' and 'subjects' loaded, the 'seconds' taken and the 'errors'
+        that occurred keyed by subject, (subject, version) or schema id.
+        """
+        start = time.time()
+        errors = { }
+        loaded = set()
+        executor = Executor(max_workers)
+        try:
+            listings = [ (subject, executor.submit(self.get_all_versions, subject))
+                         for subject in subjects or [] ]
+            fetches = [ (schema_id, executor.submit(self.get_by_id, schema_id))
+                        for schema_id in ids or [] ]
+            num_subjects = 0
+            for subject, future in listings:
+                try:
+                    versions = future.result()
+                except ClientError as e:
+                    errors[subject] = str(e)
+                    continue
+                if not versions:
+                    errors[subject] = "not found"
+                    continue
+                num_subjects += 1
+                for version in versions:
+                    fetches.append(((subject, version),
+                                    executor.submit(self.get_by_version, subject, version)))
+
+            for key, future in fetches:
+                try:
+                    result = future.result()
+                except ClientError as e:
+                    errors[key] = str(e)
+                    continue
+                if isinstance(key, tuple):
+                    schema_id = result[0]
+                else:
+                    schema_id = key if result is not None else None
+                if schema_id is None:
+                    errors[key] = "not found"
+                else:
+                    loaded.add(schema_id)
+        finally:
+            executor.shutdown()
+
+        return {
+            'ids' : sorted(loaded),
+            'schemas' : len(loaded),
+            'subjects' : num_subjects,
+            'errors' : errors,
+            'seconds' : time.time() - start
+        }
+
 
     def get_version(self, subject, avro_schema):
         """
@@ -177,71 +653,116 @@ class CachedSchemaRegistryClient(object):
 
         Returns -1 if not found.
         """
-        schemas_to_version = self.subject_to_schema_versions.get(subject,{})
-        version = schemas_to_version.get(avro_schema, -1)
+        version = self._get_from_cache(self.subject_to_schema_versions, subject, avro_schema, -1)
+        if version != -1:
+            self.metrics.cache_hit('subject_to_schema_versions')
+            return version
+        self.metrics.cache_miss('subject_to_schema_versions')
+        key = ('version', subject, Util.full_fingerprint(avro_schema))
+        if self._is_missing(key):
+            return -1
+        return self._flights.do(key, self._get_version, subject, avro_schema)
+
+    def _get_version(self, subject, avro_schema):
+        # may have been cached while waiting to send
+        version = self._get_from_cache(self.subject_to_schema_versions, subject, avro_schema, -1)
         if version != -1:
             return version
+        stored = self._get_from_store(subject, avro_schema, need_version=True)
+        if stored:
+            return stored[1]
 
-        url = '/'.join([self.url, 'subjects', subject])
+        path = '/'.join(['', 'subjects', subject])
         body = { 'schema' : json.dumps(avro_schema.to_json()) }
         try:
-            result,meta,code = self._send_request(url, method='POST', body=body)
+            result,meta,code = self._send_request(path, method='POST', body=body)
             schema_id = result['id']
             version = result['version']
             self._cache_schema(avro_schema, schema_id, subject, version)
+            self._persist(schema_id, body['schema'], subject, avro_schema, version)
             return version
         except ClientError as e:
             if e.http_code == 404:
+                self._set_missing(('version', subject, Util.full_fingerprint(avro_schema)))
                 return -1
-            else:
-                raise e
+            return self._get_last_known(e, self.subject_to_schema_versions, subject,
+                                        avro_schema, need_version=True)
 
-    def test_compatibility(self, subject, avro_schema, version='latest'):
+    def test_compatibility(self, subject, avro_schema, version='latest', level=None):
         """
         Test the compatibility of a candidate parsed schema for a given subject.
 
-        By default the latest version is checked against.
+        By default the latest version is checked against.  A subject or version
+        the registry does not know is reported incompatible, while a registry
+        that cannot be reached raises a ClientError.
+
+        If a level from VALID_LEVELS is given, the check is done locally with a
+        CompatibilityChecker instead of asking the registry to apply the
+        subject's configured level.  The list of versions is fetched as by
+        get_all_versions, so a version registered by another client is checked
+        against, while the schemas of versions seen before and the results of
+        checks between two schemas come from the caches.  Transitive levels
+        check against every version and ignore version.
         """
-        url = '/'.join([self.url,'compatibility','subjects',subject,
-                        'versions',str(version)])
+        if level is not None:
+            if level not in VALID_LEVELS:
+                raise ClientError("Invalid level specified: %s" % (str(level)))
+            if level.endswith('_TRANSITIVE'):
+                existing = [ self.get_by_version(subject, v)[1]
+                             for v in self.get_all_versions(subject) ]
+            elif version == 'latest':
+                existing = [ self.get_by_version(subject, v)[1]
+                             for v in self.get_all_versions(subject)[-1:] ]
+            else:
+                existing = [ self.get_by_version(subject, version)[1] ]
+            if not existing or any(s is None for s in existing):
+                # no such subject or version
+                return False
+            return self.compatibility_checker.is_compatible(avro_schema, existing, level)
+
+        path = '/'.join(['','compatibility','subjects',subject,
+                         'versions',str(version)])
         body = { 'schema' : json.dumps(avro_schema.to_json()) }
         try:
-            result,meta,code = self._send_request(url, method='POST', body=body)
-            return result.get('is_compatible')
-        except:
-            return False
+            result,meta,code = self._send_request(path, method='POST', body=body)
+        except ClientError as e:
+            # no such subject or version, or a schema the registry rejects
+            if e.http_code in (404, 422):
+                return False
+            raise
+        return result.get('is_compatible')
 
 
     def update_compatibility(self, level, subject=None):
         """
-        Update the compatibility level for a subject.  Level must be one of:
+        Update the compatibility level for a subject.  Level must be one of
+        VALID_LEVELS:
 
-        'NONE','FULL','FORWARD', or 'BACKWARD'
+        'NONE','FULL','FORWARD','BACKWARD' or one of their _TRANSITIVE variants
         """
         if level not in VALID_LEVELS:
             raise ClientError("Invalid level specified: %s" % (str(level)))
 
-        url = '/'.join([self.url,'config'])
+        path = '/'.join(['','config'])
         if subject:
-            url += '/' + subject
+            path += '/' + subject
 
         body = { "compatibility" : level }
-        result,meta,code = self._send_request(url, method='PUT', body=body)
+        result,meta,code = self._send_request(path, method='PUT', body=body, write=True)
         return result['compatibility']
 
     def get_compatibility(self, subject=None):
         """
-        Get the current compatibility level for a subject.  Result will be one of:
-
-        'NONE','FULL','FORWARD', or 'BACKWARD'
+        Get the current compatibility level for a subject.  Result will be one of
+        VALID_LEVELS.
         """
-        url = '/'.join([self.url,'config'])
+        path = '/'.join(['','config'])
         if subject:
-            url += '/' + subject
+            path += '/' + subject
 
-        result,meta,code = self._send_request(url)
+        result,meta,code = self._send_request(path)
         compatibility = result.get('compatibility', None)
         if not compatibility:
-            compatbility = result.get('compatibilityLevel')
+            compatibility = result.get('compatibilityLevel')
 
-        return compatbility
+        return compatibility
@@ -0,0 +1,55 @@
+import threading
+import time
+
+class CircuitBreaker(object):
+    """
+    Stops calls to a failing service so that callers fail fast.
+
+    The breaker starts closed.  After failure_threshold consecutive failures
+    it opens and rejects calls for reset_timeout seconds.  It then lets a
+    single trial call through (half open): success closes it again and
+    failure reopens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0
+        self._state = CircuitBreaker.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == CircuitBreaker.OPEN and \
+               time.time() - self.opened_at >= self.reset_timeout:
+                return CircuitBreaker.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may be made now"""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.OPEN and \
+               time.time() - self.opened_at >= self.reset_timeout:
+                # let one trial call through
+                self._state = CircuitBreaker.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = CircuitBreaker.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = CircuitBreaker.OPEN
+                self.opened_at = time.time()
@@ -0,0 +1,116 @@
+from . import ClientError, VALID_LEVELS
+from ..LRUCache import LRUCache
+from ..serializers import Util
+
+# writer type => reader types its values may be promoted to
+_PROMOTIONS = {
+    'int' : ('long', 'float', 'double'),
+    'long' : ('float', 'double'),
+    'float' : ('double',),
+    'string' : ('bytes',),
+    'bytes' : ('string',)
+}
+
+_RECORD_TYPES = ('record', 'error', 'request')
+
+def _names(named):
+    """Return the unqualified name and aliases of a named schema or field"""
+    names = set(named.get_prop('aliases') or [])
+    names.add(named.name.split('.')[-1])
+    return names
+
+def _name_matches(reader, writer):
+    return writer.name.split('.')[-1] in _names(reader)
+
+def _can_read(reader, writer, seen):
+    if writer.type == 'union':
+        # every branch the writer may have used must be readable
+        return all(_can_read(reader, branch, seen) for branch in writer.schemas)
+    if reader.type == 'union':
+        return any(_can_read(branch, writer, seen) for branch in reader.schemas)
+
+    if reader.type != writer.type:
+        if reader.type in _RECORD_TYPES and writer.type in _RECORD_TYPES:
+            pass
+        else:
+            return reader.type in _PROMOTIONS.get(writer.type, ())
+
+    if reader.type in _RECORD_TYPES:
+        key = (id(reader), id(writer))
+        if key in seen:
+            # recursive schema - assume compatible while checking it
+            return True
+        seen.add(key)
+        if not _name_matches(reader, writer):
+            return False
+        writer_fields = writer.fields_dict
+        for field in reader.fields:
+            names = _names(field)
+            matches = [ writer_fields[n] for n in names if n in writer_fields ]
+            if matches:
+                if not _can_read(field.type, matches[0].type, seen):
+                    return False
+            elif not field.has_default:
+                return False
+        return True
+    if reader.type == 'enum':
+        return _name_matches(reader, writer) and set(writer.symbols) <= set(reader.symbols)
+    if reader.type == 'fixed':
+        return _name_matches(reader, writer) and reader.size == writer.size
+    if reader.type == 'array':
+        return _can_read(reader.items, writer.items, seen)
+    if reader.type == 'map':
+        return _can_read(reader.values, writer.values, seen)
+    # same primitive type
+    return True
+
+class CompatibilityChecker(object):
+    """
+    Checks Avro schemas for compatibility locally, following the schema
+    resolution rules of the Avro specification.
+
+    Levels are those of VALID_LEVELS:
+
+    BACKWARD: the new schema can read data written with the latest one
+    FORWARD: the latest schema can read data written with the new one
+    FULL: both BACKWARD and FORWARD
+    NONE: any schema is compatible
+
+    The _TRANSITIVE variants check against every existing schema rather than
+    only the latest.
+
+    Whether one schema can read another is memoized by their full
+    fingerprints, which keep the defaults and aliases resolution depends on,
+    so a pair is only ever resolved once.  At most max_entries results are kept.
+    """
+    def __init__(self, max_entries=10000):
+        # (writer full fingerprint, reader full fingerprint) => bool
+        self.results = LRUCache(max_entries)
+
+    def can_read(self, reader, writer):
+        """Return True if data written with the writer schema can be read with the reader schema"""
+        key = (Util.full_fingerprint(writer), Util.full_fingerprint(reader))
+        result = self.results.get(key)
+        if result is None:
+            result = self.results[key] = _can_read(reader, writer, set())
+        return result
+
+    def is_compatible(self, avro_schema, existing, level='BACKWARD'):
+        """
+        Return True if avro_schema may be added after the existing schemas,
+        given oldest first, under a compatibility level.
+        """
+        if level not in VALID_LEVELS:
+            raise ClientError("Invalid level specified: %s" % (str(level)))
+        if level == 'NONE' or not existing:
+            return True
+        if not level.endswith('_TRANSITIVE'):
+            existing = existing[-1:]
+        backward = not level.startswith('FORWARD')
+        forward = not level.startswith('BACKWARD')
+        for old in existing:
+            if backward and not self.can_read(avro_schema, old):
+                return False
+            if forward and not self.can_read(old, avro_schema):
+                return False
+        return True
@@ -0,0 +1,208 @@
+import base64
+import httplib
+import os
+import socket
+import threading
+import time
+import urllib
+import urlparse
+
+from . import ClientError
+
+# redirects followed for a single request, as urllib2
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of persistent HTTP/1.1 connections to a single host.
+
+    Connections are checked out for the duration of a single request and
+    returned afterwards so the next request can reuse the open socket instead
+    of paying for a new TCP (and TLS) handshake.
+
+    At most pool_size idle connections are kept.  When more threads than that
+    issue requests concurrently, extra connections are opened and closed once
+    the request finishes.  Connections idle for longer than idle_timeout
+    seconds are discarded rather than reused.
+
+    Connections opened before a fork are never used by the child process,
+    which opens its own.
+
+    Like urllib2, the pool goes through the proxy given by the http_proxy or
+    https_proxy environment variables unless no_proxy excludes the host, or
+    through those of proxies, a dict of scheme => proxy url.  https requests
+    are tunnelled through the proxy with CONNECT.  Redirects of GET and HEAD
+    requests are followed, up to MAX_REDIRECTS.
+    """
+    def __init__(self, url, pool_size=10, idle_timeout=60, timeout=None, proxies=None):
+        parsed = urlparse.urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise ClientError("Unsupported url scheme: %s" % (str(parsed.scheme)))
+
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        # proxy url, and the authorization header it carries, or None
+        self.proxy = None
+        self.proxy_headers = { }
+        if proxies is None:
+            proxies = urllib.getproxies()
+            if proxies and urllib.proxy_bypass(parsed.netloc):
+                proxies = { }
+        proxy = proxies.get(self.scheme)
+        if proxy:
+            if '://' not in proxy:
+                proxy = 'http://' + proxy
+            self.proxy = urlparse.urlparse(proxy)
+            if self.proxy.username is not None:
+                credentials = '%s:%s' % (urllib.unquote(self.proxy.username),
+                                         urllib.unquote(self.proxy.password or ''))
+                self.proxy_headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credentials)
+
+        self._lock = threading.Lock()
+        # list of (connection, time returned to the pool)
+        self._idle = []
+        # process the idle connections belong to
+        self._pid = os.getpid()
+        # number of connections ever opened - useful to check reuse
+        self.num_connections = 0
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            conn_cls = httplib.HTTPSConnection
+        else:
+            conn_cls = httplib.HTTPConnection
+        kwargs = { }
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        with self._lock:
+            self.num_connections += 1
+        if self.proxy is None:
+            return conn_cls(self.host, self.port, **kwargs)
+        conn = conn_cls(self.proxy.hostname, self.proxy.port, **kwargs)
+        if self.scheme == 'https':
+            conn.set_tunnel(self.host, self.port, self.proxy_headers)
+        return conn
+
+    def _get_connection(self):
+        """Return a (connection, reused) tuple"""
+        now = time.time()
+        stale = []
+        conn = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked - the sockets are shared with the parent
+                self._idle = []
+                self._pid = os.getpid()
+            while self._idle:
+                candidate, last_used = self._idle.pop()
+                if now - last_used > self.idle_timeout:
+                    stale.append(candidate)
+                    continue
+                conn = candidate
+                break
+        for s in stale:
+            s.close()
+        if conn:
+            return (conn, True)
+        return (self._new_connection(), False)
+
+    def _put_connection(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size and self._pid == os.getpid():
+                self._idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def _set_timeout(self, conn, timeout):
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        conn.timeout = timeout
+        if conn.sock:
+            conn.sock.settimeout(timeout)
+
+    def request(self, method, url, body=None, headers=None, timeout=None):
+        """
+        Send a request and return a 3-tuple of:
+        (the http code, the response headers as a dict, the response body)
+
+        timeout overrides the socket timeout of the pool for this request.
+
+        A request on a reused connection that the server has since closed is
+        retried once on a fresh connection.  Redirects of GET and HEAD requests
+        are followed, through a connection of their own when they point to
+        another host.
+        """
+        pool = self
+        for i in range(MAX_REDIRECTS + 1):
+            response = pool._request(method, url, body, headers, timeout)
+            location = response[1].get('location')
+            if (response[0] not in REDIRECT_CODES or method not in ('GET', 'HEAD')
+                    or not location):
+                break
+            url = urlparse.urljoin(url, location)
+            if pool is not self:
+                pool.close()
+            if self._same_origin(url):
+                pool = self
+            else:
+                pool = ConnectionPool(url, 1, self.idle_timeout, self.timeout)
+        if pool is not self:
+            pool.close()
+        return response
+
+    def _same_origin(self, url):
+        parsed = urlparse.urlparse(url)
+        return (parsed.scheme, parsed.hostname, parsed.port) == (self.scheme, self.host, self.port)
+
+    def _request(self, method, url, body=None, headers=None, timeout=None):
+        if self.proxy is not None and self.scheme == 'http':
+            # plain http proxies take the absolute url
+            path = url
+            headers = dict(headers or { }, **self.proxy_headers)
+        else:
+            parsed = urlparse.urlparse(url)
+            path = parsed.path or '/'
+            if parsed.query:
+                path += '?' + parsed.query
+        headers = headers or { }
+
+        conn, reused = self._get_connection()
+        while True:
+            self._set_timeout(conn, timeout)
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except socket.timeout:
+                conn.close()
+                raise
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if not reused:
+                    raise
+                # server dropped the idle connection - try a new one
+                conn, reused = (self._new_connection(), False)
+                continue
+
+            meta = dict(response.getheaders())
+            if response.will_close:
+                conn.close()
+            else:
+                self._put_connection(conn)
+            return (response.status, meta, data)
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for conn, last_used in idle:
+            conn.close()
@@ -0,0 +1,192 @@
+import Queue
+import collections
+import sys
+import time
+
+from .ConnectionPool import ConnectionPool
+from ..Futures import Executor
+from ..Metrics import NO_METRICS
+
+# weight of the newest sample in the latency moving average
+EWMA_ALPHA = 0.3
+# number of recent latencies kept to compute percentiles
+LATENCY_SAMPLES = 100
+# samples needed before a percentile is trusted for hedging
+MIN_HEDGE_SAMPLES = 10
+
+class Endpoint(object):
+    """A registry replica with its connection pool and observed latency"""
+    def __init__(self, url, pool_size, idle_timeout):
+        self.url = url.rstrip('/')
+        self.pool = ConnectionPool(self.url, pool_size, idle_timeout)
+        # exponentially weighted moving average of latency in seconds
+        self.ewma = None
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.unhealthy_until = 0
+        self.errors = 0
+
+    def record_latency(self, latency):
+        self.samples.append(latency)
+        if self.ewma is None:
+            self.ewma = latency
+        else:
+            self.ewma = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+
+    def percentile(self, pct):
+        """Return the pct percentile of recent latencies or None if too few are known"""
+        samples = sorted(self.samples)
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * pct / 100.0))
+        return samples[index]
+
+    def is_healthy(self, now):
+        return now >= self.unhealthy_until
+
+class EndpointRouter(object):
+    """
+    Sends requests to one of several registry replicas.
+
+    Writes always go to the primary, the first url.  Reads go to the healthy
+    replica with the lowest moving average latency; replicas that have not
+    answered yet are tried first.  A replica that fails to answer or answers
+    with a server error is marked unhealthy for unhealthy_period seconds and
+    the read is retried on the next replica.
+
+    If hedge_percentile is set, a read still running after that percentile of
+    the chosen replica's recent latencies is sent again to the next replica,
+    and whichever answers first is used.
+
+    Every request is reported to the request hook of metrics.
+    """
+    def __init__(self, urls, pool_size=10, idle_timeout=60, hedge_percentile=None,
+                 unhealthy_period=30, hedge_threads=8, metrics=NO_METRICS):
+        if isinstance(urls, basestring):
+            urls = [urls]
+        self.endpoints = [ Endpoint(url, pool_size, idle_timeout) for url in urls ]
+        self.primary = self.endpoints[0]
+        self.hedge_percentile = hedge_percentile
+        self.unhealthy_period = unhealthy_period
+        self.metrics = metrics
+        self._executor = None
+        if hedge_percentile is not None and len(self.endpoints) > 1:
+            self._executor = Executor(hedge_threads)
+
+    def _read_order(self):
+        now = time.time()
+        healthy = [ e for e in self.endpoints if e.is_healthy(now) ]
+        unhealthy = [ e for e in self.endpoints if not e.is_healthy(now) ]
+        healthy.sort(key=lambda e: e.ewma or 0)
+        unhealthy.sort(key=lambda e: e.unhealthy_until)
+        return healthy + unhealthy
+
+    def _mark_unhealthy(self, endpoint):
+        endpoint.errors += 1
+        endpoint.unhealthy_until = time.time() + self.unhealthy_period
+
+    def _request(self, endpoint, method, path, body, headers, timeout):
+        start = time.time()
+        try:
+            response = endpoint.pool.request(method, endpoint.url + path, body, headers, timeout)
+        except:
+            self._mark_unhealthy(endpoint)
+            self.metrics.request(endpoint.url, method, -1, time.time() - start,
+                                 len(body or ''), 0)
+            raise
+        latency = time.time() - start
+        if response[0] >= 500:
+            self._mark_unhealthy(endpoint)
+        else:
+            endpoint.record_latency(latency)
+        self.metrics.request(endpoint.url, method, response[0], latency,
+                             len(body or ''), len(response[2]))
+        return response
+
+    def _hedged_request(self, first, second, args, tried):
+        results = Queue.Queue()
+        def run(endpoint):
+            try:
+                results.put((None, self._request(endpoint, *args)))
+            except:
+                results.put((sys.exc_info(), None))
+
+        self._executor.submit(run, first)
+        pending = 1
+        threshold = first.percentile(self.hedge_percentile)
+        hedged = False
+        last = None
+        while pending:
+            try:
+                if hedged or threshold is None:
+                    last = results.get()
+                else:
+                    last = results.get(timeout=threshold)
+            except Queue.Empty:
+                # too slow - ask the next replica as well
+                hedged = True
+                tried.add(second)
+                self._executor.submit(run, second)
+                pending += 1
+                continue
+            pending -= 1
+            exc_info, response = last
+            if exc_info is None and response[0] < 500:
+                return response
+            if not hedged:
+                # failed fast - leave it to the caller to try elsewhere
+                break
+        exc_info, response = last
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return response
+
+    def request(self, method, path, body=None, headers=None, write=False, timeout=None):
+        """
+        Send a request for a path below the registry url and return a 3-tuple
+        of (the http code, the response headers as a dict, the response body)
+
+        timeout is the socket timeout for each replica tried.
+        """
+        args = (method, path, body, headers, timeout)
+        if write:
+            return self._request(self.primary, *args)
+
+        order = self._read_order()
+        tried = set()
+        last = None
+        for i, endpoint in enumerate(order):
+            if endpoint in tried:
+                continue
+            tried.add(endpoint)
+            try:
+                if i == 0 and self._executor:
+                    response = self._hedged_request(endpoint, order[1], args, tried)
+                else:
+                    response = self._request(endpoint, *args)
+            except:
+                last = (sys.exc_info(), None)
+                continue
+            if response[0] < 500:
+                return response
+            last = (None, response)
+
+        exc_info, response = last
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return response
+
+    def stats(self):
+        """Return a list of dicts describing the latency and health of each replica"""
+        now = time.time()
+        return [ { 'url' : e.url,
+                   'ewma' : e.ewma,
+                   'healthy' : e.is_healthy(now),
+                   'errors' : e.errors,
+                   'primary' : e is self.primary } for e in self.endpoints ]
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        for e in self.endpoints:
+            e.pool.close()
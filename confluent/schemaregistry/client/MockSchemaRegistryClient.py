@@ -1,22 +1,28 @@
 import json
 import sys
+import time
 
 from . import ClientError, VALID_LEVELS
+from .Compatibility import CompatibilityChecker
 from ..serializers import Util
 
 class MockSchemaRegistryClient(object):
     """
     A client that acts as a schema registry locally.
 
-    Compatibiity related methods are not implemented at this time.
+    Registering more than max_schemas_per_subject schemas under a single
+    subject raises a ClientError.
+
+    Compatibility is checked locally with a CompatibilityChecker.  The level
+    defaults to BACKWARD, like the registry's.
     """
     def __init__(self, max_schemas_per_subject=1000):
         self.max_schemas_per_subject = max_schemas_per_subject
-        # subj => { schema => id }
+        # subj => { schema full fingerprint => id }
         self.subject_to_schema_ids = { }
         # id => avro_schema
         self.id_to_schema = {}
-        # subj => { schema => version }
+        # subj => { schema full fingerprint => version }
         self.subject_to_schema_versions = {}
 
         self.subject_to_latest_schema = { }
@@ -25,12 +31,17 @@ class MockSchemaRegistryClient(object):
         self.next_id = 1
         self.schema_to_id = { }
 
+        # subj => level, with the global level under None
+        self.compatibility = { None : 'BACKWARD' }
+        self.compatibility_checker = CompatibilityChecker()
+
     def _get_next_id(self, schema):
-        if schema in self.schema_to_id:
-            return self.schema_to_id[schema]
+        fingerprint = Util.full_fingerprint(schema)
+        if fingerprint in self.schema_to_id:
+            return self.schema_to_id[fingerprint]
         result = self.next_id
         self.next_id += 1
-        self.schema_to_id[schema] = result
+        self.schema_to_id[fingerprint] = result
         return result
 
     def _get_next_version(self, subject):
@@ -38,15 +49,11 @@ class MockSchemaRegistryClient(object):
             self.subject_to_schema_versions[subject] = { }
         return len(self.subject_to_schema_versions[subject])
 
-    def _get_all_versions(self, subject):
-        versions = self.subject_to_schema_versions.get(subject,{})
-        return sorted(versions)
-
     def _add_to_cache(self, cache, subject, schema, value):
         if subject not in cache:
             cache[subject] = { }
         sub_cache = cache[subject]
-        sub_cache[schema] = value
+        sub_cache[Util.full_fingerprint(schema)] = value
 
     def _cache_schema(self, schema, schema_id, subject, version):
         # don't overwrite anything
@@ -73,14 +80,15 @@ class MockSchemaRegistryClient(object):
         and receive a schema id.
 
         avro_schema must be a parsed schema from the python avro library
-
-        Multiple instances of the same schema will result in inconsistencies.
         """
         schemas_to_id = self.subject_to_schema_ids.get(subject, { })
-        schema_id = schemas_to_id.get(avro_schema, -1)
+        schema_id = schemas_to_id.get(Util.full_fingerprint(avro_schema), -1)
         if schema_id != -1:
             return schema_id
 
+        if len(self.subject_to_schema_ids.get(subject, { })) >= self.max_schemas_per_subject:
+            raise ClientError("Too many schemas registered for subject %s" % (subject))
+
         # add it
         version = self._get_next_version(subject)
         schema_id = self._get_next_id(avro_schema)
@@ -103,6 +111,29 @@ class MockSchemaRegistryClient(object):
         """
         return self.subject_to_latest_schema.get(subject, (None, None, None))
 
+    def get_all_versions(self, subject):
+        """
+        Return the list of versions registered under a subject, or an empty
+        list if the subject is not found.
+        """
+        versions = self.subject_to_schema_versions.get(subject, {})
+        return sorted(versions.values())
+
+    def get_by_version(self, subject, version):
+        """
+        Return the 3-tuple of:
+        (the schema id, the parsed avro schema, the schema version)
+        for a version of a subject.
+
+        If the subject or version is not found, (None,None,None) is returned.
+        """
+        versions = self.subject_to_schema_versions.get(subject, {})
+        for fingerprint, v in versions.items():
+            if v == version:
+                schema_id = self.subject_to_schema_ids[subject][fingerprint]
+                return (schema_id, self.id_to_schema[schema_id], version)
+        return (None, None, None)
+
     def get_version(self, subject, avro_schema):
         """
         Get the version of a schema for a given subject.
@@ -110,20 +141,81 @@ class MockSchemaRegistryClient(object):
         Returns -1 if not found.
         """
         schemas_to_version = self.subject_to_schema_versions.get(subject, {})
-        return schemas_to_version.get(avro_schema, -1)
+        return schemas_to_version.get(Util.full_fingerprint(avro_schema), -1)
 
     def get_id_for_schema(self, subject, avro_schema):
         """
         Get the ID of a parsed schema
         """
         schemas_to_id = self.subject_to_schema_ids.get(subject, {})
-        return schemas_to_id.get(avro_schema, -1)
+        return schemas_to_id.get(Util.full_fingerprint(avro_schema), -1)
 
-    def test_compatibility(self, subject, avro_schema, version='latest'):
-        raise ClientError("not implemented")
+    def prefetch(self, subjects=None, ids=None, max_workers=8):
+        """
+        Report the schemas of the given subjects and ids in the format of
+        CachedSchemaRegistryClient.prefetch.  Everything is already local.
+        """
+        start = time.time()
+        errors = { }
+        loaded = set()
+        num_subjects = 0
+        for subject in subjects or []:
+            versions = self.subject_to_schema_ids.get(subject)
+            if not versions:
+                errors[subject] = "not found"
+                continue
+            num_subjects += 1
+            loaded.update(versions.values())
+        for schema_id in ids or []:
+            if schema_id in self.id_to_schema:
+                loaded.add(schema_id)
+            else:
+                errors[schema_id] = "not found"
+        return {
+            'ids' : sorted(loaded),
+            'schemas' : len(loaded),
+            'subjects' : num_subjects,
+            'errors' : errors,
+            'seconds' : time.time() - start
+        }
+
+    def test_compatibility(self, subject, avro_schema, version='latest', level=None):
+        """
+        Test the compatibility of a candidate parsed schema for a given subject.
+
+        By default the latest version is checked against, with the level
+        configured for the subject.  Transitive levels check against every
+        version and ignore version.
+        """
+        if level is None:
+            level = self.get_compatibility(subject)
+        if level not in VALID_LEVELS:
+            raise ClientError("Invalid level specified: %s" % (str(level)))
+        if level.endswith('_TRANSITIVE'):
+            existing = [ self.get_by_version(subject, v)[1]
+                         for v in self.get_all_versions(subject) ]
+        elif version == 'latest':
+            existing = [ self.get_latest_schema(subject)[1] ]
+        else:
+            existing = [ self.get_by_version(subject, version)[1] ]
+        if not existing or any(s is None for s in existing):
+            # no such subject or version
+            return False
+        return self.compatibility_checker.is_compatible(avro_schema, existing, level)
 
     def update_compatibility(self, level, subject=None):
-        raise ClientError("not implemented")
+        """
+        Update the compatibility level for a subject, or the global level.
+        Level must be one of VALID_LEVELS.
+        """
+        if level not in VALID_LEVELS:
+            raise ClientError("Invalid level specified: %s" % (str(level)))
+        self.compatibility[subject] = level
+        return level
 
     def get_compatibility(self, subject=None):
-        raise ClientError("not implemented")
+        """
+        Get the compatibility level for a subject, which is the global level
+        unless one was set for the subject.
+        """
+        return self.compatibility.get(subject, self.compatibility[None])
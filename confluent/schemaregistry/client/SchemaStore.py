@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+
+# bytes of the database file read through a memory map
+MMAP_SIZE = 64 * 1024 * 1024
+
+class SchemaStore(object):
+    """
+    A persistent schema cache kept in a single sqlite file.
+
+    Several processes on a host may share the same file: it is opened in
+    write-ahead log mode so readers never block each other or a writer.
+    Each thread (and each forked process) uses its own connection, and reads
+    go through a memory map of the file shared by all of them.
+
+    A read_only store never writes, so a parent process can populate a file
+    that worker processes only attach to.
+
+    The store is only an optimization, so database errors are swallowed:
+    reads report a miss and writes are dropped.
+    """
+    def __init__(self, path, timeout=30, read_only=False):
+        self.path = path
+        self.timeout = timeout
+        self.read_only = read_only
+        self._local = threading.local()
+        conn = self._connection()
+        if conn and not read_only:
+            try:
+                with conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS schemas ("
+                                 "id INTEGER PRIMARY KEY, schema TEXT NOT NULL)")
+                    # keyed on full fingerprints; the subjects table of
+                    # earlier versions, keyed on canonical ones, is not read
+                    conn.execute("CREATE TABLE IF NOT EXISTS subject_schemas ("
+                                 "subject TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                                 "id INTEGER NOT NULL, version INTEGER, updated REAL NOT NULL, "
+                                 "PRIMARY KEY (subject, fingerprint))")
+            except sqlite3.Error:
+                pass
+
+    def _connection(self):
+        pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == pid:
+            return conn
+        try:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            if self.read_only:
+                conn.execute("PRAGMA query_only=ON")
+            else:
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA mmap_size=%d" % (MMAP_SIZE))
+        except sqlite3.Error:
+            return None
+        self._local.conn = conn
+        self._local.pid = pid
+        return conn
+
+    def _query(self, sql, args):
+        conn = self._connection()
+        if not conn:
+            return None
+        try:
+            return conn.execute(sql, args).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _write(self, sql, args):
+        if self.read_only:
+            return
+        conn = self._connection()
+        if not conn:
+            return
+        try:
+            with conn:
+                conn.execute(sql, args)
+        except sqlite3.Error:
+            pass
+
+    def get_schema(self, schema_id):
+        """Return the schema string stored for an id or None"""
+        row = self._query("SELECT schema FROM schemas WHERE id = ?", (schema_id,))
+        return row[0] if row else None
+
+    def put_schema(self, schema_id, schema_str):
+        """Store the schema string of an id.  Ids never change, so there is no update."""
+        self._write("INSERT OR IGNORE INTO schemas (id, schema) VALUES (?, ?)",
+                    (schema_id, schema_str))
+
+    def get_subject_entry(self, subject, fingerprint):
+        """
+        Return a 3-tuple of (schema id, version or None, time written) for a
+        schema's full fingerprint under a subject, or None.
+        """
+        return self._query("SELECT id, version, updated FROM subject_schemas "
+                           "WHERE subject = ? AND fingerprint = ?",
+                           (subject, str(fingerprint)))
+
+    def put_subject_entry(self, subject, fingerprint, schema_id, version=None):
+        """Store the id, and version if known, of a schema's full fingerprint under a subject"""
+        self._write("INSERT OR REPLACE INTO subject_schemas (subject, fingerprint, id, version, updated) "
+                    "VALUES (?, ?, ?, COALESCE(?, (SELECT version FROM subject_schemas "
+                    "WHERE subject = ? AND fingerprint = ? AND id = ?)), ?)",
+                    (subject, str(fingerprint), schema_id, version,
+                     subject, str(fingerprint), schema_id, time.time()))
+
+    def close(self):
+        """Close the connection of the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
@@ -1,5 +1,6 @@
 
-VALID_LEVELS=['NONE','FULL','FORWARD','BACKWARD']
+VALID_LEVELS=['NONE','FULL','FORWARD','BACKWARD',
+              'FULL_TRANSITIVE','FORWARD_TRANSITIVE','BACKWARD_TRANSITIVE']
 
 class ClientError(Exception, object):
     """Error thrown by Schema Registry clients"""
@@ -16,3 +17,4 @@ class ClientError(Exception, object):
 
 from MockSchemaRegistryClient import *
 from CachedSchemaRegistryClient import *
+from AsyncSchemaRegistryClient import *
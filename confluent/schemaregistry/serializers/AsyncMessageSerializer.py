@@ -0,0 +1,105 @@
+import struct
+
+from . import SerializerError
+from .MessageSerializer import MessageSerializer, MAGIC_BYTE
+from ..Futures import call, chain
+from ..client import ClientError
+
+def _fail_with(message, errors=Exception):
+    """
+    Return an errback raising SerializerError(message) for registry failures
+    of the given types, as MessageSerializer does for the same call.
+    """
+    def errback(e):
+        if isinstance(e, errors):
+            raise SerializerError(message)
+        raise e
+    return errback
+
+class AsyncMessageSerializer(object):
+    """
+    A non blocking counterpart of MessageSerializer for use with an
+    AsyncSchemaRegistryClient.
+
+    Every method returns a Future.  When the schema is already cached the
+    record is encoded or decoded right away on the calling thread and the
+    future is already completed.  Only a cache miss waits on the registry,
+    after which the work finishes on the client's I/O thread.
+    """
+    def __init__(self, async_client, **kwargs):
+        """
+        Keyword arguments are passed to the underlying MessageSerializer,
+        which is available as the serializer attribute.
+        """
+        self.async_client = async_client
+        self.serializer = MessageSerializer(async_client.client, **kwargs)
+
+    def encode_record_with_schema(self, topic, schema, record, is_key=False):
+        """
+        Given a parsed avro schema, encode a record for the given topic.
+
+        The schema is registered with the subject of 'topic-value'
+        """
+        serializer = self.serializer
+        if not isinstance(record, dict):
+            return call(serializer.encode_record_with_schema, topic, schema, record, is_key)
+        subject = topic + ('-key' if is_key else '-value')
+        def encode(schema_id):
+            return serializer.encode_record_with_schema(topic, schema, record, is_key)
+        message = "Unable to retrieve schema id for subject %s" % (subject)
+        return chain(self.async_client.register(subject, schema), encode, _fail_with(message))
+
+    def encode_record_for_topic(self, topic, record, is_key=False):
+        """
+        Encode a record with the latest schema for a given topic.
+        """
+        serializer = self.serializer
+        if not isinstance(record, dict):
+            return call(serializer.encode_record_for_topic, topic, record, is_key)
+        subject = topic + ('-key' if is_key else '-value')
+        def encode(latest):
+            schema_id, schema, version = latest
+            if schema_id is None:
+                message = "Unable to retrieve schema id for subject %s" % (subject)
+                raise SerializerError(message)
+            serializer._cache_writer(schema_id, schema)
+            return serializer.encode_record_with_schema_id(schema_id, record)
+        message = "Unable to retrieve schema id for subject %s" % (subject)
+        return chain(self.async_client.get_latest_schema(subject), encode,
+                     _fail_with(message, ClientError))
+
+    def encode_record_with_schema_id(self, schema_id, record):
+        """
+        Encode a record with a given schema id.  The record must
+        be a python dictionary.
+        """
+        serializer = self.serializer
+        if schema_id in serializer.id_to_writers or not isinstance(record, dict):
+            return call(serializer.encode_record_with_schema_id, schema_id, record)
+        def encode(schema):
+            if not schema:
+                raise SerializerError("Schema does not exist")
+            serializer._cache_writer(schema_id, schema)
+            return serializer.encode_record_with_schema_id(schema_id, record)
+        return chain(self.async_client.get_by_id(schema_id), encode,
+                     _fail_with("Error fetching schema from registry", ClientError))
+
+    def decode_message(self, message, reader_schema=None, fields=None, lazy=False):
+        """
+        Decode a message from kafka that has been encoded for use with
+        the schema registry, optionally with a reader schema, projection or
+        as a view (see MessageSerializer.decode_message).
+        """
+        serializer = self.serializer
+        if len(message) <= 5:
+            return call(serializer.decode_message, message, reader_schema, fields, lazy)
+        magic,schema_id = struct.unpack_from('>bI', message)
+        key = serializer._decoder_key(schema_id, reader_schema, fields, 'lazy' if lazy else None)
+        if magic != MAGIC_BYTE or key in serializer.id_to_decoder_func:
+            return call(serializer.decode_message, message, reader_schema, fields, lazy)
+        err = "unable to fetch schema with id %d" % (schema_id)
+        def decode(schema):
+            if not schema:
+                raise SerializerError(err)
+            return serializer.decode_message(message, reader_schema, fields, lazy)
+        return chain(self.async_client.get_by_id(schema_id), decode, _fail_with(err))
@@ -0,0 +1,342 @@
+"""
+Decodes batches of messages of one schema into a column of values per field
+instead of a dict per record.
+
+Numbers are kept in numpy arrays when numpy is installed and in array.array
+otherwise.  Strings and bytes are kept as one data buffer with the offsets of
+each value, and fields of nullable unions get a validity mask.
+"""
+import array
+import collections
+
+from avro import io
+
+from .SchemaCompiler import _Compiler, _PROMOTIONS, _RECORD_TYPES, _default
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# column type => array typecode of its values
+_TYPECODES = {
+    'boolean' : 'B',
+    'int' : 'i',
+    'long' : 'l',
+    'float' : 'f',
+    'double' : 'd',
+    'enum' : 'i'
+}
+_BUFFER_TYPES = ('string', 'bytes', 'fixed')
+_COLUMN_TYPES = tuple(_TYPECODES) + _BUFFER_TYPES
+
+def _to_numpy(buf, dtype):
+    """Return an array.array or str as a numpy array without copying it"""
+    if not len(buf):
+        return numpy.zeros(0, dtype)
+    return numpy.frombuffer(buf, dtype)
+
+class Column(object):
+    """
+    The values of one field for a batch of records.
+
+    type is the avro type of the values, or 'object' for types kept as a
+    list of python values: arrays, maps, records that cannot be flattened
+    and unions other than a type and null.
+
+    values: the numbers, booleans, index of each enum value in symbols, or
+    the list of objects.  None for string, bytes and fixed.
+    data: for string, bytes and fixed, the bytes of every value back to back.
+    Strings are utf-8 encoded.
+    offsets: for string and bytes, value i is data[offsets[i]:offsets[i + 1]].
+    Fixed values are size bytes each.
+    validity: for nullable fields, 1 where there is a value and 0 where it is
+    null.  The values of nulls are zero or empty.
+    """
+    def __init__(self, type, length, values=None, data=None, offsets=None, validity=None,
+                 symbols=None, size=None):
+        self.type = type
+        self.length = length
+        self.values = values
+        self.data = data
+        self.offsets = offsets
+        self.validity = validity
+        self.symbols = symbols
+        self.size = size
+
+    def __len__(self):
+        return self.length
+
+    def to_list(self):
+        """Return the values as a list of python values, with None for nulls"""
+        if self.type in _BUFFER_TYPES:
+            raw = self.data.tostring()
+            if self.type == 'fixed':
+                values = [ raw[i * self.size:(i + 1) * self.size] for i in xrange(self.length) ]
+            else:
+                offsets = list(self.offsets)
+                values = [ raw[offsets[i]:offsets[i + 1]] for i in xrange(self.length) ]
+                if self.type == 'string':
+                    values = [ v.decode('utf-8') for v in values ]
+        elif self.type == 'enum':
+            values = [ self.symbols[i] for i in self.values ]
+        elif self.type == 'boolean':
+            values = [ bool(v) for v in self.values ]
+        elif self.type == 'object':
+            values = list(self.values)
+        else:
+            values = self.values.tolist()
+        if self.validity is None:
+            return values
+        return [ v if valid else None for v, valid in zip(values, self.validity) ]
+
+class _ColumnSpec(object):
+    """A column as it is generated: its type and the arguments receiving its buffers"""
+    def __init__(self, compiler, name, path, type, nullable, symbols=None, size=None):
+        self.name = name
+        # indexes of the reader fields leading to the column, to order columns
+        self.path = path
+        self.type = type
+        self.nullable = nullable
+        self.symbols = symbols
+        self.size = size
+        self.values = compiler.var('A') if type not in _BUFFER_TYPES else None
+        self.data = compiler.var('D') if type in _BUFFER_TYPES else None
+        self.offsets = compiler.var('O') if type in ('string', 'bytes') else None
+        # running length of data, the next offset
+        self.total = compiler.var('t') if self.offsets else None
+        self.validity = compiler.var('M') if nullable else None
+
+    def args(self):
+        return [ a for a in (self.values, self.data, self.offsets, self.validity) if a ]
+
+    def buffers(self):
+        """Return new (values, data, offsets, validity) buffers"""
+        values = data = offsets = validity = None
+        if self.type == 'object':
+            values = []
+        elif self.type in _TYPECODES:
+            values = array.array(_TYPECODES[self.type])
+        else:
+            data = []
+        if self.offsets:
+            offsets = array.array('l', [0])
+        if self.nullable:
+            validity = array.array('B')
+        return (values, data, offsets, validity)
+
+    def column(self, buffers, length):
+        values, data, offsets, validity = buffers
+        if data is not None:
+            data = ''.join(data)
+            data = _to_numpy(data, numpy.uint8) if numpy else array.array('B', data)
+        if numpy:
+            if self.type == 'boolean':
+                values = _to_numpy(values, numpy.bool_)
+            elif self.type in _TYPECODES:
+                values = _to_numpy(values, _TYPECODES[self.type])
+            if offsets is not None:
+                offsets = _to_numpy(offsets, 'l')
+            if validity is not None:
+                validity = _to_numpy(validity, numpy.bool_)
+        return Column(self.type, length, values, data, offsets, validity, self.symbols, self.size)
+
+class _ColumnCompiler(_Compiler):
+    def __init__(self):
+        _Compiler.__init__(self)
+        self.specs = []
+
+    def add_column(self, name, path, reader):
+        """Return the _ColumnSpec of a reader schema that is not a record"""
+        schema, nullable = reader, False
+        if reader.type == 'union':
+            others = [ b for b in reader.schemas if b.type != 'null' ]
+            if len(others) == 1:
+                schema, nullable = others[0], len(reader.schemas) == 2
+        if schema.type not in _COLUMN_TYPES:
+            spec = _ColumnSpec(self, name, path, 'object', False)
+        else:
+            spec = _ColumnSpec(self, name, path, schema.type, nullable,
+                               list(schema.symbols) if schema.type == 'enum' else None,
+                               schema.size if schema.type == 'fixed' else None)
+        self.specs.append(spec)
+        return (spec, schema)
+
+    def put_null(self, spec, lines, ind):
+        if spec.type in _TYPECODES:
+            lines.append(ind + '%s(0)' % (spec.values))
+        elif spec.type == 'fixed':
+            lines.append(ind + '%s(%r)' % (spec.data, '\x00' * spec.size))
+        else:
+            lines.append(ind + '%s(%s)' % (spec.offsets, spec.total))
+        lines.append(ind + '%s(0)' % (spec.validity))
+
+    def put_constant(self, spec, value, reader, lines, ind):
+        if spec.type == 'object':
+            lines.append(ind + '%s(deepcopy(%s))' % (spec.values, self.const('F', value)))
+            return
+        if value is None:
+            if not spec.nullable:
+                raise io.SchemaResolutionException('Default of %s is null' % (spec.name), reader, reader)
+            self.put_null(spec, lines, ind)
+            return
+        if spec.type in ('string', 'bytes', 'fixed'):
+            if spec.type == 'string':
+                value = value.encode('utf-8')
+            else:
+                # json strings hold bytes as code points 0-255
+                value = value.encode('latin-1')
+            lines.append(ind + '%s(%r)' % (spec.data, value))
+            if spec.offsets:
+                lines.append(ind + '%s += %d' % (spec.total, len(value)))
+                lines.append(ind + '%s(%s)' % (spec.offsets, spec.total))
+        elif spec.type == 'enum':
+            lines.append(ind + '%s(%d)' % (spec.values, spec.symbols.index(value)))
+        else:
+            lines.append(ind + '%s(%r)' % (spec.values, value))
+        if spec.nullable:
+            lines.append(ind + '%s(1)' % (spec.validity))
+
+    def put_value(self, writer, spec, reader, lines, ind):
+        """Append the lines reading a value written with writer into a column of reader values"""
+        writer_type = writer.type
+        if writer_type == 'union':
+            index = self.var('u')
+            self.read_long(index, lines, ind)
+            for i, branch in enumerate(writer.schemas):
+                lines.append(ind + '%s %s == %d:' % ('if' if i == 0 else 'elif', index, i))
+                body = []
+                try:
+                    self.put_value(branch, spec, reader, body, ind + '    ')
+                except io.SchemaResolutionException:
+                    # only an error if the writer used this branch
+                    body = [ ind + '    ' + self.fail(repr('Can\'t read branch %d of the writer union' % (i)),
+                                                      writer, reader) ]
+                lines.extend(body)
+            lines.append(ind + 'else:')
+            lines.append(ind + '    ' + self.fail('"Can\'t access branch index %%d for union with %d branches" %% (%s)'
+                                                  % (len(writer.schemas), index), writer, reader))
+            return
+        if writer_type == 'null':
+            if not spec.nullable:
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            self.put_null(spec, lines, ind)
+            return
+
+        if spec.type in ('string', 'bytes'):
+            if writer_type not in ('string', 'bytes'):
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            size = self.var('l')
+            self.read_long(size, lines, ind)
+            lines.append(ind + '%s(buf[p:p + %s])' % (spec.data, size))
+            lines.append(ind + 'p += %s' % (size))
+            lines.append(ind + '%s += %s' % (spec.total, size))
+            lines.append(ind + '%s(%s)' % (spec.offsets, spec.total))
+        elif spec.type in ('fixed', 'enum'):
+            # resolve checks the names, sizes and symbols
+            value = self.var('v')
+            self.resolve(writer, reader, value, lines, ind)
+            if spec.type == 'fixed':
+                lines.append(ind + '%s(%s)' % (spec.data, value))
+            else:
+                table = self.const('S', dict((s, i) for i, s in enumerate(spec.symbols)))
+                lines.append(ind + '%s(%s[%s])' % (spec.values, table, value))
+        else:
+            if writer_type != spec.type and spec.type not in _PROMOTIONS.get(writer_type, ()):
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            value = self.var('v')
+            self.read_primitive(writer_type, value, lines, ind)
+            lines.append(ind + '%s(%s)' % (spec.values, value))
+        if spec.nullable:
+            lines.append(ind + '%s(1)' % (spec.validity))
+
+    def field_columns(self, writer, reader, name, path, lines, ind):
+        """Append the lines reading a field written with writer into the columns of reader"""
+        if writer.type in _RECORD_TYPES and reader.type in _RECORD_TYPES:
+            self.record_columns(writer, reader, None, name + '.', path, lines, ind)
+            return
+        spec, schema = self.add_column(name, path, reader)
+        if spec.type == 'object':
+            value = self.var('v')
+            self.resolve(writer, reader, value, lines, ind)
+            lines.append(ind + '%s(%s)' % (spec.values, value))
+        else:
+            self.put_value(writer, spec, schema, lines, ind)
+
+    def default_columns(self, reader, value, name, path, lines, ind):
+        """Append the lines filling the columns of reader with a default value"""
+        if reader.type in _RECORD_TYPES:
+            for i, field in enumerate(reader.fields):
+                self.default_columns(field.type, value[field.name], name + '.' + field.name,
+                                     path + (i,), lines, ind)
+            return
+        spec, schema = self.add_column(name, path, reader)
+        self.put_constant(spec, value, reader, lines, ind)
+
+    def record_columns(self, writer, reader, fields, prefix, path, lines, ind):
+        wanted, matches, missing = self.match_fields(writer, reader, fields)
+        order = dict((f.name, i) for i, f in enumerate(reader.fields))
+        for field, match in zip(writer.fields, matches):
+            if match is None:
+                self.skip(field.type, lines, ind)
+            else:
+                self.field_columns(field.type, match.type, prefix + match.name,
+                                   path + (order[match.name],), lines, ind)
+        for field in missing:
+            self.default_columns(field.type, _default(field), prefix + field.name,
+                                 path + (order[field.name],), lines, ind)
+
+    def compile_columns(self, writer, reader, fields):
+        if writer.type not in _RECORD_TYPES or reader.type not in _RECORD_TYPES:
+            raise io.SchemaResolutionException('Only records can be decoded into columns',
+                                               writer, reader)
+        body = []
+        self.record_columns(writer, reader, fields, '', (), body, '        ')
+        self.specs.sort(key=lambda s: s.path)
+        args = [ a for spec in self.specs for a in spec.args() ]
+        lines = [ 'def b(msgs, p0%s):' % (''.join(', ' + a for a in args)) ]
+        lines.extend('    %s = 0' % (spec.total) for spec in self.specs if spec.total)
+        lines.append('    for buf in msgs:')
+        lines.append('        p = p0')
+        lines.extend(body)
+        self.functions.append('\n'.join(lines))
+        source = self.load(writer)
+        return ColumnDecoder(self.specs, self.namespace['b'], source)
+
+class ColumnDecoder(object):
+    """
+    Decodes batches of records of one schema into columns.  Create one with
+    compile_columns.  source holds the generated code.
+    """
+    def __init__(self, specs, batch, source):
+        self.specs = specs
+        self.source = source
+        self._batch = batch
+
+    def names(self):
+        """Return the names of the columns, in reader field order"""
+        return [ spec.name for spec in self.specs ]
+
+    def decode(self, buffers, start=0):
+        """
+        Decode the record starting at start in each str of buffers and return
+        an OrderedDict of the Column of each field.  Fields of nested records
+        are flattened into columns named 'field.nested_field'.
+        """
+        all_buffers = [ spec.buffers() for spec in self.specs ]
+        args = [ b.append for bufs in all_buffers for b in bufs if b is not None ]
+        self._batch(buffers, start, *args)
+        length = len(buffers)
+        return collections.OrderedDict((spec.name, spec.column(bufs, length))
+                                       for spec, bufs in zip(self.specs, all_buffers))
+
+def compile_columns(writer, reader=None, fields=None):
+    """
+    Return the ColumnDecoder of records written with the writer schema,
+    resolved against a reader schema and keeping only some fields as
+    SchemaCompiler.compile_resolver.  Both schemas must be records.  Each
+    call compiles a new decoder, as compile_resolver.
+    """
+    if fields is not None:
+        fields = tuple(sorted(set(fields)))
+    return _ColumnCompiler().compile_columns(writer, reader or writer, fields)
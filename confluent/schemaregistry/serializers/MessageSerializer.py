@@ -1,21 +1,48 @@
 from avro import io
 import StringIO
+import collections
+import cStringIO
 import json
 import struct
 import sys
+import time
 
-from . import SerializerError
+from . import SerializerError, Util
+from .ColumnDecoder import compile_columns
+from .SchemaCompiler import compile_resolver, compile_schema, compile_view
+from ..LRUCache import LRUCache
+from ..client import ClientError
 
 MAGIC_BYTE = 0
 
+# codec backends a MessageSerializer can use
+BACKENDS = ('auto', 'avro', 'compiled', 'fastavro')
+
 HAS_FAST = False
 try:
-    from fastavro.reader import read_data
+    from fastavro import parse_schema, schemaless_reader, schemaless_writer
     HAS_FAST = True
-except:
+except ImportError:
     pass
 
 
+def _to_str(buf):
+    """Return the contents of a str, bytearray, memoryview or buffer as a str"""
+    if isinstance(buf, memoryview):
+        return buf.tobytes()
+    return str(buf)
+
+def _as_buffer(buf):
+    """
+    Return a str, bytearray or buffer as a str or a buffer over it, which
+    compiled decoders read in place, or None for a memoryview
+    """
+    if isinstance(buf, str):
+        return buf
+    if isinstance(buf, (bytearray, buffer)):
+        return buffer(buf)
+    return None
+
 class ContextStringIO(StringIO.StringIO):
     """
     Wrapper to allow use of StringIO via 'with' constructs.
@@ -26,6 +53,138 @@ class ContextStringIO(StringIO.StringIO):
         self.close()
         return False
 
+def _fastavro_schema(schema, prefix, defined=None):
+    """
+    Return the schema as a dict for fastavro, with every name prefixed.
+
+    fastavro resolves references to named types through a registry shared by
+    every schema in the process, which goes wrong when versions of a schema
+    reuse a name with different definitions.  Names are not part of the
+    binary encoding, so a prefix unique to the schema avoids that.
+    """
+    if defined is None:
+        defined = set()
+    schema_type = schema.type
+    if schema_type in ('record', 'error', 'enum', 'fixed'):
+        name = prefix + schema.fullname
+        if name in defined:
+            return name
+        defined.add(name)
+        if schema_type == 'enum':
+            return { 'type' : 'enum', 'name' : name, 'symbols' : list(schema.symbols) }
+        if schema_type == 'fixed':
+            return { 'type' : 'fixed', 'name' : name, 'size' : schema.size }
+        fields = [ { 'name' : f.name, 'type' : _fastavro_schema(f.type, prefix, defined) }
+                   for f in schema.fields ]
+        return { 'type' : 'record', 'name' : name, 'fields' : fields }
+    if schema_type == 'array':
+        return { 'type' : 'array', 'items' : _fastavro_schema(schema.items, prefix, defined) }
+    if schema_type == 'map':
+        return { 'type' : 'map', 'values' : _fastavro_schema(schema.values, prefix, defined) }
+    if schema_type == 'union':
+        return [ _fastavro_schema(s, prefix, defined) for s in schema.schemas ]
+    return schema_type
+
+# branch type => the python values it accepts in avro.io.validate, as a
+# group of types that accept some of the same values
+_VALUE_GROUPS = {
+    'boolean' : 'number', 'int' : 'number', 'long' : 'number', 'float' : 'number', 'double' : 'number',
+    'string' : 'text', 'bytes' : 'text', 'fixed' : 'text', 'enum' : 'text',
+    'record' : 'dict', 'error' : 'dict', 'map' : 'dict',
+    'array' : 'list'
+}
+
+def _ambiguous_union(schema, seen=None):
+    """
+    Return the branch names of the first union in a schema where a value may
+    be valid for several branches, or None.  avro writes the last valid
+    branch and fastavro the first, so their bytes differ for such unions.
+    """
+    if seen is None:
+        seen = set()
+    schema_type = schema.type
+    if schema_type in ('record', 'error'):
+        if schema.fullname in seen:
+            return None
+        seen.add(schema.fullname)
+        children = [ f.type for f in schema.fields ]
+    elif schema_type == 'array':
+        children = [ schema.items ]
+    elif schema_type == 'map':
+        children = [ schema.values ]
+    elif schema_type == 'union':
+        groups = [ _VALUE_GROUPS.get(s.type) for s in schema.schemas ]
+        if len(set(g for g in groups if g)) < len([ g for g in groups if g ]):
+            return [ getattr(s, 'fullname', s.type) for s in schema.schemas ]
+        children = schema.schemas
+    else:
+        return None
+    for child in children:
+        result = _ambiguous_union(child, seen)
+        if result is not None:
+            return result
+    return None
+
+def _fast_schema(schema):
+    """
+    Return a 2-tuple of (the schema parsed by fastavro, or None if fastavro
+    cannot be used for it, the reason).  The result is memoized on the schema.
+    """
+    result = getattr(schema, '_fast_schema', None)
+    if result is None:
+        if not HAS_FAST:
+            result = (None, "fastavro is not installed")
+        else:
+            try:
+                prefix = 'f%x.' % (Util.fingerprint(schema))
+                result = (parse_schema(_fastavro_schema(schema, prefix)), "fastavro supports the schema")
+            except Exception as e:
+                result = (None, "fastavro cannot parse the schema: %s" % (e))
+        schema._fast_schema = result
+    return result
+
+def _choose_backend(schema, policy='auto'):
+    """
+    Return a dict of the 'policy', the 'backend' it selects for a schema and
+    the 'reason'.  'auto' selects fastavro when it supports the schema and
+    avro otherwise, while 'fastavro' raises a SerializerError then.
+
+    The 'writer' and 'writer_reason' are those of encoding.  They differ when
+    fastavro would write other bytes than avro, for a union with branches
+    accepting the same values, and the compiled encoder is used instead.
+    """
+    if policy in ('avro', 'compiled'):
+        reason = "%s was requested" % (policy)
+        return { 'policy' : policy, 'backend' : policy, 'reason' : reason,
+                 'writer' : policy, 'writer_reason' : reason }
+    parsed, reason = _fast_schema(schema)
+    if parsed is None and policy == 'fastavro':
+        raise SerializerError("fastavro is required but cannot be used: %s" % (reason))
+    backend = writer = 'fastavro' if parsed is not None else 'avro'
+    writer_reason = reason
+    if backend == 'fastavro':
+        branches = _ambiguous_union(schema)
+        if branches is not None:
+            writer = 'compiled'
+            writer_reason = "fastavro writes other branches than avro in the union %s" % (
+                json.dumps(branches))
+    return { 'policy' : policy, 'backend' : backend, 'reason' : reason,
+             'writer' : writer, 'writer_reason' : writer_reason }
+
+def _create_writer(schema, backend='auto'):
+    """
+    Return a function that writes a record with a schema to a file like
+    object, using the writer selected by the given policy.
+    """
+    backend = _choose_backend(schema, backend)['writer']
+    if backend == 'compiled':
+        return compile_schema(schema).write
+    if backend == 'fastavro':
+        parsed = _fast_schema(schema)[0]
+        return lambda record, outf: schemaless_writer(outf, parsed, record)
+    writer = io.DatumWriter(schema)
+    return lambda record, outf: writer.write(record, io.BinaryEncoder(outf))
+
 class MessageSerializer(object):
     """
     A helper class that can serialize and deserialize messages
@@ -33,11 +192,100 @@ class MessageSerializer(object):
 
     All encode_* methods return a buffer that can be sent to kafka.
     All decode_* methods expect a buffer received from kafka.
+
+    Records are encoded and decoded by the backend selected by one of the
+    BACKENDS policies:
+
+    auto: fastavro when it is installed and supports the schema, and the avro
+    library otherwise
+    fastavro: fastavro only, raising a SerializerError for a schema it does
+    not support
+    avro: the avro library only
+    compiled: python code generated for each schema by SchemaCompiler
+
+    The backend is selected once per schema id from the schema alone, and
+    backend_info tells which one each schema id uses and why.  All produce
+    the same bytes, but an invalid record raises the error of the backend
+    used.
+
+    The decode_* methods also accept a reader schema to resolve the writer
+    schema against, and fields to keep only some fields of the top-level
+    record.  Those decoders are always compiled, and step over the bytes of
+    fields that are not wanted instead of decoding them.  With lazy set,
+    records are decoded as RecordViews that decode each field when it is
+    first accessed.  decode_columns decodes a batch of messages into a
+    column per field instead.
     """
-    def __init__(self, registry_client):
+    def __init__(self, registry_client, max_codecs=None, max_codec_bytes=None, codec_ttl=None,
+                 backend='auto', schema_backends=None):
+        """
+        Encoders and decoders are cached per schema id and evicted least
+        recently used first once there are more than max_codecs of each, or
+        their estimated size exceeds max_codec_bytes.  If codec_ttl is set,
+        they are rebuilt after that many seconds.  None means unbounded.
+
+        backend is the policy of every schema id, unless schema_backends
+        maps the id to another.
+        """
+        schema_backends = dict(schema_backends or { })
+        for policy in [backend] + schema_backends.values():
+            self._check_backend(policy)
         self.registry_client = registry_client
-        self.id_to_decoder_func = { }
-        self.id_to_writers = { }
+        self.backend = backend
+        self.schema_backends = schema_backends
+        # schema id => the backend selected, see backend_info, bounded like
+        # the codecs it is selected for
+        self.backend_choices = LRUCache(max_codecs, ttl=codec_ttl)
+        self.id_to_decoder_func = LRUCache(max_codecs, max_codec_bytes, codec_ttl)
+        self.id_to_writers = LRUCache(max_codecs, max_codec_bytes, codec_ttl)
+
+    def _check_backend(self, policy):
+        if policy not in BACKENDS:
+            raise SerializerError("Invalid backend specified: %s" % (str(policy)))
+        if policy == 'fastavro' and not HAS_FAST:
+            raise SerializerError("fastavro is required but not installed")
+
+    def _choice(self, schema_id, schema):
+        """Select the backend of a schema id, once"""
+        choice = self.backend_choices.get(schema_id)
+        if choice is None:
+            policy = self.schema_backends.get(schema_id, self.backend)
+            choice = _choose_backend(schema, policy)
+            self.backend_choices[schema_id] = choice
+        return choice
+
+    def set_backend(self, schema_id, backend):
+        """
+        Set the backend policy of a schema id.  Its codecs are rebuilt with
+        the new policy when next used.
+        """
+        self._check_backend(backend)
+        self.schema_backends[schema_id] = backend
+        self.backend_choices.pop(schema_id, None)
+        self.id_to_writers.pop(schema_id, None)
+        self.id_to_decoder_func.pop(schema_id, None)
+
+    def backend_info(self, schema_id=None):
+        """
+        Return the dict of the 'policy', the 'backend' selected and the
+        'reason' for a schema id, and the 'writer' and 'writer_reason' of
+        encoding, or None if it has no codecs yet or the choice was
+        evicted.  Without a schema id, return those of every schema id by id.
+
+        This covers the encoder and plain decoder.  Decoders with a reader
+        schema, projection, views or columns are always compiled.
+        """
+        if schema_id is None:
+            return dict((i, dict(c)) for i, c in self.backend_choices.items())
+        choice = self.backend_choices.get(schema_id)
+        return dict(choice) if choice is not None else None
+
+    def _cache_writer(self, schema_id, schema):
+        writer = self.id_to_writers.get(schema_id)
+        if writer is None:
+            writer = _create_writer(schema, self._choice(schema_id, schema)['writer'])
+            self.id_to_writers.set(schema_id, writer, Util.schema_size(schema))
+        return writer
 
     def encode_record_with_schema(self, topic, schema, record, is_key=False):
         """
@@ -62,7 +310,7 @@ class MessageSerializer(object):
             raise SerializerError(message)
 
         # cache writer
-        self.id_to_writers[schema_id] = io.DatumWriter(schema)
+        self._cache_writer(schema_id, schema)
         return self.encode_record_with_schema_id(schema_id, record)
 
     # subject = topic + suffix
@@ -70,7 +318,8 @@ class MessageSerializer(object):
         """
         Encode a record for a given topic.
 
-        This is expensive as it fetches the latest schema for a given topic.
+        This is expensive as it fetches the latest schema for a given topic,
+        unless the registry client caches latest schemas (see latest_schema_ttl).
         """
         if not isinstance(record, dict):
             raise SerializerError("record must be a dictionary")
@@ -84,29 +333,30 @@ class MessageSerializer(object):
             raise SerializerError(message)
         else:
             # cache writer
-            self.id_to_writers[schema_id] = io.DatumWriter(schema)
+            self._cache_writer(schema_id, schema)
             return self.encode_record_with_schema_id(schema_id, record)
 
-    def encode_record_with_schema_id(self, schema_id, record):
-        """
-        Encode a record with a given schema id.  The record must
-        be a python dictionary.
-        """
-        if not isinstance(record, dict):
-            raise SerializerError("record must be a dictionary")
-        # use slow avro
-        if schema_id not in self.id_to_writers:
+    def _get_writer(self, schema_id):
+        writer = self.id_to_writers.get(schema_id)
+        if writer is None:
             # get the writer + schema
             try:
                 schema = self.registry_client.get_by_id(schema_id)
                 if not schema:
                     raise SerializerError("Schema does not exist")
-                self.id_to_writers[schema_id] = io.DatumWriter(schema)
+                writer = self._cache_writer(schema_id, schema)
             except ClientError as e:
                 raise SerializerError("Error fetching schema from registry")
+        return writer
 
-        # get the writer
-        writer = self.id_to_writers[schema_id]
+    def encode_record_with_schema_id(self, schema_id, record):
+        """
+        Encode a record with a given schema id.  The record must
+        be a python dictionary.
+        """
+        if not isinstance(record, dict):
+            raise SerializerError("record must be a dictionary")
+        writer = self._get_writer(schema_id)
         with ContextStringIO() as outf:
             # write the header
             # magic byte
@@ -114,19 +364,56 @@ class MessageSerializer(object):
             # write the schema ID in network byte order (big end)
             outf.write(struct.pack('>I',schema_id))
             # write the record to the rest of it
-            # Create an encoder that we'll write to
-            encoder = io.BinaryEncoder(outf)
-            # write the magic byte
-            # write the object in 'obj' as Avro to the fake file...
-            writer.write(record, encoder)
+            writer(record, outf)
 
             return outf.getvalue()
 
 
+    def encode_records(self, schema_id, records, contiguous=False):
+        """
+        Encode a batch of records, each a python dictionary, with a given
+        schema id.  The header is packed once and all records are written
+        into one buffer.
+
+        Returns the list of encoded messages.  If contiguous is set, returns a
+        2-tuple of (a buffer of all messages back to back, a list of offsets)
+        instead, where message i is buffer[offsets[i]:offsets[i + 1]].
+        """
+        writer = self._get_writer(schema_id)
+        header = struct.pack('>bI', MAGIC_BYTE, schema_id)
+        outf = cStringIO.StringIO()
+        offsets = [0]
+        for record in records:
+            if not isinstance(record, dict):
+                raise SerializerError("record must be a dictionary")
+            outf.write(header)
+            writer(record, outf)
+            offsets.append(outf.tell())
+        data = outf.getvalue()
+        if contiguous:
+            return (data, offsets)
+        return [ data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1) ]
+
     # Decoder support
-    def _get_decoder_func(self, schema_id, payload):
-        if schema_id in self.id_to_decoder_func:
-            return self.id_to_decoder_func[schema_id]
+    def _decoder_key(self, schema_id, reader_schema=None, fields=None, mode=None):
+        """
+        Return the key of a decoder: the schema id, or (schema id, reader
+        full fingerprint, fields, mode) where mode is None for dicts, 'lazy'
+        for RecordViews or 'columns' for a ColumnDecoder.  The full
+        fingerprint keeps the defaults and aliases resolution depends on.
+        """
+        if reader_schema is None and fields is None and mode is None:
+            return schema_id
+        if fields is not None:
+            fields = tuple(sorted(set(fields)))
+        reader_fp = Util.full_fingerprint(reader_schema) if reader_schema is not None else None
+        return (schema_id, reader_fp, fields, mode)
+
+    def _get_decoder_func(self, schema_id, reader_schema=None, fields=None, mode=None):
+        key = self._decoder_key(schema_id, reader_schema, fields, mode)
+        decoder_func = self.id_to_decoder_func.get(key)
+        if decoder_func is not None:
+            return decoder_func
 
         # fetch from schema reg
         try:
@@ -137,46 +424,242 @@ class MessageSerializer(object):
         if not schema:
             err = "unable to fetch schema with id %d" % (schema_id)
             raise SerializerError(err)
+        if mode == 'lazy':
+            return self._create_view_decoder(key, schema, reader_schema, fields)
+        if mode == 'columns':
+            return self._create_column_decoder(key, schema, reader_schema, fields)
+        if key != schema_id:
+            return self._create_resolving_decoder(key, schema, reader_schema, fields)
+        return self._create_decoder_func(schema_id, schema)
+
+    def _create_resolving_decoder(self, key, schema, reader_schema, fields):
+        """Build and cache the decoder reading a writer schema as a reader schema or projection"""
+        try:
+            codec = compile_resolver(schema, reader_schema, fields)
+        except io.SchemaResolutionException as e:
+            raise SerializerError("unable to resolve schema with id %d: %s" % (key[0], e))
+        def decoder(p):
+            return codec.read(p)
+        decoder.decode_buffer = codec.decode
+        self.id_to_decoder_func.set(key, decoder, Util.schema_size(schema))
+        return decoder
+
+    def _create_view_decoder(self, key, schema, reader_schema, fields):
+        """Build and cache the function(buf, pos) returning a RecordView"""
+        try:
+            layout = compile_view(schema, reader_schema, fields)
+        except io.SchemaResolutionException as e:
+            raise SerializerError("unable to view schema with id %d: %s" % (key[0], e))
+        self.id_to_decoder_func.set(key, layout.view, Util.schema_size(schema))
+        return layout.view
+
+    def _create_column_decoder(self, key, schema, reader_schema, fields):
+        """Build and cache the ColumnDecoder of a schema id"""
+        try:
+            decoder = compile_columns(schema, reader_schema, fields)
+        except io.SchemaResolutionException as e:
+            raise SerializerError("unable to decode schema with id %d into columns: %s" % (key[0], e))
+        self.id_to_decoder_func.set(key, decoder, Util.schema_size(schema))
+        return decoder
+
+    def _create_decoder_func(self, schema_id, schema):
+        """Build and cache the decoder for a schema id with its backend"""
+        backend = self._choice(schema_id, schema)['backend']
+        if backend == 'compiled':
+            codec = compile_schema(schema)
+            def decoder(p):
+                return codec.read(p)
+            # lets str buffers be decoded in place
+            decoder.decode_buffer = codec.decode
+        elif backend == 'fastavro':
+            parsed = _fast_schema(schema)[0]
+            def decoder(p):
+                return schemaless_reader(p, parsed)
+        else:
+            avro_reader = io.DatumReader(schema)
+            def decoder(p):
+                bin_decoder = io.BinaryDecoder(p)
+                return avro_reader.read(bin_decoder)
+
+        self.id_to_decoder_func.set(schema_id, decoder, Util.schema_size(schema))
+        return decoder
+
+    def prefetch(self, subjects=None, ids=None, max_workers=8):
+        """
+        Load the schemas of the given subjects and schema ids through the
+        registry client (see CachedSchemaRegistryClient.prefetch) and build
+        their encoders and decoders ahead of time.
+
+        Returns the report of the registry client with the number of 'codecs'
+        built added and 'seconds' covering the whole warm up.
+        """
+        start = time.time()
+        report = self.registry_client.prefetch(subjects, ids, max_workers)
+        codecs = 0
+        for schema_id in report['ids']:
+            schema = self.registry_client.get_by_id(schema_id)
+            try:
+                self._cache_writer(schema_id, schema)
+                if schema_id not in self.id_to_decoder_func:
+                    self._create_decoder_func(schema_id, schema)
+            except SerializerError as e:
+                report['errors'][schema_id] = e.message
+                continue
+            codecs += 1
+        report['codecs'] = codecs
+        report['seconds'] = time.time() - start
+        return report
 
-        curr_pos = payload.tell()
-        if HAS_FAST:
-            # try to use fast avro
+    def decode_messages(self, messages, max_workers=8, reader_schema=None, fields=None, lazy=False):
+        """
+        Decode a batch of messages from kafka, optionally with a reader schema,
+        projection or as views as decode_message.
+
+        Messages are grouped by schema id.  The schemas of ids without a
+        decoder are fetched together through the registry client's prefetch,
+        with at most max_workers requests in flight, and then each group is
+        decoded in turn.
+
+        Returns a 2-tuple of (the list of decoded records in input order, a
+        dict of the SerializerError of each message that could not be decoded
+        by its index).  The record of a failed message is None.
+        """
+        records = [ ]
+        errors = { }
+        # schema id => indexes of its messages
+        groups = { }
+        for index, message in enumerate(messages):
+            records.append(None)
+            if len(message) <= 5:
+                errors[index] = SerializerError("message is too small to decode")
+                continue
+            magic,schema_id = struct.unpack_from('>bI', message)
+            if magic != MAGIC_BYTE:
+                errors[index] = SerializerError("message does not start with magic byte")
+                continue
+            groups.setdefault(schema_id, []).append(index)
+
+        mode = 'lazy' if lazy else None
+        unknown = [ i for i in groups
+                    if self._decoder_key(i, reader_schema, fields, mode) not in self.id_to_decoder_func ]
+        if unknown:
             try:
-                schema_dict = schema.to_json()
-                obj = read_data(payload, schema_dict)
-                # here means we passed so this is something fastavro can do
-                # seek back since it will be called again for the
-                # same payload - one time hit
-
-                payload.seek(curr_pos)
-                decoder_func = lambda p: read_data(p, schema_dict)
-                self.id_to_decoder_func[schema_id] = decoder_func
-                return self.id_to_decoder_func[schema_id]
-            except:
+                self.registry_client.prefetch(ids=unknown, max_workers=max_workers)
+            except ClientError:
+                # reported per message below
                 pass
 
-        # here means we should just delegate to slow avro
-        # rewind
-        payload.seek(curr_pos)
-        avro_reader = io.DatumReader(schema)
-        def decoder(p):
-            bin_decoder = io.BinaryDecoder(p)
-            return avro_reader.read(bin_decoder)
+        for schema_id, indexes in groups.items():
+            try:
+                decoder_func = self._get_decoder_func(schema_id, reader_schema, fields, mode)
+            except SerializerError as e:
+                for index in indexes:
+                    errors[index] = e
+                continue
+            decode_buffer = getattr(decoder_func, 'decode_buffer', None)
+            for index in indexes:
+                message = messages[index]
+                try:
+                    if lazy:
+                        records[index] = decoder_func(_to_str(message), 5)
+                        continue
+                    if decode_buffer is not None and _as_buffer(message) is not None:
+                        records[index] = decode_buffer(_as_buffer(message), 5)[0]
+                        continue
+                    payload = cStringIO.StringIO(message)
+                    payload.seek(5)
+                    records[index] = decoder_func(payload)
+                except Exception as e:
+                    errors[index] = SerializerError("unable to decode message: %s" % (e))
+        return (records, errors)
+
+    def decode_columns(self, messages, reader_schema=None, fields=None):
+        """
+        Decode a batch of messages written with the same schema id into a
+        column per field, with no dict per record.  reader_schema and fields
+        are as for decode_message.
 
-        self.id_to_decoder_func[schema_id] = decoder
-        return self.id_to_decoder_func[schema_id]
+        Returns an OrderedDict of the ColumnDecoder.Column of each field, in
+        reader order.  Fields of nested records are flattened into columns
+        named 'field.nested_field'.  Numbers are numpy arrays when numpy is
+        installed and array.array otherwise.  Strings and bytes are a data
+        buffer with offsets, and nullable fields have a validity mask.
 
-    def decode_message(self, message):
+        Raises a SerializerError if a message has another schema id than the
+        first or cannot be decoded.
+        """
+        if not messages:
+            return collections.OrderedDict()
+        messages = [ m if isinstance(m, str) else _to_str(m) for m in messages ]
+        schema_id = self._read_header(messages[0], 0)
+        header = messages[0][:5]
+        for index, message in enumerate(messages):
+            if len(message) <= 5 or not message.startswith(header):
+                raise SerializerError("message %d is not framed with schema id %d" % (index, schema_id))
+        decoder = self._get_decoder_func(schema_id, reader_schema, fields, 'columns')
+        try:
+            return decoder.decode(messages, 5)
+        except Exception as e:
+            raise SerializerError("unable to decode messages: %s" % (e))
+
+    def decode_message(self, message, reader_schema=None, fields=None, lazy=False):
         """
         Decode a message from kafka that has been encoded for use with
         the schema registry.
+
+        If a parsed reader_schema is given, the record is resolved from the
+        schema it was written with to the reader schema, following the avro
+        schema resolution rules.  If fields is a list of field names, only
+        those fields of the record are decoded.  Either raises a
+        SerializerError if the schemas do not resolve.
+
+        If lazy is set, a RecordView is returned instead of a dict.  Its
+        fields are decoded when accessed, so errors in the message are raised
+        then.  Only records can be decoded lazily.
         """
-        if len(message) <= 5:
+        if lazy:
+            return self._decode_view(message, 0, reader_schema, fields)
+        return self.decode_message_from(message, 0, reader_schema, fields)[0]
+
+    def _read_header(self, buf, offset):
+        """Check the header of the message at offset and return its schema id"""
+        if len(buf) - offset <= 5:
             raise SerializerError("message is too small to decode")
 
-        with ContextStringIO(message) as payload:
-            magic,schema_id = struct.unpack('>bI',payload.read(5))
-            if magic != MAGIC_BYTE:
-                raise SerializerError("message does not start with magic byte")
-            decoder_func = self._get_decoder_func(schema_id, payload)
-            return decoder_func(payload)
+        magic,schema_id = struct.unpack_from('>bI', buf, offset)
+        if magic != MAGIC_BYTE:
+            raise SerializerError("message does not start with magic byte")
+        return schema_id
+
+    def _decode_view(self, buf, offset, reader_schema, fields):
+        schema_id = self._read_header(buf, offset)
+        view = self._get_decoder_func(schema_id, reader_schema, fields, 'lazy')
+        if not isinstance(buf, str):
+            # the view keeps the buffer, so it must not change
+            buf = _to_str(buf)
+        return view(buf, offset + 5)
+
+    def decode_message_from(self, buf, offset=0, reader_schema=None, fields=None, lazy=False):
+        """
+        Decode a message that starts at offset in a str, bytearray, memoryview
+        or buffer, without copying it, optionally with a reader schema,
+        projection or as a view as decode_message.
+
+        Returns a 2-tuple of (the decoded record, the number of bytes of the
+        message), so that messages packed one after another in a larger buffer
+        can be decoded in turn.
+        """
+        if lazy:
+            view = self._decode_view(buf, offset, reader_schema, fields)
+            return (view, view.end() - offset)
+        schema_id = self._read_header(buf, offset)
+        decoder_func = self._get_decoder_func(schema_id, reader_schema, fields)
+        decode_buffer = getattr(decoder_func, 'decode_buffer', None)
+        if decode_buffer is not None and _as_buffer(buf) is not None:
+            record, end = decode_buffer(_as_buffer(buf), offset + 5)
+            return (record, end - offset)
+        # reads straight from the buffer
+        payload = cStringIO.StringIO(buf)
+        payload.seek(offset + 5)
+        record = decoder_func(payload)
+        return (record, payload.tell() - offset)
@@ -0,0 +1,333 @@
+"""
+Decoding of large batches of messages on a pool of worker processes.
+"""
+import cPickle
+import collections
+import json
+import marshal
+import multiprocessing
+import Queue
+import struct
+import threading
+import time
+
+from . import SerializerError, Util
+from .MessageSerializer import MessageSerializer, _to_str
+from ..client import ClientError
+
+class _SeededClient(object):
+    """
+    The registry client of a worker, holding only the schemas sent to it by
+    the parent.
+    """
+    def __init__(self):
+        self.id_to_schema = { }
+
+    def add(self, schema_id, schema_str):
+        if schema_str is not None:
+            self.id_to_schema[schema_id] = Util.parse_schema_from_string(schema_str)
+
+    def get_by_id(self, schema_id):
+        return self.id_to_schema.get(schema_id, None)
+
+    def prefetch(self, subjects=None, ids=None, max_workers=8):
+        start = time.time()
+        loaded = [ i for i in ids or [] if i in self.id_to_schema ]
+        errors = dict((i, "not found") for i in ids or [] if i not in self.id_to_schema)
+        return {
+            'ids' : sorted(loaded),
+            'schemas' : len(loaded),
+            'subjects' : 0,
+            'errors' : errors,
+            'seconds' : time.time() - start
+        }
+
+def _send(conn, obj):
+    # marshal is several times faster than pickle for the plain dicts, lists
+    # and strings decoders produce, but refuses any other type
+    try:
+        data = 'm' + marshal.dumps(obj)
+    except ValueError:
+        data = 'p' + cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+    conn.send_bytes(data)
+
+def _recv(conn):
+    data = conn.recv_bytes()
+    if data[0] == 'm':
+        return marshal.loads(buffer(data, 1))
+    return cPickle.loads(data[1:])
+
+def _schema_json(schema):
+    return json.dumps(schema.to_json())
+
+def _worker(conn, serializer_args):
+    """
+    The loop of a worker process.  It receives
+
+    ('seed', schemas): schema id => schema json to add and build decoders for
+    ('decode', schemas, reader, messages): schemas as above, reader as
+      (fingerprint, schema json or None when already sent, fields) or None
+    None: exit
+
+    and answers each decode with (records, error message by index).
+
+    Tasks are read by a thread as they arrive, so that the parent sending a
+    chunk never waits on the worker sending a result.  The parent bounds the
+    chunks in flight.
+    """
+    client = _SeededClient()
+    serializer = MessageSerializer(client, **serializer_args)
+    readers = { }
+    tasks = Queue.Queue()
+    def receive():
+        while True:
+            try:
+                task = _recv(conn)
+            except (EOFError, IOError):
+                task = None
+            tasks.put(task)
+            if task is None:
+                break
+    receiver = threading.Thread(target=receive)
+    receiver.daemon = True
+    receiver.start()
+    while True:
+        try:
+            task = tasks.get()
+        except KeyboardInterrupt:
+            break
+        if task is None:
+            break
+        for schema_id, schema_str in task[1].items():
+            client.add(schema_id, schema_str)
+        if task[0] == 'seed':
+            serializer.prefetch(ids=task[1].keys())
+            continue
+        reader, messages = task[2], task[3]
+        reader_schema = fields = None
+        if reader is not None:
+            fp, reader_str, fields = reader
+            if reader_str is not None:
+                readers[fp] = Util.parse_schema_from_string(reader_str)
+            reader_schema = readers.get(fp)
+        try:
+            records, errors = serializer.decode_messages(messages, reader_schema=reader_schema,
+                                                         fields=fields)
+            _send(conn, (records, dict((i, e.message) for i, e in errors.items())))
+        except Exception as e:
+            message = "unable to decode messages: %s" % (e)
+            _send(conn, ([None] * len(messages), dict((i, message) for i in range(len(messages)))))
+    conn.close()
+
+class _Worker(object):
+    """The parent's end of a worker process"""
+    def __init__(self, serializer_args):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker, args=(child, serializer_args))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        # schema ids and reader fingerprints sent to the worker
+        self.schema_ids = set()
+        self.readers = set()
+        # decode tasks sent to the worker and results received from it, as
+        # the worker answers in order
+        self.sent = 0
+        self.received = 0
+
+    def decode(self, task):
+        """Send a decode task and return its sequence number"""
+        _send(self.conn, task)
+        self.sent += 1
+        return self.sent - 1
+
+    def receive(self, seq):
+        """
+        Return the result of the decode task seq, discarding those of earlier
+        tasks no longer waited for.
+        """
+        if seq < self.received:
+            raise SerializerError("results of the batch were discarded by a later batch")
+        while True:
+            try:
+                result = _recv(self.conn)
+            except (EOFError, IOError):
+                raise SerializerError("decode worker %d exited" % (self.process.pid))
+            self.received += 1
+            if self.received > seq:
+                return result
+
+class ParallelDecoder(object):
+    """
+    Decodes batches of messages as MessageSerializer.decode_messages, spread
+    over a pool of worker processes.
+
+    Each worker has its own MessageSerializer.  The parent fetches schemas
+    through its registry client and sends each worker a schema only the first
+    time a message it is given needs it, so workers keep their decoders
+    between batches.  Messages are sent in chunks of chunk_size and at most
+    max_pending chunks per worker are in flight: a larger chunk_size
+    amortizes the cost of sending, while max_pending keeps workers busy
+    without reading the input far ahead of the results.
+
+    Records are returned in input order.  Lazy views and columns are not
+    supported, as views only decode in the process holding the buffer.
+    """
+    def __init__(self, registry_client, processes=None, chunk_size=500, max_pending=2,
+                 **kwargs):
+        """
+        processes defaults to the number of cpus.  Keyword arguments are
+        passed to the MessageSerializer of each worker.
+        """
+        if chunk_size < 1 or max_pending < 1:
+            raise SerializerError("chunk_size and max_pending must be positive")
+        self.registry_client = registry_client
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        # validate the arguments before starting any process
+        MessageSerializer(registry_client, **kwargs)
+        self.workers = [ _Worker(kwargs) for i in range(processes or multiprocessing.cpu_count()) ]
+        # schema id => schema json of the schemas found; misses are not kept,
+        # so schemas registered later are found
+        self.schemas = { }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop the workers"""
+        workers, self.workers = self.workers, [ ]
+        for worker in workers:
+            try:
+                _send(worker.conn, None)
+            except IOError:
+                pass
+        for worker in workers:
+            worker.process.join()
+            worker.conn.close()
+
+    def _schema(self, schema_id):
+        if schema_id not in self.schemas:
+            schema = self.registry_client.get_by_id(schema_id)
+            if schema is None:
+                return None
+            self.schemas[schema_id] = _schema_json(schema)
+        return self.schemas[schema_id]
+
+    def _new_schemas(self, worker, schema_ids):
+        new = { }
+        for schema_id in schema_ids:
+            if schema_id not in worker.schema_ids:
+                try:
+                    new[schema_id] = self._schema(schema_id)
+                except ClientError:
+                    new[schema_id] = None
+                if new[schema_id] is None:
+                    # the worker reports its messages, and it is retried with the next chunk
+                    continue
+                worker.schema_ids.add(schema_id)
+        return new
+
+    def warm(self, ids):
+        """
+        Send the schemas of the given ids to every worker and have them build
+        their decoders ahead of the first batch.
+        """
+        if not self.workers:
+            raise SerializerError("decoder is closed")
+        for worker in self.workers:
+            new = self._new_schemas(worker, ids)
+            if new:
+                _send(worker.conn, ('seed', new))
+
+    def _run(self, chunks, reader_schema, fields):
+        """
+        Send (tag, messages) chunks to the workers in turn and yield
+        (tag, records, errors) for each in the same order.
+
+        If the caller stops early, the results of the chunks in flight are
+        read and dropped when the generator is closed, and skipped by the
+        next run otherwise.
+        """
+        if not self.workers:
+            raise SerializerError("decoder is closed")
+        reader_fp = Util.full_fingerprint(reader_schema) if reader_schema is not None else None
+        fields = list(fields) if fields is not None else None
+        limit = len(self.workers) * self.max_pending
+        pending = collections.deque()
+        turn = 0
+        try:
+            for tag, messages in chunks:
+                if len(pending) >= limit:
+                    yield self._collect(pending.popleft())
+                worker = self.workers[turn % len(self.workers)]
+                turn += 1
+                headers = set(m[1:5] for m in messages if len(m) > 5)
+                schema_ids = [ struct.unpack('>I', h)[0] for h in headers ]
+                reader = None
+                if reader_schema is not None or fields is not None:
+                    reader_str = None
+                    if reader_fp is not None and reader_fp not in worker.readers:
+                        reader_str = _schema_json(reader_schema)
+                        worker.readers.add(reader_fp)
+                    reader = (reader_fp, reader_str, fields)
+                seq = worker.decode(('decode', self._new_schemas(worker, schema_ids), reader, messages))
+                pending.append((worker, seq, tag))
+            while pending:
+                yield self._collect(pending.popleft())
+        finally:
+            for entry in pending:
+                try:
+                    self._collect(entry)
+                except SerializerError:
+                    pass
+
+    def _collect(self, entry):
+        worker, seq, tag = entry
+        records, errors = worker.receive(seq)
+        return (tag, records, errors)
+
+    def imap(self, batches, reader_schema=None, fields=None):
+        """
+        Decode each batch of messages of an iterable and yield its 2-tuple of
+        (records, errors) as decode_messages, in order.
+
+        Batches are split into chunks and read from the iterable only as
+        fast as results are consumed.  Closing the generator before its end
+        discards the results of the chunks in flight.
+        """
+        chunk_size = self.chunk_size
+        def chunks():
+            for batch in batches:
+                batch = [ m if isinstance(m, str) else _to_str(m) for m in batch ]
+                starts = range(0, len(batch), chunk_size) or [0]
+                for start in starts:
+                    yield (start == starts[-1], batch[start:start + chunk_size])
+        records = [ ]
+        errors = { }
+        results = self._run(chunks(), reader_schema, fields)
+        try:
+            for last, chunk_records, chunk_errors in results:
+                for index, message in chunk_errors.items():
+                    errors[len(records) + index] = SerializerError(message)
+                records.extend(chunk_records)
+                if last:
+                    yield (records, errors)
+                    records = [ ]
+                    errors = { }
+        finally:
+            results.close()
+
+    def decode_messages(self, messages, reader_schema=None, fields=None):
+        """
+        Decode a batch of messages as MessageSerializer.decode_messages.
+
+        Returns a 2-tuple of (the list of decoded records in input order, a
+        dict of the SerializerError of each message that could not be decoded
+        by its index).
+        """
+        for result in self.imap([messages], reader_schema, fields):
+            return result
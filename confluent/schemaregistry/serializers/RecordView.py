@@ -0,0 +1,134 @@
+"""
+Read only mappings over encoded avro records that decode each field the
+first time it is accessed.
+"""
+import collections
+from copy import deepcopy
+
+class ViewLayout(object):
+    """
+    The functions generated by SchemaCompiler for viewing a record schema,
+    shared by all views of it.
+    """
+    def __init__(self, names, positions, defaults, skippers, decoder):
+        # names of the fields of the view, in reader order
+        self.names = names
+        # field name => (index of the writer field, function(buf, p) returning (value, end))
+        self.positions = positions
+        # field name => default value of the fields the writer lacks
+        self.defaults = defaults
+        # function(buf, p) per writer field returning the position after it
+        self.skippers = skippers
+        # function(buf, p) returning (the record as a dict, the position after it)
+        self.decoder = decoder
+
+    def view(self, buf, pos=0):
+        return RecordView(self, buf, pos)
+
+class RecordView(object):
+    """
+    A read only mapping over a record encoded in a str starting at pos.
+
+    A field is decoded when first accessed and kept.  Reaching a field steps
+    over the bytes of the fields before it without decoding them, and the
+    offsets found are kept so they are scanned only once.  Nested records
+    are views as well; arrays, maps and other values are decoded whole.
+
+    Errors in the encoding are raised by the access that reaches them.
+    materialize() decodes the whole record into plain dicts and lists.
+    """
+    __slots__ = ('_layout', '_buf', '_offsets', '_values')
+
+    def __init__(self, layout, buf, pos=0):
+        self._layout = layout
+        self._buf = buf
+        # offsets[i] is the start of writer field i, once known
+        self._offsets = [pos]
+        self._values = { }
+
+    def _offset(self, index):
+        offsets = self._offsets
+        skippers = self._layout.skippers
+        buf = self._buf
+        while len(offsets) <= index:
+            offsets.append(skippers[len(offsets) - 1](buf, offsets[-1]))
+        return offsets[index]
+
+    def __getitem__(self, name):
+        values = self._values
+        if name in values:
+            return values[name]
+        layout = self._layout
+        position = layout.positions.get(name)
+        if position is not None:
+            index, reader = position
+            value, end = reader(self._buf, self._offset(index))
+            if len(self._offsets) == index + 1:
+                self._offsets.append(end)
+        elif name in layout.defaults:
+            value = deepcopy(layout.defaults[name])
+        else:
+            raise KeyError(name)
+        values[name] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._layout.names)
+
+    def __len__(self):
+        return len(self._layout.names)
+
+    def __contains__(self, name):
+        return name in self._layout.positions or name in self._layout.defaults
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def keys(self):
+        return list(self._layout.names)
+
+    def values(self):
+        return [ self[name] for name in self._layout.names ]
+
+    def items(self):
+        return [ (name, self[name]) for name in self._layout.names ]
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        for name in self._layout.names:
+            yield self[name]
+
+    def iteritems(self):
+        for name in self._layout.names:
+            yield (name, self[name])
+
+    def end(self):
+        """Return the position after the record in the buffer"""
+        return self._offset(len(self._layout.skippers))
+
+    def materialize(self):
+        """Decode the whole record and return it as a dict"""
+        return self._layout.decoder(self._buf, self._offsets[0])[0]
+
+    def __eq__(self, other):
+        if isinstance(other, RecordView):
+            other = other.materialize()
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return self.materialize() == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'RecordView(%r)' % (self.materialize())
+
+collections.Mapping.register(RecordView)
@@ -0,0 +1,704 @@
+"""
+Compiles parsed avro schemas into python functions specialized for them.
+
+The generated code writes and reads the avro binary encoding directly: the
+fields of each record are unrolled in order, varints and zig-zag coding are
+inlined, and each union has a table mapping python types to the branch they
+are written with.  Output is byte for byte that of avro.io.DatumWriter and
+decoded values are those of avro.io.DatumReader.  Encoders accept the values
+avro.io.validate accepts and raise avro.io.AvroTypeException for others.
+
+Decoders may also resolve the writer schema against a reader schema, and
+project the top-level record to some of its fields.  Fields that are not read
+are stepped over without being decoded.  Records may also be read as
+RecordViews decoding each field on first access.
+"""
+from copy import deepcopy
+import StringIO
+import struct
+import types
+
+from avro import io
+from avro.schema import PrimitiveSchema
+
+from .RecordView import RecordView, ViewLayout
+
+_STRING = PrimitiveSchema('string')
+_FLOAT = struct.Struct('<f')
+_DOUBLE = struct.Struct('<d')
+
+# python types of the values that may validate against each avro type
+_CANDIDATE_TYPES = {
+    'null' : (types.NoneType,),
+    'boolean' : (bool,),
+    'int' : (int, long, bool),
+    'long' : (int, long, bool),
+    'float' : (int, long, float, bool),
+    'double' : (int, long, float, bool),
+    'string' : (str, unicode),
+    'bytes' : (str,),
+    'fixed' : (str,),
+    'enum' : (str, unicode),
+    'array' : (list,),
+    'map' : (dict,),
+    'record' : (dict,),
+    'error' : (dict,)
+}
+
+_PRIMITIVE_TYPES = ('null', 'boolean', 'int', 'long', 'float', 'double', 'bytes', 'string')
+_RECORD_TYPES = ('record', 'error')
+
+# writer type => reader types its values are promoted to
+_PROMOTIONS = {
+    'int' : ('long', 'float', 'double'),
+    'long' : ('float', 'double'),
+    'float' : ('double',),
+    'string' : ('bytes',),
+    'bytes' : ('string',)
+}
+
+def _name_matches(reader, writer):
+    """Return True if the unqualified name of writer is the name or an alias of reader"""
+    name = writer.name.split('.')[-1]
+    return name == reader.name.split('.')[-1] or name in (reader.get_prop('aliases') or [])
+
+def _match_branch(writer, branches):
+    """Return the reader union branch a writer schema resolves to, or None"""
+    for branch in branches:
+        if branch.type == writer.type or (branch.type in _RECORD_TYPES and writer.type in _RECORD_TYPES):
+            if branch.type not in _RECORD_TYPES + ('enum', 'fixed') or _name_matches(branch, writer):
+                return branch
+    for branch in branches:
+        if branch.type in _PROMOTIONS.get(writer.type, ()):
+            return branch
+    return None
+
+def _default(field):
+    """Return the default value of a record field as a python value"""
+    return io.DatumReader()._read_default_value(field.type, field.default)
+
+def _resolve_union(union, datum):
+    """Return the branch of a union avro.io.DatumWriter writes datum with"""
+    # the last branch that validates wins
+    for i in reversed(range(len(union.schemas))):
+        if io.validate(union.schemas[i], datum):
+            return i
+    raise io.AvroTypeException(union, datum)
+
+def _zigzag(value):
+    """Return the avro encoding of a long"""
+    out = []
+    n = (value << 1) ^ (value >> 63)
+    while n > 127:
+        out.append(chr((n & 0x7F) | 0x80))
+        n >>= 7
+    out.append(chr(n))
+    return ''.join(out)
+
+class CompiledCodec(object):
+    """
+    The encoder and decoder generated for a schema.  source holds the
+    generated code.
+    """
+    def __init__(self, schema, encoder, decoder, source):
+        self.schema = schema
+        self.source = source
+        self._encoder = encoder
+        self._decoder = decoder
+
+    def encode(self, datum):
+        """Return the binary encoding of datum"""
+        out = []
+        self._encoder(datum, out.append)
+        return ''.join(out)
+
+    def write(self, datum, outf):
+        """Write the binary encoding of datum to a file like object"""
+        outf.write(self.encode(datum))
+
+    def decode(self, buf, pos=0):
+        """
+        Decode a value starting at pos in a string and return a 2-tuple of
+        (the value, the position after it).
+        """
+        return self._decoder(buf, pos)
+
+    def read(self, payload):
+        """
+        Decode a value from a file like object.  StringIO objects are decoded
+        in place; other files are read to their end, so decode strings with
+        decode rather than wrapping them.
+        """
+        start = payload.tell()
+        if isinstance(payload, StringIO.StringIO):
+            value, end = self._decoder(payload.getvalue(), start)
+            payload.seek(end)
+            return value
+        value, end = self._decoder(payload.read(), 0)
+        payload.seek(start + end)
+        return value
+
+class _Compiler(object):
+    def __init__(self):
+        # source of each generated function
+        self.functions = []
+        self.namespace = {
+            'C' : [ chr(i) for i in range(256) ],
+            'PF' : _FLOAT.pack,
+            'PD' : _DOUBLE.pack,
+            'UF' : _FLOAT.unpack_from,
+            'UD' : _DOUBLE.unpack_from,
+            'SchemaResolutionException' : io.SchemaResolutionException,
+            'AvroTypeException' : io.AvroTypeException,
+            'V' : io.validate,
+            'deepcopy' : deepcopy,
+            'RV' : RecordView
+        }
+        self.count = 0
+        # record fullname => suffix of its encoder
+        self.records = { }
+        # (writer fullname, reader fullname, fields) => suffix of its decoder
+        self.decoders = { }
+        # record fullname => suffix of its skipper
+        self.skippers = { }
+        # (writer fullname, reader fullname, fields) => name of its ViewLayout
+        self.layouts = { }
+        # (name, arguments) of each ViewLayout to create once the code is loaded
+        self.pending_layouts = []
+
+    def var(self, prefix):
+        self.count += 1
+        return '%s%d' % (prefix, self.count)
+
+    def const(self, prefix, value):
+        name = self.var(prefix)
+        self.namespace[name] = value
+        return name
+
+    def fail(self, message, writer, reader):
+        """Return the line raising a SchemaResolutionException with the message expression"""
+        return 'raise SchemaResolutionException(%s, %s, %s)' % (
+            message, self.const('W', writer), self.const('W', reader))
+
+    def record(self, schema):
+        """Generate the encoder of a record and return its suffix"""
+        suffix = self.records.get(schema.fullname)
+        if suffix is not None:
+            return suffix
+        suffix = self.records[schema.fullname] = self.var('')
+
+        lines = [ 'def e%s(d, a):' % (suffix) ]
+        self.check_type(schema, 'd', 'dict', lines, '    ')
+        lines.append('    g = d.get')
+        for field in schema.fields:
+            value = self.var('x')
+            lines.append('    %s = g(%r)' % (value, field.name))
+            self.encode(field.type, value, lines, '    ')
+        self.functions.append('\n'.join(lines))
+        return suffix
+
+    # encoding
+
+    def write_long(self, expr, lines, ind):
+        lines.extend([ ind + 'n = (%s << 1) ^ (%s >> 63)' % (expr, expr),
+                       ind + 'if n < 128:',
+                       ind + '    a(C[n])',
+                       ind + 'else:',
+                       ind + '    while n > 127:',
+                       ind + '        a(C[(n & 0x7F) | 0x80])',
+                       ind + '        n >>= 7',
+                       ind + '    a(C[n])' ])
+
+    def check(self, schema, expr, fast, lines, ind):
+        """
+        Append the lines raising AvroTypeException unless the value of expr
+        validates against schema.  fast is a cheap condition that holds for
+        most valid values, and io.validate decides the others.
+        """
+        name = self.const('W', schema)
+        lines.append(ind + 'if not (%s) and not V(%s, %s):' % (fast % { 'x' : expr }, name, expr))
+        lines.append(ind + '    raise AvroTypeException(%s, %s)' % (name, expr))
+
+    def check_type(self, schema, expr, python_type, lines, ind):
+        """Append the lines raising AvroTypeException unless expr is an instance of python_type"""
+        lines.append(ind + 'if not isinstance(%s, %s):' % (expr, python_type))
+        lines.append(ind + '    raise AvroTypeException(%s, %s)' % (self.const('W', schema), expr))
+
+    def encode(self, schema, expr, lines, ind):
+        """Append the lines that write the value of the variable expr"""
+        schema_type = schema.type
+        if schema_type == 'null':
+            self.check(schema, expr, '%(x)s is None', lines, ind)
+        elif schema_type == 'boolean':
+            self.check(schema, expr, '%(x)s is True or %(x)s is False', lines, ind)
+            lines.append(ind + "a('\\x01' if %s else '\\x00')" % (expr))
+        elif schema_type in ('int', 'long'):
+            if schema_type == 'int':
+                self.check(schema, expr, 'type(%(x)s) is int and -2147483648 <= %(x)s <= 2147483647',
+                           lines, ind)
+            else:
+                self.check(schema, expr, 'type(%(x)s) is int', lines, ind)
+            self.write_long(expr, lines, ind)
+        elif schema_type == 'float':
+            self.check(schema, expr, 'type(%(x)s) is float', lines, ind)
+            lines.append(ind + 'a(PF(%s))' % (expr))
+        elif schema_type == 'double':
+            self.check(schema, expr, 'type(%(x)s) is float', lines, ind)
+            lines.append(ind + 'a(PD(%s))' % (expr))
+        elif schema_type in ('bytes', 'string'):
+            if schema_type == 'string':
+                self.check(schema, expr, 'type(%(x)s) is unicode or type(%(x)s) is str', lines, ind)
+            else:
+                self.check(schema, expr, 'type(%(x)s) is str', lines, ind)
+            if schema_type == 'string':
+                encoded = self.var('s')
+                lines.append(ind + "%s = %s.encode('utf-8')" % (encoded, expr))
+                expr = encoded
+            size = self.var('l')
+            lines.append(ind + '%s = len(%s)' % (size, expr))
+            self.write_long(size, lines, ind)
+            lines.append(ind + 'a(%s)' % (expr))
+        elif schema_type == 'fixed':
+            self.check(schema, expr, 'type(%%(x)s) is str and len(%%(x)s) == %d' % (schema.size),
+                       lines, ind)
+            lines.append(ind + 'a(%s)' % (expr))
+        elif schema_type == 'enum':
+            table = self.const('E', dict((s, _zigzag(i)) for i, s in enumerate(schema.symbols)))
+            lines.append(ind + 'try:')
+            lines.append(ind + '    a(%s[%s])' % (table, expr))
+            lines.append(ind + 'except (KeyError, TypeError):')
+            lines.append(ind + '    raise AvroTypeException(%s, %s)' % (self.const('W', schema), expr))
+        elif schema_type in ('array', 'map'):
+            self.check_type(schema, expr, 'list' if schema_type == 'array' else 'dict', lines, ind)
+            size = self.var('l')
+            lines.append(ind + 'if %s:' % (expr))
+            lines.append(ind + '    %s = len(%s)' % (size, expr))
+            self.write_long(size, lines, ind + '    ')
+            if schema_type == 'array':
+                item = self.var('i')
+                lines.append(ind + '    for %s in %s:' % (item, expr))
+                self.encode(schema.items, item, lines, ind + '        ')
+            else:
+                key = self.var('k')
+                item = self.var('i')
+                lines.append(ind + '    for %s, %s in %s.items():' % (key, item, expr))
+                self.encode(_STRING, key, lines, ind + '        ')
+                self.encode(schema.values, item, lines, ind + '        ')
+            lines.append(ind + "a('\\x00')")
+        elif schema_type == 'union':
+            branches = schema.schemas
+            table = { }
+            for python_type in set(t for b in branches for t in _CANDIDATE_TYPES.get(b.type, ())):
+                matches = [ i for i, b in enumerate(branches)
+                            if python_type in _CANDIDATE_TYPES.get(b.type, ()) ]
+                if len(matches) == 1:
+                    table[python_type] = matches[0]
+            table = self.const('U', table)
+            resolve = self.const('R', lambda datum, union=schema: _resolve_union(union, datum))
+            index = self.var('u')
+            lines.append(ind + '%s = %s.get(type(%s))' % (index, table, expr))
+            lines.append(ind + 'if %s is None:' % (index))
+            lines.append(ind + '    %s = %s(%s)' % (index, resolve, expr))
+            for i, branch in enumerate(branches):
+                lines.append(ind + '%s %s == %d:' % ('if' if i == 0 else 'elif', index, i))
+                lines.append(ind + '    a(%r)' % (_zigzag(i)))
+                self.encode(branch, expr, lines, ind + '    ')
+        elif schema_type in _RECORD_TYPES:
+            lines.append(ind + 'e%s(%s, a)' % (self.record(schema), expr))
+        else:
+            raise io.AvroTypeException(schema, expr)
+
+    # decoding
+
+    def read_long(self, target, lines, ind):
+        lines.extend([ ind + 'o = ord(buf[p])',
+                       ind + 'p += 1',
+                       ind + 'if o < 128:',
+                       ind + '    n = o',
+                       ind + 'else:',
+                       ind + '    n = o & 0x7F',
+                       ind + '    s = 7',
+                       ind + '    while o > 127:',
+                       ind + '        o = ord(buf[p])',
+                       ind + '        p += 1',
+                       ind + '        n |= (o & 0x7F) << s',
+                       ind + '        s += 7',
+                       ind + '%s = (n >> 1) ^ -(n & 1)' % (target) ])
+
+    def read_primitive(self, schema_type, target, lines, ind):
+        if schema_type == 'null':
+            lines.append(ind + '%s = None' % (target))
+        elif schema_type == 'boolean':
+            lines.append(ind + "%s = buf[p] == '\\x01'" % (target))
+            lines.append(ind + 'p += 1')
+        elif schema_type in ('int', 'long'):
+            self.read_long(target, lines, ind)
+        elif schema_type in ('float', 'double'):
+            lines.append(ind + '%s = %s(buf, p)[0]' % (target, 'UF' if schema_type == 'float' else 'UD'))
+            lines.append(ind + 'p += %d' % (4 if schema_type == 'float' else 8))
+        else:
+            size = self.var('l')
+            self.read_long(size, lines, ind)
+            if schema_type == 'string':
+                lines.append(ind + "%s = buf[p:p + %s].decode('utf-8')" % (target, size))
+            else:
+                lines.append(ind + '%s = buf[p:p + %s]' % (target, size))
+            lines.append(ind + 'p += %s' % (size))
+
+    def match_fields(self, writer, reader, fields):
+        """
+        Return a 3-tuple of (the wanted reader fields, a list of the reader
+        field each writer field is read as or None, the wanted reader fields
+        the writer lacks)
+        """
+        if not _name_matches(reader, writer):
+            raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+        wanted = reader.fields
+        if fields is not None:
+            unknown = set(fields) - set(reader.fields_dict)
+            if unknown:
+                raise io.SchemaResolutionException('Unknown fields %s' % (', '.join(sorted(unknown))),
+                                                   writer, reader)
+            wanted = [ f for f in wanted if f.name in fields ]
+        # writer field name => reader field, names before aliases
+        by_name = dict((f.name, f) for f in wanted)
+        for field in wanted:
+            for alias in field.get_prop('aliases') or []:
+                by_name.setdefault(alias, field)
+
+        matches = []
+        read = set()
+        for field in writer.fields:
+            match = by_name.get(field.name)
+            if match is None or match.name in read:
+                matches.append(None)
+            else:
+                read.add(match.name)
+                matches.append(match)
+        missing = [ f for f in wanted if f.name not in read ]
+        for field in missing:
+            if not field.has_default:
+                raise io.SchemaResolutionException('No default value for field %s' % (field.name),
+                                                   writer, reader)
+        return (wanted, matches, missing)
+
+    def record_decoder(self, writer, reader, fields=None):
+        """
+        Generate the function reading a writer record as a reader record,
+        keeping only the named fields if given, and return its suffix
+        """
+        key = (writer.fullname, reader.fullname, fields)
+        suffix = self.decoders.get(key)
+        if suffix is not None:
+            return suffix
+        wanted, matches, missing = self.match_fields(writer, reader, fields)
+
+        suffix = self.decoders[key] = self.var('')
+        try:
+            lines = [ 'def d%s(buf, p):' % (suffix) ]
+            items = []
+            for field, match in zip(writer.fields, matches):
+                if match is None:
+                    self.skip(field.type, lines, '    ')
+                    continue
+                value = self.var('v')
+                self.resolve(field.type, match.type, value, lines, '    ')
+                items.append('%r : %s' % (match.name, value))
+            for field in missing:
+                default = _default(field)
+                value = self.const('F', default)
+                if isinstance(default, (list, dict)):
+                    # every record gets its own copy
+                    value = 'deepcopy(%s)' % (value)
+                items.append('%r : %s' % (field.name, value))
+        except io.SchemaResolutionException:
+            del self.decoders[key]
+            raise
+        lines.append('    return ({ %s }, p)' % (', '.join(items)))
+        self.functions.append('\n'.join(lines))
+        return suffix
+
+    def view_layout(self, writer, reader, fields=None):
+        """
+        Generate the functions viewing a writer record as a reader record and
+        return the name of its ViewLayout
+        """
+        key = (writer.fullname, reader.fullname, fields)
+        name = self.layouts.get(key)
+        if name is not None:
+            return name
+        wanted, matches, missing = self.match_fields(writer, reader, fields)
+
+        name = self.layouts[key] = self.var('L')
+        try:
+            skippers = []
+            positions = { }
+            for i, (field, match) in enumerate(zip(writer.fields, matches)):
+                skipper = self.var('k')
+                lines = [ 'def %s(buf, p):' % (skipper) ]
+                self.skip(field.type, lines, '    ')
+                lines.append('    return p')
+                self.functions.append('\n'.join(lines))
+                skippers.append(skipper)
+                if match is not None:
+                    reader_func = self.var('r')
+                    lines = [ 'def %s(buf, p):' % (reader_func) ]
+                    self.resolve(field.type, match.type, 'v', lines, '    ', lazy=True)
+                    lines.append('    return (v, p)')
+                    self.functions.append('\n'.join(lines))
+                    positions[match.name] = (i, reader_func)
+            defaults = dict((f.name, _default(f)) for f in missing)
+            decoder = 'd%s' % (self.record_decoder(writer, reader, fields))
+        except io.SchemaResolutionException:
+            del self.layouts[key]
+            raise
+        self.pending_layouts.append((name, ([ f.name for f in wanted ], positions,
+                                            defaults, skippers, decoder)))
+        return name
+
+    def resolve(self, writer, reader, target, lines, ind, fields=None, lazy=False):
+        """
+        Append the lines that read a value written with the writer schema into
+        the variable target as a value of the reader schema.  fields projects
+        the top-level record.  If lazy is set, records not nested in arrays or
+        maps are read as RecordViews.
+        """
+        if writer.type == 'union':
+            index = self.var('u')
+            self.read_long(index, lines, ind)
+            for i, branch in enumerate(writer.schemas):
+                lines.append(ind + '%s %s == %d:' % ('if' if i == 0 else 'elif', index, i))
+                body = []
+                try:
+                    self.resolve(branch, reader, target, body, ind + '    ', fields, lazy)
+                except io.SchemaResolutionException:
+                    # only an error if the writer used this branch
+                    body = [ ind + '    ' + self.fail(repr('Can\'t read branch %d of the writer union' % (i)),
+                                                      writer, reader) ]
+                lines.extend(body)
+            lines.append(ind + 'else:')
+            lines.append(ind + '    ' + self.fail('"Can\'t access branch index %%d for union with %d branches" %% (%s)'
+                                                  % (len(writer.schemas), index), writer, reader))
+            return
+        if reader.type == 'union':
+            branch = _match_branch(writer, reader.schemas)
+            if branch is None:
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            return self.resolve(writer, branch, target, lines, ind, fields, lazy)
+
+        writer_type = writer.type
+        reader_type = reader.type
+        if writer_type in _RECORD_TYPES and reader_type in _RECORD_TYPES and lazy:
+            layout = self.view_layout(writer, reader, fields)
+            lines.append(ind + '%s = RV(%s, buf, p)' % (target, layout))
+            lines.append(ind + 'p = s%s(buf, p)' % (self.record_skipper(writer)))
+        elif writer_type in _RECORD_TYPES and reader_type in _RECORD_TYPES:
+            suffix = self.record_decoder(writer, reader, fields)
+            lines.append(ind + '%s, p = d%s(buf, p)' % (target, suffix))
+        elif fields is not None:
+            raise io.SchemaResolutionException('Only records can be projected', writer, reader)
+        elif writer_type != reader_type:
+            if reader_type not in _PROMOTIONS.get(writer_type, ()):
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            # the bytes are those of the writer type
+            self.read_primitive({ 'string' : 'bytes', 'bytes' : 'string' }.get(writer_type, writer_type),
+                                target, lines, ind)
+            if writer_type in ('int', 'long') and reader_type in ('float', 'double'):
+                lines.append(ind + '%s = float(%s)' % (target, target))
+        elif writer_type == 'fixed':
+            if not _name_matches(reader, writer) or reader.size != writer.size:
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            lines.append(ind + '%s = buf[p:p + %d]' % (target, writer.size))
+            lines.append(ind + 'p += %d' % (writer.size))
+        elif writer_type == 'enum':
+            if not _name_matches(reader, writer):
+                raise io.SchemaResolutionException('Schemas do not match.', writer, reader)
+            # writer index => reader symbol, None if the reader lacks it
+            table = [ s if s in reader.symbols else None for s in writer.symbols ]
+            symbols = self.const('S', table)
+            index = self.var('l')
+            self.read_long(index, lines, ind)
+            lines.append(ind + '%s = %s[%s]' % (target, symbols, index))
+            if None in table:
+                lines.append(ind + 'if %s is None:' % (target))
+                lines.append(ind + '    ' + self.fail('"Symbol %%s is not in the reader enum" %% (%r[%s])'
+                                                      % (list(writer.symbols), index), writer, reader))
+        elif writer_type in ('array', 'map'):
+            count = self.var('c')
+            lines.append(ind + '%s = %s' % (target, '[]' if writer_type == 'array' else '{}'))
+            self.read_long(count, lines, ind)
+            lines.append(ind + 'while %s:' % (count))
+            lines.append(ind + '    if %s < 0:' % (count))
+            lines.append(ind + '        %s = -%s' % (count, count))
+            # the block size is not needed
+            self.read_long('z', lines, ind + '        ')
+            lines.append(ind + '    for _ in xrange(%s):' % (count))
+            item = self.var('i')
+            if writer_type == 'array':
+                self.resolve(writer.items, reader.items, item, lines, ind + '        ')
+                lines.append(ind + '        %s.append(%s)' % (target, item))
+            else:
+                key = self.var('k')
+                self.read_primitive('string', key, lines, ind + '        ')
+                self.resolve(writer.values, reader.values, item, lines, ind + '        ')
+                lines.append(ind + '        %s[%s] = %s' % (target, key, item))
+            self.read_long(count, lines, ind + '    ')
+        elif writer_type in _PRIMITIVE_TYPES:
+            self.read_primitive(writer_type, target, lines, ind)
+        else:
+            raise io.AvroTypeException(writer, target)
+
+    # skipping
+
+    def record_skipper(self, schema):
+        """Generate the function stepping over a record and return its suffix"""
+        suffix = self.skippers.get(schema.fullname)
+        if suffix is not None:
+            return suffix
+        suffix = self.skippers[schema.fullname] = self.var('')
+        lines = [ 'def s%s(buf, p):' % (suffix) ]
+        for field in schema.fields:
+            self.skip(field.type, lines, '    ')
+        lines.append('    return p')
+        self.functions.append('\n'.join(lines))
+        return suffix
+
+    def skip(self, schema, lines, ind):
+        """Append the lines that move p past a value without decoding it"""
+        schema_type = schema.type
+        if schema_type == 'null':
+            lines.append(ind + 'pass')
+        elif schema_type == 'boolean':
+            lines.append(ind + 'p += 1')
+        elif schema_type in ('int', 'long', 'enum'):
+            lines.append(ind + 'while ord(buf[p]) > 127:')
+            lines.append(ind + '    p += 1')
+            lines.append(ind + 'p += 1')
+        elif schema_type in ('float', 'double'):
+            lines.append(ind + 'p += %d' % (4 if schema_type == 'float' else 8))
+        elif schema_type in ('bytes', 'string'):
+            size = self.var('l')
+            self.read_long(size, lines, ind)
+            lines.append(ind + 'p += %s' % (size))
+        elif schema_type == 'fixed':
+            lines.append(ind + 'p += %d' % (schema.size))
+        elif schema_type in ('array', 'map'):
+            count = self.var('c')
+            size = self.var('l')
+            self.read_long(count, lines, ind)
+            lines.append(ind + 'while %s:' % (count))
+            lines.append(ind + '    if %s < 0:' % (count))
+            # blocks with a byte size are stepped over whole
+            self.read_long(size, lines, ind + '        ')
+            lines.append(ind + '        p += %s' % (size))
+            lines.append(ind + '    else:')
+            lines.append(ind + '        for _ in xrange(%s):' % (count))
+            if schema_type == 'map':
+                self.skip(_STRING, lines, ind + '            ')
+                self.skip(schema.values, lines, ind + '            ')
+            else:
+                self.skip(schema.items, lines, ind + '            ')
+            self.read_long(count, lines, ind + '    ')
+        elif schema_type == 'union':
+            index = self.var('u')
+            self.read_long(index, lines, ind)
+            for i, branch in enumerate(schema.schemas):
+                lines.append(ind + '%s %s == %d:' % ('if' if i == 0 else 'elif', index, i))
+                self.skip(branch, lines, ind + '    ')
+            lines.append(ind + 'else:')
+            lines.append(ind + '    ' + self.fail('"Can\'t access branch index %%d for union with %d branches" %% (%s)'
+                                                  % (len(schema.schemas), index), schema, schema))
+        elif schema_type in _RECORD_TYPES:
+            lines.append(ind + 'p = s%s(buf, p)' % (self.record_skipper(schema)))
+        else:
+            raise io.AvroTypeException(schema, 'p')
+
+    def compile(self, schema, reader=None, fields=None):
+        """
+        Compile the codec of a schema.  With a reader schema or fields, only a
+        decoder resolving the schema against them is generated.
+        """
+        encoder = None
+        if reader is None and fields is None:
+            if schema.type in _RECORD_TYPES:
+                encoder = 'e%s' % (self.record(schema))
+            else:
+                lines = [ 'def e_root(d, a):', '    pass' ]
+                self.encode(schema, 'd', lines, '    ')
+                self.functions.append('\n'.join(lines))
+                encoder = 'e_root'
+        if reader is None:
+            reader = schema
+
+        if schema.type in _RECORD_TYPES and reader.type in _RECORD_TYPES:
+            decoder = 'd%s' % (self.record_decoder(schema, reader, fields))
+        else:
+            lines = [ 'def d_root(buf, p):' ]
+            self.resolve(schema, reader, 'v', lines, '    ', fields)
+            lines.append('    return (v, p)')
+            self.functions.append('\n'.join(lines))
+            decoder = 'd_root'
+
+        source = self.load(schema)
+        return CompiledCodec(schema, self.namespace.get(encoder), self.namespace[decoder], source)
+
+    def compile_view(self, schema, reader=None, fields=None):
+        """Compile the ViewLayout of a record schema, resolved against a reader schema or fields"""
+        if reader is None:
+            reader = schema
+        if schema.type not in _RECORD_TYPES or reader.type not in _RECORD_TYPES:
+            raise io.SchemaResolutionException('Only records can be viewed', schema, reader)
+        name = self.view_layout(schema, reader, fields)
+        self.load(schema)
+        return self.namespace[name]
+
+    def load(self, schema):
+        """Execute the generated functions, create the pending layouts and return the source"""
+        source = '\n\n'.join(self.functions) + '\n'
+        code = compile(source, '<avro codec %s>' % (getattr(schema, 'fullname', schema.type)), 'exec')
+        namespace = self.namespace
+        exec code in namespace
+        for name, (names, positions, defaults, skippers, decoder) in self.pending_layouts:
+            positions = dict((field, (i, namespace[func])) for field, (i, func) in positions.items())
+            namespace[name] = ViewLayout(names, positions, defaults,
+                                         [ namespace[s] for s in skippers ], namespace[decoder])
+        return source
+
+def compile_schema(schema):
+    """
+    Return the CompiledCodec of a parsed avro schema.  The result is memoized
+    on the schema.
+    """
+    codec = getattr(schema, '_compiled_codec', None)
+    if codec is None:
+        codec = _Compiler().compile(schema)
+        schema._compiled_codec = codec
+    return codec
+
+def compile_resolver(writer, reader=None, fields=None):
+    """
+    Return a CompiledCodec decoding data written with the writer schema as
+    values of the reader schema, which defaults to the writer schema.  If
+    fields is given, only those fields of the top-level record are decoded.
+    The bytes of the other fields are stepped over.
+
+    Raises avro.io.SchemaResolutionException if the schemas do not resolve.
+    The codec cannot encode.  Each call compiles a new codec, which callers
+    cache: MessageSerializer keeps them with its other decoders.
+    """
+    if fields is not None:
+        fields = tuple(sorted(set(fields)))
+    if reader is None and fields is None:
+        return compile_schema(writer)
+    return _Compiler().compile(writer, reader, fields)
+
+def compile_view(writer, reader=None, fields=None):
+    """
+    Return the ViewLayout giving RecordViews of records written with the
+    writer schema, resolved against a reader schema and keeping only some
+    fields as compile_resolver.  Both schemas must be records.  Each call
+    compiles a new layout, as compile_resolver.
+    """
+    if fields is not None:
+        fields = tuple(sorted(set(fields)))
+    return _Compiler().compile_view(writer, reader, fields)
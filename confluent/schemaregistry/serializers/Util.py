@@ -1,13 +1,182 @@
 """
 Basic utilities for handling avro schemas
 """
+import json
+import os
+import time
+
 from avro import schema
 
-def parse_schema_from_string(schema_str):
-    """Parse a schema given a schema string"""
-    return schema.parse(schema_str)
+from ..LRUCache import LRUCache
+
+# number of parsed schemas cached by text and by file
+PARSE_CACHE_SIZE = 1000
+
+# Seed of the 64-bit Rabin fingerprint (CRC-64-AVRO) from the avro spec
+_FP_EMPTY = 0xc15d213aa4d7a795
+
+def _build_fp_table():
+    table = []
+    for i in range(256):
+        fp = i
+        for j in range(8):
+            fp = (fp >> 1) ^ (_FP_EMPTY & -(fp & 1))
+        table.append(fp)
+    return table
+
+_FP_TABLE = _build_fp_table()
+
+# schema text => parsed schema, keyed by both the text as given and normalized
+parse_cache = LRUCache(PARSE_CACHE_SIZE)
+# absolute path => (modification time, parsed schema)
+file_cache = LRUCache(PARSE_CACHE_SIZE)
+
+def _normalize(schema_str):
+    try:
+        return json.dumps(json.loads(schema_str), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        # let the parser report it
+        return None
+
+def parse_schema_from_string(schema_str, metrics=None):
+    """
+    Parse a schema given a schema string.
+
+    Parsed schemas are cached by their text, ignoring whitespace and key order,
+    so the same instance is returned for the same schema.  It is shared and
+    must not be modified.
+
+    If metrics is given, its schema_parsed hook is told how long parsing took.
+    """
+    result = parse_cache.get(schema_str)
+    if result is not None:
+        return result
+    normalized = _normalize(schema_str)
+    if normalized is not None:
+        result = parse_cache.get(normalized)
+    if result is None:
+        start = time.time()
+        result = schema.parse(schema_str)
+        if metrics is not None:
+            metrics.schema_parsed(time.time() - start)
+        if normalized is not None:
+            result = parse_cache.setdefault(normalized, result)
+    parse_cache[schema_str] = result
+    return result
 
 def parse_schema_from_file(schema_path):
-    """Parse a schema from a file path"""
-    with open(schema_path) as f:
-        return parse_schema_from_string(f.read())
+    """
+    Parse a schema from a file path.  The result is cached until the file is
+    modified.
+    """
+    path = os.path.abspath(schema_path)
+    mtime = os.stat(path).st_mtime
+    cached = file_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        result = parse_schema_from_string(f.read())
+    file_cache[path] = (mtime, result)
+    return result
+
+def _canonical_parts(avro_schema, named, out):
+    schema_type = avro_schema.type
+    if schema_type in schema.PRIMITIVE_TYPES:
+        out.append(json.dumps(schema_type))
+    elif schema_type in schema.NAMED_TYPES:
+        fullname = avro_schema.fullname
+        if fullname in named:
+            # already defined - refer to it by name
+            out.append(json.dumps(fullname))
+            return
+        named.add(fullname)
+        out.append('{"name":%s,"type":' % (json.dumps(fullname)))
+        if schema_type == 'enum':
+            out.append('"enum","symbols":%s}' % (json.dumps(avro_schema.symbols, separators=(',',':'))))
+        elif schema_type == 'fixed':
+            out.append('"fixed","size":%d}' % (avro_schema.size))
+        else:
+            out.append('"record","fields":[')
+            for i, field in enumerate(avro_schema.fields):
+                if i:
+                    out.append(',')
+                out.append('{"name":%s,"type":' % (json.dumps(field.name)))
+                _canonical_parts(field.type, named, out)
+                out.append('}')
+            out.append(']}')
+    elif schema_type == 'array':
+        out.append('{"type":"array","items":')
+        _canonical_parts(avro_schema.items, named, out)
+        out.append('}')
+    elif schema_type == 'map':
+        out.append('{"type":"map","values":')
+        _canonical_parts(avro_schema.values, named, out)
+        out.append('}')
+    elif schema_type in ('union', 'error_union'):
+        out.append('[')
+        for i, branch in enumerate(avro_schema.schemas):
+            if i:
+                out.append(',')
+            _canonical_parts(branch, named, out)
+        out.append(']')
+    else:
+        raise schema.SchemaParseException("Unsupported schema type: %s" % (schema_type))
+
+def canonical_form(avro_schema):
+    """
+    Return the Parsing Canonical Form of a parsed schema.
+
+    Schemas that only differ in documentation, defaults, namespace spelling or
+    whitespace share the same canonical form.  The result is memoized on the
+    schema object.
+    """
+    result = getattr(avro_schema, '_canonical_form', None)
+    if result is None:
+        out = []
+        _canonical_parts(avro_schema, set(), out)
+        result = ''.join(out)
+        avro_schema._canonical_form = result
+    return result
+
+def fingerprint_string(data):
+    """Return the 64-bit Rabin fingerprint (CRC-64-AVRO) of a string"""
+    fp = _FP_EMPTY
+    table = _FP_TABLE
+    for c in data:
+        fp = (fp >> 8) ^ table[(fp ^ ord(c)) & 0xff]
+    return fp
+
+def fingerprint(avro_schema):
+    """
+    Return the 64-bit Rabin fingerprint of the canonical form of a parsed
+    schema.  Structurally equal schemas have the same fingerprint.
+
+    The result is memoized on the schema object.
+    """
+    result = getattr(avro_schema, '_fingerprint', None)
+    if result is None:
+        result = fingerprint_string(canonical_form(avro_schema).encode('utf-8'))
+        avro_schema._fingerprint = result
+    return result
+
+def full_fingerprint(avro_schema):
+    """
+    Return the 64-bit Rabin fingerprint of the full JSON form of a parsed
+    schema.  Unlike fingerprint it tells apart schemas that differ in
+    defaults, aliases or other attributes, which matter to schema resolution.
+
+    The result is memoized on the schema object.
+    """
+    result = getattr(avro_schema, '_full_fingerprint', None)
+    if result is None:
+        full = json.dumps(avro_schema.to_json(), sort_keys=True, separators=(',', ':'))
+        result = fingerprint_string(full.encode('utf-8'))
+        avro_schema._full_fingerprint = result
+    return result
+
+def schema_size(avro_schema):
+    """
+    Estimate the memory held by a parsed schema, or anything built from it,
+    as the length of its canonical form.  Used to weigh cache entries.
+    """
+    return len(canonical_form(avro_schema))
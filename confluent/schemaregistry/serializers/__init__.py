@@ -10,3 +10,5 @@ class SerializerError(Exception):
             return self.message
 
 from MessageSerializer import *
+from AsyncMessageSerializer import *
+from ParallelDecoder import *
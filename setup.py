@@ -31,6 +31,7 @@ setup(
     keywords = 'confluent schema registry schemaregistry',
     extras_require = {
         'fastavro': ['fastavro'],
+        'numpy': ['numpy'],
     },
     test_requires = ['unittest2']
 )
@@ -0,0 +1,49 @@
+"""
+Compare the request rate of the pooled keep-alive transport used by
+CachedSchemaRegistryClient with a fresh urllib2 connection per request.
+
+Run with: python bench_client.py [num_requests]
+"""
+import json
+import sys
+import time
+import urllib2
+
+import setup_test_path
+import data_gen
+import mock_registry
+
+from confluent.schemaregistry.client import CachedSchemaRegistryClient
+from confluent.schemaregistry.serializers import Util
+
+PORT = 9002
+
+def urlopen_request(url):
+    response = urllib2.urlopen(url)
+    return json.loads(response.read())
+
+def run(name, func, url, count):
+    start = time.time()
+    for i in range(count):
+        func(url)
+    elapsed = time.time() - start
+    print "%-10s %6d requests in %.3fs (%.0f req/s)" % (name, count, elapsed, count / elapsed)
+
+def main(count):
+    server = mock_registry.ServerThread(PORT)
+    server.start()
+    time.sleep(1)
+    try:
+        client = CachedSchemaRegistryClient('http://127.0.0.1:%d' % (PORT))
+        schema_id = client.register('test', Util.parse_schema_from_string(data_gen.BASIC_SCHEMA))
+        path = '/'.join(['', 'schemas', 'ids', str(schema_id)])
+
+        run('urllib2', urlopen_request, client.url + path, count)
+        run('pooled', client._send_request, path, count)
+        client.close()
+    finally:
+        server.shutdown()
+        server.join()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,72 @@
+"""
+Compare the encode and decode throughput of the avro library, fastavro (when
+installed) and the codecs generated by SchemaCompiler on the test schemas.
+
+Run with: python bench_codecs.py [num_records]
+"""
+import cStringIO
+import sys
+import time
+
+import setup_test_path
+import data_gen
+
+from avro import io
+from confluent.schemaregistry.serializers import Util
+from confluent.schemaregistry.serializers.SchemaCompiler import compile_schema
+
+try:
+    import fastavro
+except ImportError:
+    fastavro = None
+
+def avro_codec(schema):
+    writer = io.DatumWriter(schema)
+    reader = io.DatumReader(schema)
+    def encode(record):
+        outf = cStringIO.StringIO()
+        writer.write(record, io.BinaryEncoder(outf))
+        return outf.getvalue()
+    def decode(data):
+        return reader.read(io.BinaryDecoder(cStringIO.StringIO(data)))
+    return encode, decode
+
+def fastavro_codec(schema):
+    parsed = fastavro.parse_schema(schema.to_json())
+    def encode(record):
+        outf = cStringIO.StringIO()
+        fastavro.schemaless_writer(outf, parsed, record)
+        return outf.getvalue()
+    def decode(data):
+        return fastavro.schemaless_reader(cStringIO.StringIO(data), parsed)
+    return encode, decode
+
+def compiled_codec(schema):
+    codec = compile_schema(schema)
+    return codec.encode, lambda data: codec.decode(data)[0]
+
+def run(name, func, items):
+    start = time.time()
+    for item in items:
+        func(item)
+    elapsed = time.time() - start
+    print "  %-18s %6d records in %.3fs (%.0f records/s)" % (name, len(items), elapsed,
+                                                             len(items) / elapsed)
+
+def main(count):
+    codecs = [('avro', avro_codec), ('compiled', compiled_codec)]
+    if fastavro:
+        codecs.insert(1, ('fastavro', fastavro_codec))
+    for name, schema_str, items in [('basic', data_gen.BASIC_SCHEMA, data_gen.BASIC_ITEMS),
+                                    ('advanced', data_gen.ADVANCED_SCHEMA, data_gen.ADVANCED_ITEMS)]:
+        schema = Util.parse_schema_from_string(schema_str)
+        records = [ items[i % len(items)] for i in range(count) ]
+        encoded = [ avro_codec(schema)[0](r) for r in records ]
+        print name
+        for codec_name, make in codecs:
+            encode, decode = make(schema)
+            run(codec_name + ' encode', encode, records)
+            run(codec_name + ' decode', decode, encoded)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
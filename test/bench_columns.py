@@ -0,0 +1,43 @@
+"""
+Compare decoding a batch of messages into dicts and pivoting them into a list
+per field with decoding them straight into columns.
+
+Run with: python bench_columns.py [num_messages]
+"""
+import sys
+import time
+
+import setup_test_path
+import data_gen
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, Util
+from confluent.schemaregistry.serializers import ColumnDecoder
+from test_column_decoder import ROW_SCHEMA, ROWS
+
+def pivot(serializer, messages):
+    records = [ serializer.decode_message(m) for m in messages ]
+    return dict((name, [ r[name] for r in records ]) for name in records[0])
+
+def run(name, func, messages):
+    start = time.clock()
+    func(messages)
+    elapsed = time.clock() - start
+    print "  %-22s %6d messages in %.3fs (%.0f messages/s)" % (name, len(messages), elapsed,
+                                                              len(messages) / elapsed)
+
+def main(count):
+    print "numpy: %s" % ('yes' if ColumnDecoder.numpy else 'no')
+    client = MockSchemaRegistryClient()
+    serializer = MessageSerializer(client, backend='compiled')
+    for name, schema_str, items in [('basic', data_gen.BASIC_SCHEMA, data_gen.BASIC_ITEMS),
+                                    ('row', ROW_SCHEMA, ROWS)]:
+        schema_id = client.register(name, Util.parse_schema_from_string(schema_str))
+        records = [ items[i % len(items)] for i in range(count) ]
+        messages = serializer.encode_records(schema_id, records)
+        print name
+        run('dicts then pivot', lambda m: pivot(serializer, m), messages)
+        run('columns', serializer.decode_columns, messages)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
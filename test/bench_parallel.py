@@ -0,0 +1,42 @@
+"""
+Compare decoding a batch of messages in this process with decoding it on a
+pool of worker processes, for a few chunk sizes.
+
+Run with: python bench_parallel.py [num_messages] [processes]
+"""
+import multiprocessing
+import sys
+import time
+
+import setup_test_path
+import data_gen
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, ParallelDecoder, Util
+
+def run(name, func, messages):
+    start = time.time()
+    func(messages)
+    elapsed = time.time() - start
+    print "  %-22s %6d messages in %.3fs (%.0f messages/s)" % (name, len(messages), elapsed,
+                                                              len(messages) / elapsed)
+
+def main(count, processes):
+    print "cpus: %d, processes: %d" % (multiprocessing.cpu_count(), processes)
+    client = MockSchemaRegistryClient()
+    serializer = MessageSerializer(client, backend='compiled')
+    for name, schema_str, items in [('basic', data_gen.BASIC_SCHEMA, data_gen.BASIC_ITEMS),
+                                    ('advanced', data_gen.ADVANCED_SCHEMA, data_gen.ADVANCED_ITEMS)]:
+        schema_id = client.register(name, Util.parse_schema_from_string(schema_str))
+        records = [ items[i % len(items)] for i in range(count) ]
+        messages = serializer.encode_records(schema_id, records)
+        print name
+        run('in process', serializer.decode_messages, messages)
+        for chunk_size in (100, 1000, 5000):
+            with ParallelDecoder(client, processes, chunk_size, backend='compiled') as decoder:
+                decoder.warm([schema_id])
+                run('chunks of %d' % (chunk_size), decoder.decode_messages, messages)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count())
@@ -0,0 +1,38 @@
+"""
+Compare the throughput of encoding a batch of records with encode_records
+against one encode_record_with_schema_id call per record.
+
+Run with: python bench_serializer.py [num_records]
+"""
+import sys
+import time
+
+import setup_test_path
+import data_gen
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, Util
+
+def run(name, func, count):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print "%-12s %6d records in %.3fs (%.0f records/s)" % (name, count, elapsed, count / elapsed)
+
+def main(count):
+    client = MockSchemaRegistryClient()
+    serializer = MessageSerializer(client)
+    schema_id = client.register('test', Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA))
+    items = data_gen.ADVANCED_ITEMS
+    records = [ items[i % len(items)] for i in range(count) ]
+
+    def per_record():
+        for record in records:
+            serializer.encode_record_with_schema_id(schema_id, record)
+
+    run('per record', per_record, count)
+    run('batch', lambda: serializer.encode_records(schema_id, records), count)
+    run('contiguous', lambda: serializer.encode_records(schema_id, records, True), count)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,66 @@
+"""
+Compare the CPU time and memory of decoding messages eagerly into dicts with
+decoding them lazily into RecordViews, when only one field is read and when
+every field is read.
+
+Memory is measured as the objects and bytes held by the decoded records,
+not counting the message buffers views share.
+
+Run with: python bench_views.py [num_messages]
+"""
+import sys
+import time
+
+import setup_test_path
+import data_gen
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, Util
+from confluent.schemaregistry.serializers.RecordView import RecordView
+
+def deep_stats(obj, stats):
+    """Add the objects and bytes held by a decoded value to stats"""
+    stats[0] += 1
+    stats[1] += sys.getsizeof(obj)
+    if isinstance(obj, RecordView):
+        deep_stats(obj._offsets, stats)
+        obj = obj._values
+        stats[0] += 1
+        stats[1] += sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            deep_stats(key, stats)
+            deep_stats(value, stats)
+    elif isinstance(obj, list):
+        for value in obj:
+            deep_stats(value, stats)
+
+def run(name, func, messages):
+    start = time.clock()
+    results = [ func(m) for m in messages ]
+    elapsed = time.clock() - start
+    stats = [0, 0]
+    for result in results:
+        deep_stats(result, stats)
+    print "  %-24s %.3fs cpu  %8d objects  %10d bytes" % (name, elapsed, stats[0], stats[1])
+
+def main(count):
+    client = MockSchemaRegistryClient()
+    serializer = MessageSerializer(client, backend='compiled')
+    for name, schema_str, items in [('basic', data_gen.BASIC_SCHEMA, data_gen.BASIC_ITEMS),
+                                    ('advanced', data_gen.ADVANCED_SCHEMA, data_gen.ADVANCED_ITEMS)]:
+        schema = Util.parse_schema_from_string(schema_str)
+        schema_id = client.register(name, schema)
+        records = [ items[i % len(items)] for i in range(count) ]
+        messages = serializer.encode_records(schema_id, records)
+        decode = serializer.decode_message
+        print name
+        run('eager, one field', lambda m: (lambda r: (r, r['name']))(decode(m))[0], messages)
+        run('lazy, one field', lambda m: (lambda r: (r, r['name']))(decode(m, lazy=True))[0], messages)
+        run('projected, one field', lambda m: decode(m, fields=['name']), messages)
+        run('eager, all fields', lambda m: (lambda r: (r, r.items()))(decode(m))[0], messages)
+        run('lazy, all fields', lambda m: (lambda r: (r, r.items()))(decode(m, lazy=True))[0], messages)
+        run('lazy, materialized', lambda m: decode(m, lazy=True).materialize(), messages)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1,6 +1,9 @@
 import BaseHTTPServer
+import SocketServer
 import re
-from threading import Thread
+from threading import Thread, Lock
+import time
+import urlparse
 import setup_test_path
 
 from confluent.schemaregistry.client import MockSchemaRegistryClient
@@ -8,7 +11,9 @@ from confluent.schemaregistry.serializers import Util
 import json
 
 class ReqHandler(BaseHTTPServer.BaseHTTPRequestHandler):
-    protocol_version = "HTTP/1.0"
+    protocol_version = "HTTP/1.1"
+    # buffer writes so a response goes out in one segment
+    wbufsize = -1
     def do_GET(self):
         self.server._run_routes(self)
 
@@ -19,29 +24,45 @@ class ReqHandler(BaseHTTPServer.BaseHTTPRequestHandler):
         pass
 
 
-class MockServer(BaseHTTPServer.HTTPServer, object):
+class MockServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer, object):
+    daemon_threads = True
+
     def __init__(self, *args, **kwargs):
         super(MockServer, self).__init__(*args, **kwargs)
         self.counts = { }
+        self.counts_lock = Lock()
+        # seconds to wait before answering a request
+        self.delay = 0
+        # number of upcoming requests to answer with a server error
+        self.fail_requests = 0
+        # base url requests are redirected to, if set
+        self.redirect_to = None
+        # (absolute url, proxy authorization) of the requests sent through
+        # this server as a proxy
+        self.proxied = [ ]
         self.registry = MockSchemaRegistryClient()
-        self.schema_cache = { }
         self.all_routes = {
             'GET' : [
-                (r"/schemas/ids/(\d+)", 'get_schema_by_id'),
-                (r"/subjects/(\w+)/versions/latest", 'get_latest')
+                (r"/schemas/ids/(\d+)$", 'get_schema_by_id'),
+                (r"/subjects/([\w.-]+)/versions/latest$", 'get_latest'),
+                (r"/subjects/([\w.-]+)/versions/(\d+)$", 'get_by_version'),
+                (r"/subjects/([\w.-]+)/versions$", 'get_all_versions'),
+                (r"/config(?:/([\w.-]+))?$", 'get_config')
             ],
             'POST' : [
-                (r"/subjects/(\w+)/versions", 'register'),
-                (r"/subjects/(\w+)", 'get_version')
+                (r"/subjects/([\w.-]+)/versions$", 'register'),
+                (r"/subjects/([\w.-]+)$", 'get_version'),
+                (r"/compatibility/subjects/([\w.-]+)/versions/(latest|\d+)$", 'test_compatibility')
             ]
         }
 
     def _send_response(self, resp, status, body):
+        body = json.dumps(body)
         resp.send_response(status)
         resp.send_header("Content-Type","application/json")
+        resp.send_header("Content-Length",str(len(body)))
         resp.end_headers()
-        resp.wfile.write(json.dumps(body))
-        resp.finish()
+        resp.wfile.write(body)
 
     def _create_error(self, msg, status=400, err_code=1):
         return (status, {
@@ -50,10 +71,27 @@ class MockServer(BaseHTTPServer.HTTPServer, object):
         })
 
     def _run_routes(self, req):
-        self.add_count((req.command, req.path))
+        path = req.path
+        if '://' in path:
+            # act as a proxy to ourselves
+            self.proxied.append((path, req.headers.getheader('proxy-authorization')))
+            path = urlparse.urlparse(path).path
+        self.add_count((req.command, path))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_requests:
+            self.fail_requests -= 1
+            status,body = self._create_error("unavailable", 503, 50301)
+            return self._send_response(req, status, body)
+        if self.redirect_to:
+            req.rfile.read(int(req.headers.getheader('content-length') or 0))
+            req.send_response(307)
+            req.send_header("Location", self.redirect_to + path)
+            req.send_header("Content-Length", "0")
+            return req.end_headers()
         routes = self.all_routes.get(req.command, [])
         for r in routes:
-            m = re.match(r[0], req.path)
+            m = re.match(r[0], path)
             if m:
                 func = getattr(self, r[1])
                 status,body = func(req, m.groups())
@@ -73,14 +111,6 @@ class MockServer(BaseHTTPServer.HTTPServer, object):
         }
         return (200,result)
 
-    def _get_identity_schema(self, avro_schema):
-        # normalized
-        schema_str = json.dumps(avro_schema.to_json())
-        if schema_str in self.schema_cache:
-            return self.schema_cache[schema_str]
-        self.schema_cache[schema_str] = avro_schema
-        return avro_schema
-
     def _get_schema_from_body(self, req):
         length = int(req.headers.getheader('content-length'))
         data = req.rfile.read(length)
@@ -89,8 +119,7 @@ class MockServer(BaseHTTPServer.HTTPServer, object):
         if not schema:
             return None
         try:
-            avro_schema =  Util.parse_schema_from_string(schema)
-            return self._get_identity_schema(avro_schema)
+            return Util.parse_schema_from_string(schema)
         except:
             return None
 
@@ -134,10 +163,47 @@ class MockServer(BaseHTTPServer.HTTPServer, object):
         return (200, result)
 
 
+    def get_by_version(self, req, groups):
+        subject = groups[0]
+        schema_id,avro_schema,version = self.registry.get_by_version(subject, int(groups[1]))
+        if schema_id == None:
+            return self._create_error("Not found", 404)
+        result = {
+            "schema" : json.dumps(avro_schema.to_json()),
+            "subject" : subject,
+            "id" : schema_id,
+            "version" : version
+        }
+        return (200, result)
+
+    def get_all_versions(self, req, groups):
+        versions = self.registry.get_all_versions(groups[0])
+        if not versions:
+            return self._create_error("Not found", 404)
+        return (200, versions)
+
+    def test_compatibility(self, req, groups):
+        avro_schema = self._get_schema_from_body(req)
+        if not avro_schema:
+            return self._create_error("Invalid avro schema", 422, 42201)
+        subject, version = groups
+        if not self.registry.get_all_versions(subject):
+            return self._create_error("Subject not found", 404, 40401)
+        if version != 'latest':
+            version = int(version)
+            if self.registry.get_by_version(subject, version)[0] is None:
+                return self._create_error("Version not found", 404, 40402)
+        compatible = self.registry.test_compatibility(subject, avro_schema, version)
+        return (200, { 'is_compatible' : compatible })
+
+    def get_config(self, req, groups):
+        return (200, { 'compatibilityLevel' : self.registry.get_compatibility(groups[0]) })
+
     def add_count(self, path):
-        if path not in self.counts:
-            self.counts[path] = 0
-        self.counts[path] += 1
+        with self.counts_lock:
+            if path not in self.counts:
+                self.counts[path] = 0
+            self.counts[path] += 1
 
 class ServerThread(Thread):
     def __init__(self, port):
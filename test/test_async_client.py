@@ -0,0 +1,136 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import mock_registry
+import time
+
+from confluent.schemaregistry.client import AsyncSchemaRegistryClient
+from confluent.schemaregistry.serializers import AsyncMessageSerializer, SerializerError, Util
+
+class TestAsyncSchemaRegistryClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = mock_registry.ServerThread(9001)
+        self.server.start()
+        self.client = AsyncSchemaRegistryClient('http://127.0.0.1:9001')
+        time.sleep(1)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.join()
+
+    def test_getters(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = self.client
+        subject = 'test'
+        self.assertEqual(client.get_version(subject, parsed).result(5), -1)
+        self.assertEqual(client.get_by_id(1).result(5), None)
+        self.assertEqual(client.get_latest_schema(subject).result(5), (None,None,None))
+
+        schema_id = client.register(subject, parsed).result(5)
+        self.assertTrue(schema_id > 0)
+        latest = client.get_latest_schema(subject).result(5)
+        version = client.get_version(subject, parsed).result(5)
+        self.assertEqual(latest, (schema_id, parsed, version))
+
+    def test_hit_is_completed(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = self.client
+        schema_id = client.register('test', parsed).result(5)
+        # cached so no need to wait
+        self.assertTrue(client.register('test', parsed).done())
+        future = client.get_by_id(schema_id)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), parsed)
+
+    def test_latest_hit_is_completed(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = AsyncSchemaRegistryClient('http://127.0.0.1:9001', latest_schema_ttl=60)
+        try:
+            schema_id = client.register('test', parsed).result(5)
+            latest = client.get_latest_schema('test').result(5)
+            self.assertEqual(latest[0], schema_id)
+            future = client.get_latest_schema('test')
+            self.assertTrue(future.done())
+            self.assertEqual(future.result(), latest)
+        finally:
+            client.close()
+
+    def test_local_compatibility(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = self.client
+        client.register('test', parsed).result(5)
+        self.assertTrue(client.test_compatibility('test', parsed, level='FULL_TRANSITIVE').result(5))
+        counts = self.server.server.counts
+        requests = sum(counts.values())
+        self.assertTrue(client.test_compatibility('test', parsed, level='BACKWARD').result(5))
+        # only the version list is fetched again
+        self.assertEqual(sum(counts.values()), requests + 1)
+
+    def test_callback(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        results = []
+        future = self.client.register('test', parsed)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        schema_id = future.result(5)
+        self.assertEqual(results, [schema_id])
+
+    def test_serializer(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        ms = AsyncMessageSerializer(self.client)
+        records = data_gen.BASIC_ITEMS
+        messages = [ ms.encode_record_with_schema('test', basic, r).result(5) for r in records ]
+        for message, record in zip(messages, records):
+            self.assertEqual(ms.decode_message(message).result(5), record)
+
+        # a fresh serializer fetches the schema once and then decodes on hits
+        other = AsyncMessageSerializer(self.client)
+        first = other.decode_message(messages[0])
+        self.assertEqual(first.result(5), records[0])
+        second = other.decode_message(messages[1])
+        self.assertTrue(second.done())
+        self.assertEqual(second.result(), records[1])
+
+        message = other.encode_record_for_topic('test', records[0]).result(5)
+        self.assertEqual(message, messages[0])
+
+        projected = other.decode_message(messages[0], fields=['name'])
+        self.assertEqual(projected.result(5), { 'name' : records[0]['name'] })
+        self.assertTrue(other.decode_message(messages[1], fields=['name']).done())
+
+    def test_serializer_errors(self):
+        ms = AsyncMessageSerializer(self.client)
+        future = ms.encode_record_with_schema_id(1, 'not a dict')
+        self.assertTrue(isinstance(future.exception(), SerializerError))
+        future = ms.decode_message('\x00\x00\x00\x00\x63\x00')
+        self.assertTrue(isinstance(future.exception(5), SerializerError))
+        self.assertEqual(future.exception().message, "unable to fetch schema with id 99")
+
+    def test_serializer_registry_errors(self):
+        # registry failures are the SerializerErrors of MessageSerializer
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        record = data_gen.BASIC_ITEMS[0]
+        client = AsyncSchemaRegistryClient('http://127.0.0.1:9001', max_retries=0)
+        try:
+            ms = AsyncMessageSerializer(client)
+            calls = [
+                (lambda: ms.decode_message('\x00\x00\x00\x00\x63\x00'),
+                 "unable to fetch schema with id 99"),
+                (lambda: ms.encode_record_with_schema_id(7, record),
+                 "Error fetching schema from registry"),
+                (lambda: ms.encode_record_with_schema('topic', parsed, record),
+                 "Unable to retrieve schema id for subject topic-value"),
+                (lambda: ms.encode_record_for_topic('topic', record),
+                 "Unable to retrieve schema id for subject topic-value")
+            ]
+            for func, message in calls:
+                self.server.server.fail_requests = 1
+                error = func().exception(5)
+                self.assertTrue(isinstance(error, SerializerError), repr(error))
+                self.assertEqual(error.message, message)
+        finally:
+            client.close()
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestAsyncSchemaRegistryClient)
@@ -1,11 +1,17 @@
 import unittest2 as unittest
 import setup_test_path
 import data_gen
+import json
 import mock_registry
 import time
+import threading
+import os
+import shutil
+import tempfile
 
-from confluent.schemaregistry.client import CachedSchemaRegistryClient
-from confluent.schemaregistry.serializers import Util
+from confluent.schemaregistry.client import CachedSchemaRegistryClient, ClientError
+from confluent.schemaregistry.serializers import MessageSerializer, SerializerError, Util
+from confluent.schemaregistry.Metrics import InMemoryMetrics
 
 class TestCacheSchemaRegistryClient(unittest.TestCase):
 
@@ -16,6 +22,7 @@ class TestCacheSchemaRegistryClient(unittest.TestCase):
         time.sleep(1)
 
     def tearDown(self):
+        self.client.close()
         self.server.shutdown()
         self.server.join()
 
@@ -37,6 +44,36 @@ class TestCacheSchemaRegistryClient(unittest.TestCase):
         self.assertEqual(schema_id, dupe_id)
         self.assertEqual(len(client.id_to_schema), 1)
 
+    def test_equal_schema_register(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        # parse again rather than get the same object from the parse cache
+        Util.parse_cache.clear()
+        other = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        self.assertFalse(parsed is other)
+        client = self.client
+        schema_id = client.register('test', parsed)
+        # a separately parsed copy is the same schema
+        self.assertEqual(client.register('test', other), schema_id)
+        self.assertEqual(client.get_version('test', other),
+                         client.get_version('test', parsed))
+        # no extra trip to the registry
+        self.assertEqual(self.server.server.counts[('POST', '/subjects/test/versions')], 1)
+
+    def test_default_is_new_version(self):
+        fields = [{ 'name' : 'a', 'type' : 'long' }]
+        record = Util.parse_schema_from_string(json.dumps({ 'type' : 'record', 'name' : 'R', 'fields' : fields }))
+        fields[0]['default'] = 1
+        with_default = Util.parse_schema_from_string(json.dumps({ 'type' : 'record', 'name' : 'R', 'fields' : fields }))
+        client = self.client
+        record_id = client.register('test', record)
+        default_id = client.register('test', with_default)
+        self.assertNotEqual(default_id, record_id)
+        self.assertEqual(self.server.server.counts[('POST', '/subjects/test/versions')], 2)
+        self.assertEqual(client.get_version('test', record), 0)
+        self.assertEqual(client.get_version('test', with_default), 1)
+        self.assertEqual(client.register('test', with_default), default_id)
+        self.assertEqual(self.server.server.counts[('POST', '/subjects/test/versions')], 2)
+
     def test_dupe_register(self):
         parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
         subject = 'test'
@@ -105,5 +142,378 @@ class TestCacheSchemaRegistryClient(unittest.TestCase):
         # latest should not change with a re-reg
         self.assertEqual(latest2, latest3)
 
+    def test_connection_reuse(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = self.client
+        schema_id = client.register('test', parsed)
+        for i in range(10):
+            # force a trip to the registry
+            client.id_to_schema.clear()
+            self.assertEqual(client.get_by_id(schema_id), parsed)
+        self.assertEqual(client.pool.num_connections, 1)
+
+    def test_max_schemas_per_subject(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', max_schemas_per_subject=1)
+        client.register('test', basic)
+        client.register('test', adv)
+        self.assertEqual(len(client.subject_to_schema_ids.get('test')), 1)
+        stats = client.cache_stats()
+        self.assertEqual(stats['subject_to_schema_ids']['evictions'], 1)
+        self.assertEqual(stats['id_to_schema']['size'], 2)
+
+        # evicted entry is fetched again
+        client.register('test', basic)
+        self.assertEqual(self.server.server.counts[('POST', '/subjects/test/versions')], 3)
+        client.close()
+
+    def _run_concurrently(self, func, num_threads=32):
+        start = threading.Event()
+        results = []
+        def run():
+            start.wait()
+            results.append(func())
+        threads = [ threading.Thread(target=run) for i in range(num_threads) ]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_misses(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        subject = 'test'
+        schema_id = self.server.server.registry.register(subject, basic)
+        self.server.server.delay = 0.2
+        client = self.client
+        counts = self.server.server.counts
+
+        results = self._run_concurrently(lambda: client.get_by_id(schema_id))
+        self.assertEqual(results, [basic] * 32)
+        self.assertEqual(counts[('GET', '/schemas/ids/%d' % (schema_id))], 1)
+
+        results = self._run_concurrently(lambda: client.register(subject, basic))
+        self.assertEqual(results, [schema_id] * 32)
+        self.assertEqual(counts[('POST', '/subjects/test/versions')], 1)
+
+        results = self._run_concurrently(lambda: client.get_version(subject, basic))
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(counts[('POST', '/subjects/test')], 1)
+
+        results = self._run_concurrently(lambda: client.get_latest_schema(subject))
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(counts[('GET', '/subjects/test/versions/latest')], 1)
+
+    def test_latest_schema_cache(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        subject = 'test'
+        path = ('GET', '/subjects/test/versions/latest')
+        registry = self.server.server.registry
+        counts = self.server.server.counts
+        basic_id = registry.register(subject, basic)
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', latest_schema_ttl=10,
+                                            latest_schema_refresh=0.2)
+        try:
+            latest = client.get_latest_schema(subject)
+            self.assertEqual(latest[0], basic_id)
+            self.assertEqual(client.get_latest_schema(subject), latest)
+            self.assertEqual(counts[path], 1)
+
+            # the refresher picks up the new version
+            adv_id = registry.register(subject, adv)
+            time.sleep(0.5)
+            self.assertEqual(counts[path], 2)
+            self.assertEqual(client.get_latest_schema(subject)[0], adv_id)
+            self.assertEqual(counts[path], 2)
+
+            # subjects that are not read are not polled
+            time.sleep(1)
+            self.assertEqual(counts[path], 3)
+        finally:
+            client.close()
+
+    def test_persistent_store(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        url = 'http://127.0.0.1:9001'
+        counts = self.server.server.counts
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'schemas.db')
+        try:
+            first = CachedSchemaRegistryClient(url, cache_path=path)
+            schema_id = first.register('test', basic)
+            version = first.get_version('test', basic)
+            first.close()
+            requests = sum(counts.values())
+
+            # a new client starts warm from the store
+            second = CachedSchemaRegistryClient(url, cache_path=path)
+            self.assertEqual(second.get_by_id(schema_id), basic)
+            self.assertEqual(second.register('test', basic), schema_id)
+            self.assertEqual(second.get_version('test', basic), version)
+            self.assertEqual(sum(counts.values()), requests)
+            second.close()
+
+            # subject entries are revalidated once too old
+            third = CachedSchemaRegistryClient(url, cache_path=path, store_revalidate=0)
+            time.sleep(0.1)
+            self.assertEqual(third.register('test', basic), schema_id)
+            self.assertEqual(counts[('POST', '/subjects/test/versions')], 2)
+            self.assertEqual(third.get_by_id(schema_id), basic)
+            self.assertEqual(sum(counts.values()), requests + 1)
+            third.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def _in_child(self, func):
+        """Run func in a forked process and return whether it returned True"""
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = func()
+            except:
+                ok = False
+            os._exit(0 if ok else 1)
+        return os.waitpid(pid, 0)[1] == 0
+
+    def test_shared_store(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        url = 'http://127.0.0.1:9001'
+        counts = self.server.server.counts
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'schemas.db')
+        try:
+            parent = CachedSchemaRegistryClient(url, cache_path=path)
+            basic_id = parent.register('test', basic)
+            adv_id = self.server.server.registry.register('other', adv)
+            requests = sum(counts.values())
+
+            # a worker attached read only finds what the parent stored
+            def attached():
+                worker = CachedSchemaRegistryClient(url, cache_path=path, cache_read_only=True)
+                return worker.get_by_id(basic_id) == basic
+            self.assertTrue(self._in_child(attached))
+            self.assertEqual(sum(counts.values()), requests)
+
+            # a miss in a forked worker is seen by the others
+            self.assertTrue(self._in_child(lambda: parent.get_by_id(adv_id) == adv))
+            self.assertEqual(sum(counts.values()), requests + 1)
+            self.assertTrue(self._in_child(lambda: parent.get_by_id(adv_id) == adv))
+            self.assertEqual(sum(counts.values()), requests + 1)
+
+            # the parent's own connections still work
+            self.assertEqual(parent.get_by_id(adv_id), adv)
+            self.assertEqual(parent.pool.num_connections, 1)
+            parent.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_prefetch(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        registry = self.server.server.registry
+        counts = self.server.server.counts
+        basic_id = registry.register('test', basic)
+        adv_id = registry.register('test', adv)
+        other_id = registry.register('other', Util.parse_schema_from_string('"string"'))
+        message = MessageSerializer(registry).encode_record_with_schema_id(adv_id,
+                                                                           data_gen.ADVANCED_ITEMS[0])
+
+        ms = MessageSerializer(self.client)
+        report = ms.prefetch(subjects=['test', 'missing'], ids=[other_id, 1000], max_workers=4)
+        self.assertEqual(report['ids'], sorted([basic_id, adv_id, other_id]))
+        self.assertEqual(report['schemas'], 3)
+        self.assertEqual(report['subjects'], 1)
+        self.assertEqual(report['codecs'], 3)
+        self.assertEqual(sorted(report['errors'].keys()), [1000, 'missing'])
+        self.assertTrue(report['seconds'] > 0)
+
+        # everything is served from the caches
+        requests = sum(counts.values())
+        self.assertEqual(self.client.get_by_id(adv_id), adv)
+        self.assertEqual(self.client.get_version('test', basic), 0)
+        self.assertTrue(adv_id in ms.id_to_writers)
+        self.assertEqual(ms.decode_message(message), data_gen.ADVANCED_ITEMS[0])
+        self.assertEqual(sum(counts.values()), requests)
+
+    def test_negative_cache(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        counts = self.server.server.counts
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', negative_cache_ttl=0.5)
+        ms = MessageSerializer(client)
+        bogus = '\x00\x00\x00\x03\xe7\x00'
+        try:
+            for i in range(5):
+                self.assertEqual(client.get_by_id(999), None)
+                self.assertEqual(client.get_latest_schema('test'), (None, None, None))
+                self.assertEqual(client.get_version('test', basic), -1)
+                self.assertRaises(SerializerError, ms.decode_message, bogus)
+            self.assertEqual(counts[('GET', '/schemas/ids/999')], 1)
+            self.assertEqual(counts[('GET', '/subjects/test/versions/latest')], 1)
+            self.assertEqual(counts[('POST', '/subjects/test')], 1)
+            self.assertEqual(client.cache_stats()['negative']['size'], 3)
+
+            # registering forgets what was missing for the subject
+            schema_id = client.register('test', basic)
+            self.assertEqual(client.get_latest_schema('test')[0], schema_id)
+            self.assertNotEqual(client.get_version('test', basic), -1)
+
+            # entries expire
+            time.sleep(0.6)
+            self.assertEqual(client.get_by_id(999), None)
+            self.assertEqual(counts[('GET', '/schemas/ids/999')], 2)
+        finally:
+            client.close()
+
+    def test_request_timeout(self):
+        self.server.server.delay = 1
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', request_timeout=0.2,
+                                            max_retries=0)
+        start = time.time()
+        self.assertRaises(ClientError, client.get_by_id, 1)
+        self.assertTrue(time.time() - start < 0.8)
+        client.close()
+
+    def test_retries(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        schema_id = self.server.server.registry.register('test', parsed)
+        self.server.server.fail_requests = 2
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', retry_backoff=0.01)
+        self.assertEqual(client.get_by_id(schema_id), parsed)
+        self.assertEqual(self.server.server.counts[('GET', '/schemas/ids/%d' % (schema_id))], 3)
+
+        # a budget bounds the time spent retrying
+        self.server.server.fail_requests = 100
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', max_retries=1000,
+                                            retry_backoff=0.01, request_budget=0.3)
+        start = time.time()
+        self.assertRaises(ClientError, client.get_by_id, schema_id)
+        self.assertTrue(time.time() - start < 0.6)
+        client.close()
+
+    def test_stale_while_error(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        counts = self.server.server.counts
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', cache_ttl=0.1,
+                                            max_retries=0, breaker_threshold=2,
+                                            breaker_reset=60)
+        schema_id = client.register('test', basic)
+        latest = client.get_latest_schema('test')
+        version = client.get_version('test', basic)
+        time.sleep(0.2)
+
+        self.server.server.fail_requests = 100
+        self.assertEqual(client.get_latest_schema('test'), latest)
+        self.assertEqual(client.register('test', basic), schema_id)
+        self.assertEqual(client.breaker.state, 'open')
+        requests = sum(counts.values())
+
+        # served from the stale caches without contacting the registry
+        self.assertEqual(client.get_version('test', basic), version)
+        self.assertEqual(client.get_latest_schema('test'), latest)
+        self.assertEqual(client.get_by_id(schema_id), basic)
+        self.assertRaises(ClientError, client.get_by_id, schema_id + 1)
+        self.assertEqual(sum(counts.values()), requests)
+        client.close()
+
+    def test_metrics(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        metrics = InMemoryMetrics()
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', max_retries=1,
+                                            retry_backoff=0.01, metrics=metrics)
+        schema_id = client.register('test', basic)
+        client.register('test', basic)
+        advanced = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.server.server.registry.register('test', advanced)
+        # make the client parse it
+        Util.parse_cache.clear()
+        self.server.server.fail_requests = 1
+        client.get_by_id(schema_id + 1)
+        client.get_by_id(schema_id + 1)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['cache_hits'], { 'subject_to_schema_ids' : 1, 'id_to_schema' : 1 })
+        self.assertEqual(snapshot['cache_misses'], { 'subject_to_schema_ids' : 1, 'id_to_schema' : 1 })
+        self.assertEqual(snapshot['errors'], { 503 : 1 })
+        self.assertEqual(snapshot['latency'][('http://127.0.0.1:9001', 'POST')]['count'], 1)
+        self.assertEqual(snapshot['latency'][('http://127.0.0.1:9001', 'GET')]['count'], 2)
+        self.assertTrue(snapshot['bytes_sent'] > 0)
+        self.assertTrue(snapshot['bytes_received'] > 0)
+        self.assertEqual(snapshot['parse_time']['count'], 1)
+        client.close()
+
+    def test_local_compatibility(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = self.client
+        client.register('test', basic)
+        self.assertTrue(client.test_compatibility('test', basic, level='FULL'))
+        self.assertTrue(client.test_compatibility('test', basic, version=0, level='FULL'))
+        self.assertTrue(client.test_compatibility('test', basic, level='FULL_TRANSITIVE'))
+        self.assertFalse(client.test_compatibility('missing', basic, level='FULL'))
+
+        # only the version list is fetched again
+        counts = self.server.server.counts
+        requests = sum(counts.values())
+        self.assertTrue(client.test_compatibility('test', basic, version=0, level='BACKWARD'))
+        self.assertTrue(client.test_compatibility('test', basic, level='BACKWARD'))
+        self.assertTrue(client.test_compatibility('test', basic, level='FULL_TRANSITIVE'))
+        self.assertEqual(sum(counts.values()), requests + 2)
+        self.assertEqual(counts[('GET', '/subjects/test/versions')], 4)
+
+        # a version registered by another client is checked against
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.server.server.registry.register('test', adv)
+        self.assertEqual(client.get_all_versions('test'), [0, 1])
+        self.assertTrue(client.test_compatibility('test', adv, level='NONE'))
+        self.assertFalse(client.test_compatibility('test', basic, level='FORWARD'))
+
+    def test_local_compatibility_latest_ttl(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', latest_schema_ttl=0.5)
+        try:
+            client.register('test', basic)
+            self.assertTrue(client.test_compatibility('test', basic, level='FULL'))
+            # served from the caches within the ttl
+            counts = self.server.server.counts
+            requests = sum(counts.values())
+            self.assertTrue(client.test_compatibility('test', basic, level='BACKWARD'))
+            self.assertTrue(client.test_compatibility('test', basic, level='FULL_TRANSITIVE'))
+            self.assertEqual(sum(counts.values()), requests)
+
+            # registering through the client forgets the version list
+            adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+            client.register('test', adv)
+            self.assertEqual(client.get_all_versions('test'), [0, 1])
+
+            # and versions registered elsewhere are seen after the ttl
+            other = Util.parse_schema_from_string('{"type" : "record", "name" : "Other", "fields" : [ ]}')
+            self.server.server.registry.register('test', other)
+            self.assertEqual(client.get_all_versions('test'), [0, 1])
+            time.sleep(0.6)
+            self.assertEqual(client.get_all_versions('test'), [0, 1, 2])
+            self.assertFalse(client.test_compatibility('test', basic, level='BACKWARD'))
+        finally:
+            client.close()
+
+    def test_remote_compatibility(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        client = CachedSchemaRegistryClient('http://127.0.0.1:9001', max_retries=0)
+        try:
+            client.register('test', basic)
+            self.assertTrue(client.test_compatibility('test', basic))
+            self.assertTrue(client.test_compatibility('test', basic, version=0))
+            self.assertFalse(client.test_compatibility('test', basic, version=5))
+            self.assertFalse(client.test_compatibility('missing', basic))
+            self.assertEqual(client.get_compatibility(), 'BACKWARD')
+            self.assertEqual(client.get_compatibility('test'), 'BACKWARD')
+            # errors reaching the registry are not reported as incompatible
+            self.server.server.fail_requests = 1
+            self.assertRaises(ClientError, client.test_compatibility, 'test', basic)
+        finally:
+            client.close()
+
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(BaseTest)
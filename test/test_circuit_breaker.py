@@ -0,0 +1,44 @@
+import unittest2 as unittest
+import setup_test_path
+import time
+
+from confluent.schemaregistry.client.CircuitBreaker import CircuitBreaker
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for i in range(2):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.2)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # a single trial call is let through
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.2)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestCircuitBreaker)
@@ -0,0 +1,139 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import array
+import json
+import struct
+
+from avro import io
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, SerializerError, Util
+from confluent.schemaregistry.serializers import ColumnDecoder
+from test_fast_encode import slow_encode
+
+ROW_SCHEMA = json.dumps({
+    'type' : 'record', 'name' : 'Row', 'fields' : [
+        { 'name' : 'b', 'type' : 'boolean' },
+        { 'name' : 'i', 'type' : 'int' },
+        { 'name' : 'l', 'type' : 'long' },
+        { 'name' : 'f', 'type' : 'float' },
+        { 'name' : 'd', 'type' : 'double' },
+        { 'name' : 's', 'type' : 'string' },
+        { 'name' : 'y', 'type' : 'bytes' },
+        { 'name' : 'e', 'type' : { 'type' : 'enum', 'name' : 'E', 'symbols' : ['A', 'B', 'C'] } },
+        { 'name' : 'x', 'type' : { 'type' : 'fixed', 'name' : 'X', 'size' : 2 } },
+        { 'name' : 'ns', 'type' : ['null', 'string'] },
+        { 'name' : 'nl', 'type' : ['long', 'null'] },
+        { 'name' : 'r', 'type' : { 'type' : 'record', 'name' : 'Inner', 'fields' : [
+            { 'name' : 'a', 'type' : 'int' },
+            { 'name' : 'nx', 'type' : ['null', 'X'] } ] } },
+        { 'name' : 'arr', 'type' : { 'type' : 'array', 'items' : 'int' } },
+        { 'name' : 'u', 'type' : ['int', 'string'] }
+    ]
+})
+
+ROWS = [
+    { 'b' : True, 'i' : -1, 'l' : 2 ** 40, 'f' : 1.5, 'd' : -2.25, 's' : u'\xe9t\xe9', 'y' : '\x00\xff',
+      'e' : 'C', 'x' : 'ab', 'ns' : None, 'nl' : 5, 'r' : { 'a' : 1, 'nx' : 'cd' }, 'arr' : [1, 2],
+      'u' : 3 },
+    { 'b' : False, 'i' : 7, 'l' : -3, 'f' : 0.0, 'd' : 1e100, 's' : u'', 'y' : '',
+      'e' : 'A', 'x' : 'zz', 'ns' : u'yes', 'nl' : None, 'r' : { 'a' : 2, 'nx' : None }, 'arr' : [],
+      'u' : u'three' },
+]
+
+def row_columns(rows):
+    """The columns expected for ROWS, as lists"""
+    columns = { }
+    for row in rows:
+        for name, value in row.items():
+            if name == 'r':
+                columns.setdefault('r.a', []).append(value['a'])
+                columns.setdefault('r.nx', []).append(value['nx'])
+            else:
+                columns.setdefault(name, []).append(value)
+    return columns
+
+class TestColumnDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = Util.parse_schema_from_string(ROW_SCHEMA)
+
+    def test_columns(self):
+        decoder = ColumnDecoder.compile_columns(self.schema)
+        columns = decoder.decode([ slow_encode(self.schema, r) for r in ROWS ])
+        self.assertEqual(columns.keys(), ['b', 'i', 'l', 'f', 'd', 's', 'y', 'e', 'x', 'ns', 'nl',
+                                          'r.a', 'r.nx', 'arr', 'u'])
+        self.assertEqual(columns.keys(), decoder.names())
+        expected = row_columns(ROWS)
+        for name, column in columns.items():
+            self.assertEqual(len(column), len(ROWS))
+            self.assertEqual(column.to_list(), expected[name], name)
+
+        self.assertEqual([ columns[n].type for n in ('b', 'l', 's', 'e', 'ns', 'r.nx', 'arr', 'u') ],
+                         ['boolean', 'long', 'string', 'enum', 'string', 'fixed', 'object', 'object'])
+        # strings are utf-8 bytes back to back, nulls are empty
+        self.assertEqual(columns['s'].data.tostring(), '\xc3\xa9t\xc3\xa9')
+        self.assertEqual(list(columns['s'].offsets), [0, 5, 5])
+        self.assertEqual(list(columns['ns'].offsets), [0, 0, 3])
+        self.assertEqual(list(columns['ns'].validity), [0, 1])
+        self.assertEqual(list(columns['nl'].values), [5, 0])
+        self.assertEqual(list(columns['e'].values), [2, 0])
+        self.assertEqual(columns['e'].symbols, ['A', 'B', 'C'])
+        self.assertEqual(columns['r.nx'].data.tostring(), 'cd\x00\x00')
+        self.assertTrue(columns['i'].validity is None)
+        if ColumnDecoder.numpy:
+            self.assertTrue(isinstance(columns['l'].values, ColumnDecoder.numpy.ndarray))
+            self.assertEqual(columns['l'].values.dtype, ColumnDecoder.numpy.int64)
+        else:
+            self.assertTrue(isinstance(columns['l'].values, array.array))
+
+    def test_empty_batch(self):
+        columns = ColumnDecoder.compile_columns(self.schema).decode([])
+        self.assertEqual([ len(c) for c in columns.values() ], [0] * len(columns))
+        self.assertEqual(columns['s'].to_list(), [])
+
+    def test_reader_schema(self):
+        reader = json.loads(ROW_SCHEMA)
+        for field in reader['fields']:
+            if field['name'] == 'i':
+                field['type'] = 'double'
+        reader['fields'].append({ 'name' : 'new', 'type' : ['null', 'string'], 'default' : None })
+        reader['fields'].append({ 'name' : 'tag', 'type' : 'string', 'default' : 'x' })
+        reader = Util.parse_schema_from_string(json.dumps(reader))
+        decoder = ColumnDecoder.compile_columns(self.schema, reader, ['i', 'new', 'tag', 'r'])
+        columns = decoder.decode([ 'xx' + slow_encode(self.schema, r) for r in ROWS ], 2)
+        self.assertEqual(columns.keys(), ['i', 'r.a', 'r.nx', 'new', 'tag'])
+        self.assertEqual(columns['i'].type, 'double')
+        self.assertEqual(columns['i'].to_list(), [-1.0, 7.0])
+        self.assertEqual(columns['new'].to_list(), [None, None])
+        self.assertEqual(columns['tag'].to_list(), [u'x', u'x'])
+
+        bad = Util.parse_schema_from_string(json.dumps(
+            { 'type' : 'record', 'name' : 'Row', 'fields' : [ { 'name' : 'l', 'type' : 'int' } ] }))
+        self.assertRaises(io.SchemaResolutionException, ColumnDecoder.compile_columns, self.schema, bad)
+        self.assertRaises(io.SchemaResolutionException, ColumnDecoder.compile_columns,
+                          Util.parse_schema_from_string('"int"'))
+
+    def test_serializer(self):
+        client = MockSchemaRegistryClient()
+        schema_id = client.register('test', self.schema)
+        serializer = MessageSerializer(client)
+        messages = serializer.encode_records(schema_id, ROWS)
+        columns = serializer.decode_columns([messages[0], bytearray(messages[1])])
+        expected = row_columns(ROWS)
+        self.assertEqual(dict((n, c.to_list()) for n, c in columns.items()), expected)
+        self.assertEqual(serializer.decode_columns([]), { })
+        self.assertTrue((schema_id, None, None, 'columns') in serializer.id_to_decoder_func)
+
+        columns = serializer.decode_columns(messages, fields=['s'])
+        self.assertEqual(columns.keys(), ['s'])
+
+        adv_id = client.register('adv', Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA))
+        other = serializer.encode_record_with_schema_id(adv_id, data_gen.ADVANCED_ITEMS[0])
+        self.assertRaises(SerializerError, serializer.decode_columns, messages + [other])
+        self.assertRaises(SerializerError, serializer.decode_columns, [messages[0][:-1]])
+        int_id = client.register('ints', Util.parse_schema_from_string('"int"'))
+        self.assertRaises(SerializerError, serializer.decode_columns, [struct.pack('>bI', 0, int_id) + '\x02'])
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestColumnDecoder)
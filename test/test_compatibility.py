@@ -0,0 +1,94 @@
+import unittest2 as unittest
+import setup_test_path
+import json
+
+from confluent.schemaregistry.client import ClientError
+from confluent.schemaregistry.client.Compatibility import CompatibilityChecker
+from confluent.schemaregistry.serializers import Util
+
+def record(fields, name='User'):
+    return Util.parse_schema_from_string(json.dumps({
+        'type' : 'record', 'name' : name, 'fields' : fields }))
+
+V1 = record([ { 'name' : 'name', 'type' : 'string' } ])
+# adds a field with a default
+V2 = record([ { 'name' : 'name', 'type' : 'string' },
+              { 'name' : 'age', 'type' : 'int', 'default' : 0 } ])
+# adds a field without a default
+V3 = record([ { 'name' : 'name', 'type' : 'string' },
+              { 'name' : 'email', 'type' : 'string' } ])
+
+class TestCompatibility(unittest.TestCase):
+
+    def setUp(self):
+        self.checker = CompatibilityChecker()
+
+    def test_fields(self):
+        checker = self.checker
+        self.assertTrue(checker.can_read(V2, V1))
+        self.assertTrue(checker.can_read(V1, V2))
+        self.assertFalse(checker.can_read(V3, V1))
+        self.assertTrue(checker.can_read(V1, V3))
+        self.assertFalse(checker.can_read(V1, record([ { 'name' : 'name', 'type' : 'string' } ],
+                                                     name='Other')))
+
+    def test_promotions(self):
+        checker = self.checker
+        int_field = record([ { 'name' : 'n', 'type' : 'int' } ])
+        long_field = record([ { 'name' : 'n', 'type' : 'long' } ])
+        self.assertTrue(checker.can_read(long_field, int_field))
+        self.assertFalse(checker.can_read(int_field, long_field))
+
+    def test_unions_and_enums(self):
+        checker = self.checker
+        parse = lambda s: Util.parse_schema_from_string(json.dumps(s))
+        self.assertTrue(checker.can_read(parse(['null', 'string']), parse('string')))
+        self.assertFalse(checker.can_read(parse('string'), parse(['null', 'string'])))
+        small = parse({ 'type' : 'enum', 'name' : 'E', 'symbols' : ['A', 'B'] })
+        large = parse({ 'type' : 'enum', 'name' : 'E', 'symbols' : ['A', 'B', 'C'] })
+        self.assertTrue(checker.can_read(large, small))
+        self.assertFalse(checker.can_read(small, large))
+        self.assertTrue(checker.can_read(parse({ 'type' : 'map', 'values' : 'double' }),
+                                         parse({ 'type' : 'map', 'values' : 'float' })))
+
+    def test_recursive(self):
+        node = record([ { 'name' : 'next', 'type' : ['null', 'Node'] } ], name='Node')
+        self.assertTrue(self.checker.can_read(node, node))
+
+    def test_levels(self):
+        checker = self.checker
+        self.assertTrue(checker.is_compatible(V3, [V1], 'FORWARD'))
+        self.assertFalse(checker.is_compatible(V3, [V1], 'BACKWARD'))
+        self.assertFalse(checker.is_compatible(V3, [V1], 'FULL'))
+        self.assertTrue(checker.is_compatible(V3, [V1], 'NONE'))
+        self.assertTrue(checker.is_compatible(V2, [V1], 'FULL'))
+        self.assertTrue(checker.is_compatible(V1, [], 'FULL'))
+
+        # only the latest counts unless transitive
+        self.assertTrue(checker.is_compatible(V1, [V3, V2], 'FORWARD'))
+        self.assertFalse(checker.is_compatible(V1, [V3, V2], 'FORWARD_TRANSITIVE'))
+        self.assertRaises(ClientError, checker.is_compatible, V1, [V2], 'SIDEWAYS')
+
+    def test_memoized(self):
+        checker = self.checker
+        checker.can_read(V2, V1)
+        checker.can_read(V2, record([ { 'name' : 'name', 'type' : 'string' } ]))
+        self.assertEqual(len(checker.results), 1)
+        self.assertEqual(checker.results.stats.hits, 1)
+
+    def test_defaults_in_memo(self):
+        # readers differing only by a default must not share a result
+        no_default = record([ { 'name' : 'name', 'type' : 'string' },
+                              { 'name' : 'age', 'type' : 'int' } ])
+        for readers in ([V2, no_default], [no_default, V2]):
+            checker = CompatibilityChecker()
+            self.assertEqual([ checker.can_read(r, V1) for r in readers ],
+                             [ r is V2 for r in readers ])
+        # and likewise by an alias
+        renamed = record([ { 'name' : 'full_name', 'type' : 'string' } ])
+        aliased = record([ { 'name' : 'full_name', 'type' : 'string', 'aliases' : ['name'] } ])
+        self.assertFalse(self.checker.can_read(renamed, V1))
+        self.assertTrue(self.checker.can_read(aliased, V1))
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestCompatibility)
@@ -0,0 +1,126 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import cStringIO
+import json
+import sys
+
+from avro import io
+from confluent.schemaregistry.serializers import Util
+
+MessageSerializer = sys.modules['confluent.schemaregistry.serializers.MessageSerializer']
+
+# (schema, records) pairs covering every avro type
+CASES = [
+    ('"null"', [None]),
+    ('"boolean"', [True, False]),
+    ('"int"', [0, 1, -1, 63, -64, 2 ** 31 - 1, -2 ** 31]),
+    ('"long"', [0, 2 ** 63 - 1, -2 ** 63, 123456789012]),
+    ('"float"', [0.0, 1.5, -3.25]),
+    ('"double"', [0.0, 1e100, -2.5]),
+    ('"bytes"', ['', '\x00\xff', 'abc' * 100]),
+    ('"string"', ['', 'abc', u'\xe9t\xe9']),
+    ('{"type" : "enum", "name" : "E", "symbols" : ["A", "B", "C"]}', ['A', 'C']),
+    ('{"type" : "fixed", "name" : "F", "size" : 4}', ['abcd']),
+    ('{"type" : "array", "items" : "long"}', [[], [1, 2, 3]]),
+    ('{"type" : "map", "values" : ["null", "string"]}', [{}, {'a' : None, 'b' : 'x'}]),
+    ('["null", "long", "string"]', [None, 5, 'x']),
+    (json.dumps({ 'type' : 'record', 'name' : 'Node', 'namespace' : 'test',
+                  'fields' : [ { 'name' : 'value', 'type' : 'int' },
+                               { 'name' : 'next', 'type' : ['null', 'Node'] } ] }),
+     [{ 'value' : 1, 'next' : None },
+      { 'value' : 1, 'next' : { 'value' : 2, 'next' : { 'value' : 3, 'next' : None } } }]),
+    (data_gen.BASIC_SCHEMA, data_gen.BASIC_ITEMS),
+    (data_gen.ADVANCED_SCHEMA, data_gen.ADVANCED_ITEMS),
+]
+
+# unions where several branches accept the same python value
+UNION_CASES = [
+    ('["int", "long"]', [1, 2 ** 40]),
+    ('["long", "int"]', [1, 2 ** 40]),
+    ('["float", "double"]', [1.5, 2]),
+    ('["null", "boolean", "int"]', [None, True, 3]),
+    ('["string", "bytes"]', ['abc', u'abc']),
+    ('[{"type" : "enum", "name" : "E", "symbols" : ["A"]}, "string"]', ['A', 'B']),
+    ('[{"type" : "map", "values" : "int"}, '
+     '{"type" : "record", "name" : "R", "fields" : [{"name" : "a", "type" : "int"}]}]',
+     [{ 'a' : 1 }, { 'b' : 2 }]),
+    ('{"type" : "array", "items" : "null"}', [[None, None]]),
+    ('["null", "string", "bytes"]', ['abc', u'abc']),
+    ('["long", "double"]', [3, 1.5]),
+    ('[{"type" : "record", "name" : "R1", "fields" : [{"name" : "a", "type" : "int"}]}, '
+     '{"type" : "record", "name" : "R2", "fields" : [{"name" : "a", "type" : "int"}]}]',
+     [{ 'a' : 1 }]),
+    ('{"type" : "array", "items" : ["int", "long"]}', [[5, 2 ** 40]]),
+]
+
+def slow_encode(schema, record):
+    outf = cStringIO.StringIO()
+    io.DatumWriter(schema).write(record, io.BinaryEncoder(outf))
+    return outf.getvalue()
+
+def fast_encode(schema, record):
+    outf = cStringIO.StringIO()
+    MessageSerializer._create_writer(schema)(record, outf)
+    return outf.getvalue()
+
+@unittest.skipUnless(MessageSerializer.HAS_FAST, "fastavro is not installed")
+class TestFastEncode(unittest.TestCase):
+
+    def test_same_bytes(self):
+        for schema_str, records in CASES + UNION_CASES:
+            schema = Util.parse_schema_from_string(schema_str)
+            for record in records:
+                self.assertEqual(fast_encode(schema, record), slow_encode(schema, record),
+                                 "%s %r" % (schema_str, record))
+
+    def test_same_records(self):
+        for schema_str, records in CASES:
+            schema = Util.parse_schema_from_string(schema_str)
+            parsed, reason = MessageSerializer._fast_schema(schema)
+            for record in records:
+                decoded = MessageSerializer.schemaless_reader(
+                    cStringIO.StringIO(slow_encode(schema, record)), parsed)
+                self.assertEqual(decoded, record, "%s %r" % (schema_str, record))
+        for schema_str, records in UNION_CASES:
+            schema = Util.parse_schema_from_string(schema_str)
+            parsed, reason = MessageSerializer._fast_schema(schema)
+            for record in records:
+                data = slow_encode(schema, record)
+                expected = io.DatumReader(schema).read(io.BinaryDecoder(cStringIO.StringIO(data)))
+                decoded = MessageSerializer.schemaless_reader(cStringIO.StringIO(data), parsed)
+                self.assertEqual(decoded, expected, "%s %r" % (schema_str, record))
+
+    def test_ambiguous_unions(self):
+        # fastavro still decodes them, but they are written by the compiled encoder
+        for schema_str, records in UNION_CASES:
+            if schema_str == '{"type" : "array", "items" : "null"}':
+                # no union at all
+                continue
+            choice = MessageSerializer._choose_backend(Util.parse_schema_from_string(schema_str))
+            self.assertEqual((choice['backend'], choice['writer']), ('fastavro', 'compiled'), schema_str)
+            self.assertTrue(choice['writer_reason'].startswith("fastavro writes other branches"))
+        for schema_str, records in CASES:
+            choice = MessageSerializer._choose_backend(Util.parse_schema_from_string(schema_str))
+            self.assertEqual(choice['writer'], 'fastavro', schema_str)
+
+    def test_reused_names(self):
+        # two versions of a schema defining the same name differently
+        def version(field_type):
+            return Util.parse_schema_from_string(json.dumps({
+                'type' : 'record', 'name' : 'Outer', 'fields' : [
+                    { 'name' : 'a', 'type' : { 'type' : 'record', 'name' : 'Inner', 'fields' : [
+                        { 'name' : 'x', 'type' : field_type } ] } },
+                    { 'name' : 'b', 'type' : 'Inner' } ] }))
+        v1 = version('int')
+        v2 = version('string')
+        writer1 = MessageSerializer._create_writer(v1)
+        writer2 = MessageSerializer._create_writer(v2)
+        for schema, writer, value in [(v1, writer1, 5), (v2, writer2, 'five')]:
+            record = { 'a' : { 'x' : value }, 'b' : { 'x' : value } }
+            outf = cStringIO.StringIO()
+            writer(record, outf)
+            self.assertEqual(outf.getvalue(), slow_encode(schema, record))
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestFastEncode)
@@ -0,0 +1,61 @@
+import unittest2 as unittest
+import setup_test_path
+import time
+
+from confluent.schemaregistry.LRUCache import LRUCache, CacheStats
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_max_size(self):
+        cache = LRUCache(max_size=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        # touch a so that b is the least recently used
+        self.assertEqual(cache['a'], 1)
+        cache['c'] = 3
+        self.assertEqual(sorted(cache.keys()), ['a', 'c'])
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_bytes=10, sizeof=len)
+        cache['a'] = 'x' * 6
+        cache['b'] = 'x' * 4
+        self.assertEqual(cache.total_bytes, 10)
+        cache['c'] = 'x' * 2
+        self.assertFalse('a' in cache)
+        self.assertEqual(cache.total_bytes, 6)
+        # explicit sizes override sizeof
+        cache.set('d', 'x', 5)
+        self.assertEqual(sorted(cache.keys()), ['c', 'd'])
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0.1)
+        cache['a'] = 1
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.2)
+        self.assertFalse('a' in cache)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.stats.expirations, 1)
+        # expired entries are kept until evicted or replaced
+        self.assertEqual(cache.get_stale('a'), 1)
+        cache['a'] = 2
+        self.assertEqual(cache.get('a'), 2)
+
+    def test_stats(self):
+        stats = CacheStats()
+        first = LRUCache(stats=stats)
+        second = LRUCache(stats=stats)
+        first['a'] = 1
+        first.get('a')
+        second.get('a')
+        self.assertRaises(KeyError, lambda: second['a'])
+        self.assertEqual(stats.to_dict(), { 'hits' : 1, 'misses' : 2,
+                                            'evictions' : 0, 'expirations' : 0 })
+
+    def test_setdefault(self):
+        cache = LRUCache()
+        self.assertEqual(cache.setdefault('a', 1), 1)
+        self.assertEqual(cache.setdefault('a', 2), 1)
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestLRUCache)
@@ -3,11 +3,14 @@ import data_gen
 import setup_test_path
 
 import struct
+import sys
 
 from avro import schema
-from confluent.schemaregistry.serializers import MessageSerializer, Util
+from confluent.schemaregistry.serializers import MessageSerializer, SerializerError, Util
 from confluent.schemaregistry.client import MockSchemaRegistryClient
 
+HAS_FAST = sys.modules['confluent.schemaregistry.serializers.MessageSerializer'].HAS_FAST
+
 class TestMessageSerializer(unittest.TestCase):
 
     def setUp(self):
@@ -66,5 +69,135 @@ class TestMessageSerializer(unittest.TestCase):
             message = self.ms.encode_record_with_schema(topic, basic, record)
             self.assertMessageIsSame(message, record ,schema_id)
 
+    def test_decode_from_buffer(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        basic_id = self.client.register('test', basic)
+        adv_id = self.client.register('test_adv', adv)
+        records = [ (basic_id, r) for r in data_gen.BASIC_ITEMS ] + \
+                  [ (adv_id, r) for r in data_gen.ADVANCED_ITEMS ]
+        messages = [ self.ms.encode_record_with_schema_id(i, r) for i, r in records ]
+
+        # messages packed one after another
+        packed = bytearray('junk' + ''.join(messages))
+        for buf in [packed, memoryview(packed), str(packed)]:
+            offset = 4
+            for (schema_id, record), message in zip(records, messages):
+                decoded, consumed = self.ms.decode_message_from(buf, offset)
+                self.assertEqual(decoded, record)
+                self.assertEqual(consumed, len(message))
+                offset += consumed
+            self.assertEqual(offset, len(packed))
+        self.assertEqual(self.ms.decode_message(bytearray(messages[0])), records[0][1])
+
+    def test_encode_records(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        schema_id = self.client.register('test', basic)
+        records = data_gen.BASIC_ITEMS
+        expected = [ self.ms.encode_record_with_schema_id(schema_id, r) for r in records ]
+        self.assertEqual(self.ms.encode_records(schema_id, records), expected)
+
+        data, offsets = self.ms.encode_records(schema_id, records, contiguous=True)
+        self.assertEqual(data, ''.join(expected))
+        self.assertEqual(len(offsets), len(records) + 1)
+        for i, record in enumerate(records):
+            self.assertMessageIsSame(data[offsets[i]:offsets[i + 1]], record, schema_id)
+
+        self.assertEqual(self.ms.encode_records(schema_id, []), [])
+        self.assertRaises(SerializerError, self.ms.encode_records, schema_id, [records[0], 1])
+
+    def test_decode_messages(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        basic_id = self.client.register('test', basic)
+        adv_id = self.client.register('test_adv', adv)
+        writer = MessageSerializer(self.client)
+        basic_message = writer.encode_record_with_schema_id(basic_id, data_gen.BASIC_ITEMS[0])
+        adv_message = writer.encode_record_with_schema_id(adv_id, data_gen.ADVANCED_ITEMS[0])
+        messages = [ adv_message,
+                     basic_message,
+                     'abc',
+                     struct.pack('>bI', 0, 1000) + basic_message[5:],
+                     adv_message[:8],
+                     bytearray(basic_message) ]
+
+        records, errors = self.ms.decode_messages(messages)
+        self.assertEqual(records, [ data_gen.ADVANCED_ITEMS[0], data_gen.BASIC_ITEMS[0],
+                                    None, None, None, data_gen.BASIC_ITEMS[0] ])
+        self.assertEqual(sorted(errors.keys()), [2, 3, 4])
+        for error in errors.values():
+            self.assertTrue(isinstance(error, SerializerError))
+        self.assertEqual(self.ms.decode_messages([]), ([], { }))
+
+    def test_max_codecs(self):
+        ms = MessageSerializer(self.client, max_codecs=1)
+        basic_id = self.client.register('test', Util.parse_schema_from_string(data_gen.BASIC_SCHEMA))
+        adv_id = self.client.register('test_adv', Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA))
+        for schema_id, record in [(basic_id, data_gen.BASIC_ITEMS[0]),
+                                  (adv_id, data_gen.ADVANCED_ITEMS[0])]:
+            message = ms.encode_record_with_schema_id(schema_id, record)
+            self.assertEqual(ms.decode_message(message), record)
+        self.assertEqual(len(ms.id_to_writers), 1)
+        self.assertEqual(len(ms.id_to_decoder_func), 1)
+        self.assertTrue(adv_id in ms.id_to_writers)
+        self.assertEqual(ms.id_to_writers.stats.evictions, 1)
+        # backend choices are bounded too
+        self.assertEqual(len(ms.backend_choices), 1)
+        self.assertEqual(ms.backend_info().keys(), [adv_id])
+
+    def test_prefetch(self):
+        basic_id = self.client.register('test', Util.parse_schema_from_string(data_gen.BASIC_SCHEMA))
+        report = self.ms.prefetch(subjects=['test'])
+        self.assertEqual(report['ids'], [basic_id])
+        self.assertEqual(report['codecs'], 1)
+        self.assertTrue(basic_id in self.ms.id_to_writers)
+        self.assertTrue(basic_id in self.ms.id_to_decoder_func)
+        message = self.ms.encode_record_with_schema_id(basic_id, data_gen.BASIC_ITEMS[0])
+        self.assertMessageIsSame(message, data_gen.BASIC_ITEMS[0], basic_id)
+
+    def test_backend_selection(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        basic_id = self.client.register('basic', basic)
+        # a schema of its own, so marking it unsupported affects no other test
+        odd = Util.parse_schema_from_string(
+            '{"type": "record", "name": "Odd", "fields": [{"name": "a", "type": "int"}]}')
+        odd._fast_schema = (None, "fastavro cannot parse the schema: odd")
+        odd_id = self.client.register('odd', odd)
+        self.assertEqual(self.ms.backend_info(basic_id), None)
+
+        message = self.ms.encode_record_with_schema_id(basic_id, data_gen.BASIC_ITEMS[0])
+        self.assertMessageIsSame(message, data_gen.BASIC_ITEMS[0], basic_id)
+        info = self.ms.backend_info(basic_id)
+        self.assertEqual(info['policy'], 'auto')
+        if HAS_FAST:
+            self.assertEqual(info['backend'], 'fastavro')
+        else:
+            self.assertEqual(info, { 'policy' : 'auto', 'backend' : 'avro',
+                                     'reason' : "fastavro is not installed",
+                                     'writer' : 'avro', 'writer_reason' : "fastavro is not installed" })
+
+        odd_message = self.ms.encode_record_with_schema_id(odd_id, { 'a' : 1 })
+        self.assertMessageIsSame(odd_message, { 'a' : 1 }, odd_id)
+        self.assertEqual(self.ms.backend_info()[odd_id]['backend'], 'avro')
+        if HAS_FAST:
+            self.assertEqual(self.ms.backend_info(odd_id)['reason'], "fastavro cannot parse the schema: odd")
+
+        self.ms.set_backend(basic_id, 'compiled')
+        self.assertEqual(self.ms.backend_info(basic_id), None)
+        self.assertEqual(self.ms.decode_message(message), data_gen.BASIC_ITEMS[0])
+        self.assertEqual(self.ms.backend_info(basic_id)['backend'], 'compiled')
+        self.assertRaises(SerializerError, self.ms.set_backend, basic_id, 'nope')
+        self.assertRaises(SerializerError, MessageSerializer, self.client, schema_backends={ 1 : 'nope' })
+
+        if not HAS_FAST:
+            self.assertRaises(SerializerError, MessageSerializer, self.client, backend='fastavro')
+            return
+        strict = MessageSerializer(self.client, schema_backends={ odd_id : 'fastavro' })
+        self.assertRaises(SerializerError, strict.decode_message, odd_message)
+        self.assertRaises(SerializerError, strict.encode_record_with_schema_id, odd_id, { 'a' : 1 })
+        report = strict.prefetch(ids=[basic_id, odd_id])
+        self.assertEqual((report['codecs'], report['errors'].keys()), (1, [odd_id]))
+        self.assertEqual(strict.backend_info(basic_id)['backend'], 'fastavro')
+
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(TestMessageSerializer)
@@ -1,8 +1,9 @@
 import unittest2 as unittest
 import setup_test_path
 import data_gen
+import json
 
-from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.client import MockSchemaRegistryClient, ClientError
 from confluent.schemaregistry.serializers import Util
 
 class TestMockSchemaRegistryClient(unittest.TestCase):
@@ -28,6 +29,38 @@ class TestMockSchemaRegistryClient(unittest.TestCase):
         self.assertEqual(schema_id, dupe_id)
         self.assertEqual(len(client.id_to_schema), 1)
 
+    def test_equal_schema_register(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        # parse again rather than get the same object from the parse cache
+        Util.parse_cache.clear()
+        other = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        self.assertFalse(parsed is other)
+        client = self.client
+        schema_id = client.register('test', parsed)
+        # a separately parsed copy is the same schema
+        self.assertEqual(client.register('test', other), schema_id)
+        self.assertEqual(client.get_version('test', other),
+                         client.get_version('test', parsed))
+
+    def test_default_is_new_version(self):
+        plain = Util.parse_schema_from_string('"long"')
+        timestamp = Util.parse_schema_from_string('{"type" : "long", "logicalType" : "timestamp-millis"}')
+        client = self.client
+        plain_id = client.register('test', plain)
+        self.assertNotEqual(client.register('test', timestamp), plain_id)
+        self.assertEqual(client.get_all_versions('test'), [0, 1])
+
+        fields = [{ 'name' : 'a', 'type' : 'long' }]
+        record = Util.parse_schema_from_string(json.dumps({ 'type' : 'record', 'name' : 'R', 'fields' : fields }))
+        fields[0]['default'] = 1
+        with_default = Util.parse_schema_from_string(json.dumps({ 'type' : 'record', 'name' : 'R', 'fields' : fields }))
+        record_id = client.register('record', record)
+        default_id = client.register('record', with_default)
+        self.assertNotEqual(default_id, record_id)
+        self.assertEqual(client.get_version('record', record), 0)
+        self.assertEqual(client.get_version('record', with_default), 1)
+        self.assertEqual(client.get_id_for_schema('record', with_default), default_id)
+
     def test_dupe_register(self):
         parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
         subject = 'test'
@@ -96,5 +129,29 @@ class TestMockSchemaRegistryClient(unittest.TestCase):
         # latest should not change with a re-reg
         self.assertEqual(latest2, latest3)
 
+    def test_max_schemas_per_subject(self):
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        client = MockSchemaRegistryClient(max_schemas_per_subject=1)
+        client.register('test', basic)
+        # re-registering is fine
+        client.register('test', basic)
+        self.assertRaises(ClientError, client.register, 'test', adv)
+        self.assertTrue(client.register('other', adv) > 0)
+
+    def test_compatibility(self):
+        client = self.client
+        basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        advanced = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.assertFalse(client.test_compatibility('test', basic))
+        client.register('test', basic)
+        self.assertTrue(client.test_compatibility('test', basic))
+        self.assertEqual(client.get_compatibility('test'), 'BACKWARD')
+        self.assertEqual(client.update_compatibility('NONE', 'test'), 'NONE')
+        self.assertEqual(client.get_compatibility('test'), 'NONE')
+        self.assertEqual(client.get_compatibility(), 'BACKWARD')
+        self.assertTrue(client.test_compatibility('test', advanced))
+        self.assertRaises(ClientError, client.update_compatibility, 'SIDEWAYS')
+
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(BaseTest)
@@ -0,0 +1,84 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import mock_registry
+import time
+
+from confluent.schemaregistry.client import CachedSchemaRegistryClient, ClientError
+from confluent.schemaregistry.serializers import Util
+
+PRIMARY = 'http://127.0.0.1:9001'
+REPLICA = 'http://127.0.0.1:9003'
+# nothing listens here
+DEAD = 'http://127.0.0.1:9004'
+
+class TestMultiEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.primary = mock_registry.ServerThread(9001)
+        self.replica = mock_registry.ServerThread(9003)
+        self.primary.start()
+        self.replica.start()
+        time.sleep(1)
+        # replicas share their state
+        self.replica.server.registry = self.primary.server.registry
+        self.basic = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        self.schema_id = self.primary.server.registry.register('test', self.basic)
+        self.client = None
+
+    def tearDown(self):
+        if self.client:
+            self.client.close()
+        for s in [self.primary, self.replica]:
+            s.shutdown()
+            s.join()
+
+    def _read(self, times):
+        for i in range(times):
+            self.client.id_to_schema.clear()
+            self.assertEqual(self.client.get_by_id(self.schema_id), self.basic)
+
+    def _reads(self, server):
+        return server.server.counts.get(('GET', '/schemas/ids/%d' % (self.schema_id)), 0)
+
+    def test_lowest_latency(self):
+        self.primary.server.delay = 0.05
+        self.client = CachedSchemaRegistryClient([PRIMARY, REPLICA])
+        self._read(10)
+        self.assertEqual(self._reads(self.primary), 1)
+        self.assertEqual(self._reads(self.replica), 9)
+
+        # writes go to the primary
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.client.register('test', adv)
+        self.assertEqual(self.primary.server.counts[('POST', '/subjects/test/versions')], 1)
+        self.assertFalse(('POST', '/subjects/test/versions') in self.replica.server.counts)
+
+    def test_failover(self):
+        self.client = CachedSchemaRegistryClient([DEAD, REPLICA], unhealthy_period=60)
+        self._read(3)
+        self.assertEqual(self._reads(self.replica), 3)
+        stats = self.client.router.stats()
+        self.assertFalse(stats[0]['healthy'])
+        self.assertEqual(stats[0]['errors'], 1)
+        self.assertTrue(stats[1]['healthy'])
+        # writes do not fail over
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.assertRaises(ClientError, self.client.register, 'test', adv)
+
+    def test_hedged_read(self):
+        self.primary.server.delay = 0.01
+        self.replica.server.delay = 0.1
+        self.client = CachedSchemaRegistryClient([PRIMARY, REPLICA], hedge_percentile=90)
+        # gather latencies
+        self._read(12)
+        self.assertEqual(self._reads(self.replica), 1)
+
+        self.primary.server.delay = 2
+        start = time.time()
+        self._read(1)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(self._reads(self.replica), 2)
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestMultiEndpoint)
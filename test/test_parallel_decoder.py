@@ -0,0 +1,125 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import json
+import struct
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, ParallelDecoder, SerializerError, Util
+
+class CountingClient(MockSchemaRegistryClient):
+    def __init__(self):
+        super(CountingClient, self).__init__()
+        self.lookups = [ ]
+
+    def get_by_id(self, schema_id):
+        self.lookups.append(schema_id)
+        return super(CountingClient, self).get_by_id(schema_id)
+
+class TestParallelDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.client = CountingClient()
+        self.serializer = MessageSerializer(self.client)
+        basic_id = self.client.register('basic', Util.parse_schema_from_string(data_gen.BASIC_SCHEMA))
+        adv_id = self.client.register('adv', Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA))
+        self.records = [ ]
+        self.messages = [ ]
+        for i in range(30):
+            schema_id, items = (basic_id, data_gen.BASIC_ITEMS) if i % 3 else (adv_id, data_gen.ADVANCED_ITEMS)
+            record = items[i % len(items)]
+            self.records.append(record)
+            self.messages.append(self.serializer.encode_record_with_schema_id(schema_id, record))
+        self.ids = [basic_id, adv_id]
+        self.decoder = ParallelDecoder(self.client, processes=2, chunk_size=4, backend='compiled')
+        del self.client.lookups[:]
+
+    def tearDown(self):
+        self.decoder.close()
+
+    def test_in_order(self):
+        messages = list(self.messages)
+        messages[5] = '\x01' * 6
+        messages[11] = bytearray(messages[11])
+        records, errors = self.decoder.decode_messages(messages)
+        self.assertEqual(errors.keys(), [5])
+        self.assertTrue(isinstance(errors[5], SerializerError))
+        self.assertEqual(records[:5] + records[6:], self.records[:5] + self.records[6:])
+        self.assertEqual(self.decoder.decode_messages([]), ([], { }))
+
+    def test_schemas_sent_once(self):
+        self.decoder.warm(self.ids)
+        self.assertEqual(sorted(self.client.lookups), sorted(self.ids))
+        for i in range(3):
+            records, errors = self.decoder.decode_messages(self.messages)
+            self.assertEqual(records, self.records)
+        self.assertEqual(len(self.client.lookups), 2)
+        self.assertEqual([ w.schema_ids for w in self.decoder.workers ], [set(self.ids)] * 2)
+
+    def test_unknown_schema(self):
+        message = '\x00\x00\x00\x03\xe7\x02'
+        records, errors = self.decoder.decode_messages(self.messages[:2] + [message])
+        self.assertEqual(records[:2], self.records[:2])
+        self.assertEqual(errors.keys(), [2])
+
+    def test_reader_schema(self):
+        reader = json.loads(data_gen.BASIC_SCHEMA)
+        reader['fields'].append({ 'name' : 'tag', 'type' : 'string', 'default' : 'x' })
+        reader = Util.parse_schema_from_string(json.dumps(reader))
+        basic = [ m for i, m in enumerate(self.messages) if i % 3 ]
+        records, errors = self.decoder.decode_messages(basic, reader_schema=reader, fields=['name', 'tag'])
+        self.assertEqual(errors, { })
+        self.assertEqual(records, [ { 'name' : r['name'], 'tag' : 'x' }
+                                    for i, r in enumerate(self.records) if i % 3 ])
+
+    def test_back_pressure(self):
+        pulled = [ ]
+        def batches():
+            for i in range(10):
+                pulled.append(i)
+                yield self.messages[i * 3:i * 3 + 3]
+        results = self.decoder.imap(batches())
+        self.assertEqual(next(results), (self.records[:3], { }))
+        # two workers with two chunks each in flight
+        self.assertTrue(len(pulled) <= 5)
+        self.assertEqual([ r for rs, e in results for r in rs ], self.records[3:])
+
+    def test_stop_early(self):
+        batches = [ self.messages[i:i + 3] for i in range(0, 30, 3) ]
+        for records, errors in self.decoder.imap(batches):
+            break
+        self.assertEqual(self.decoder.decode_messages(self.messages), (self.records, { }))
+        # a run left open is skipped by the next one
+        results = self.decoder.imap(batches)
+        self.assertEqual(next(results), (self.records[:3], { }))
+        self.assertEqual(self.decoder.decode_messages(self.messages[:4]), (self.records[:4], { }))
+        self.assertRaises(SerializerError, list, results)
+        self.assertEqual(self.decoder.decode_messages(self.messages), (self.records, { }))
+
+    def test_schema_registered_later(self):
+        schema = json.loads(data_gen.BASIC_SCHEMA)
+        schema['name'] = 'Later'
+        schema = Util.parse_schema_from_string(json.dumps(schema))
+        schema_id = max(self.ids) + 1
+        message = '\x00' + struct.pack('>I', schema_id) + self.messages[1][5:]
+        records, errors = self.decoder.decode_messages([message] * 2)
+        self.assertEqual(sorted(errors.keys()), [0, 1])
+        self.assertEqual(self.client.register('later', schema), schema_id)
+        records, errors = self.decoder.decode_messages([message] * 2)
+        self.assertEqual((records, errors), ([self.records[1]] * 2, { }))
+
+    def test_large_chunks(self):
+        # chunks and results larger than the pipe buffers in both directions
+        adv_id = self.ids[1]
+        records = data_gen.ADVANCED_ITEMS * (3000 / len(data_gen.ADVANCED_ITEMS))
+        messages = self.serializer.encode_records(adv_id, records)
+        with ParallelDecoder(self.client, processes=1, chunk_size=1000) as decoder:
+            self.assertEqual(decoder.decode_messages(messages), (records, { }))
+
+    def test_closed(self):
+        self.decoder.close()
+        self.assertRaises(SerializerError, self.decoder.decode_messages, self.messages)
+        self.assertRaises(SerializerError, ParallelDecoder, self.client, processes=1, backend='nope')
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestParallelDecoder)
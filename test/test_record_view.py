@@ -0,0 +1,102 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import collections
+import json
+import struct
+
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import MessageSerializer, SerializerError, Util
+from confluent.schemaregistry.serializers.RecordView import RecordView
+from confluent.schemaregistry.serializers.SchemaCompiler import compile_view
+from test_fast_encode import CASES, slow_encode
+
+NODE_SCHEMA = [ s for s, records in CASES if '"Node"' in s ][0]
+
+class TestRecordView(unittest.TestCase):
+
+    def test_same_as_eager(self):
+        for schema_str, records in CASES:
+            schema = Util.parse_schema_from_string(schema_str)
+            if schema.type != 'record':
+                continue
+            layout = compile_view(schema)
+            for record in records:
+                data = slow_encode(schema, record)
+                view = layout.view(data)
+                self.assertTrue(isinstance(view, collections.Mapping))
+                self.assertEqual(view, record)
+                self.assertEqual(view.materialize(), record)
+                self.assertEqual(sorted(view.keys()), sorted(record.keys()))
+                self.assertEqual(len(view), len(record))
+                self.assertEqual(view.end(), len(data))
+
+    def test_decodes_on_access(self):
+        schema = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        record = data_gen.ADVANCED_ITEMS[0]
+        view = compile_view(schema).view(slow_encode(schema, record))
+        self.assertEqual(view._values, { })
+        self.assertEqual(view['family'], record['family'])
+        # the offsets of every field up to family were found on the way
+        self.assertEqual(len(view._offsets), 5)
+        self.assertEqual(view._values.keys(), ['family'])
+        self.assertEqual(view['name'], record['name'])
+        self.assertTrue(view['family'] is view['family'])
+        self.assertTrue('name' in view)
+        self.assertFalse('nope' in view)
+        self.assertEqual(view.get('nope', 1), 1)
+        self.assertRaises(KeyError, lambda: view['nope'])
+        self.assertEqual(dict(view.items()), record)
+        self.assertNotEqual(view, { })
+
+    def test_nested_views(self):
+        schema = Util.parse_schema_from_string(NODE_SCHEMA)
+        record = { 'value' : 1, 'next' : { 'value' : 2, 'next' : None } }
+        view = compile_view(schema).view('\x00' + slow_encode(schema, record), 1)
+        self.assertTrue(isinstance(view['next'], RecordView))
+        self.assertEqual(view['next']['value'], 2)
+        self.assertEqual(view['next'], record['next'])
+        self.assertEqual(view.end(), len(slow_encode(schema, record)) + 1)
+
+    def test_reader_schema(self):
+        writer = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        reader = json.loads(data_gen.BASIC_SCHEMA)
+        reader['fields'].append({ 'name' : 'tags', 'type' : { 'type' : 'array', 'items' : 'string' },
+                                  'default' : ['a'] })
+        reader = Util.parse_schema_from_string(json.dumps(reader))
+        layout = compile_view(writer, reader, ['name', 'tags'])
+        record = data_gen.BASIC_ITEMS[0]
+        view = layout.view(slow_encode(writer, record))
+        self.assertEqual(view.keys(), ['name', 'tags'])
+        self.assertEqual(view, { 'name' : record['name'], 'tags' : ['a'] })
+        # defaults are not shared between views
+        view['tags'].append('b')
+        self.assertEqual(layout.view(slow_encode(writer, record))['tags'], ['a'])
+
+    def test_serializer(self):
+        client = MockSchemaRegistryClient()
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        schema_id = client.register('test', adv)
+        serializer = MessageSerializer(client)
+        messages = serializer.encode_records(schema_id, data_gen.ADVANCED_ITEMS)
+        for record, message in zip(data_gen.ADVANCED_ITEMS, messages):
+            view = serializer.decode_message(message, lazy=True)
+            self.assertEqual(view['name'], record['name'])
+            self.assertEqual(view, record)
+            self.assertEqual(serializer.decode_message(bytearray(message), lazy=True), record)
+            self.assertEqual(serializer.decode_message(message, fields=['name'], lazy=True),
+                             { 'name' : record['name'] })
+        packed = ''.join(messages)
+        view, size = serializer.decode_message_from(memoryview(packed), len(messages[0]), lazy=True)
+        self.assertEqual((view, size), (data_gen.ADVANCED_ITEMS[1], len(messages[1])))
+        records, errors = serializer.decode_messages(messages + ['\x01' * 6], lazy=True)
+        self.assertEqual(records[:-1], data_gen.ADVANCED_ITEMS)
+        self.assertEqual(errors.keys(), [len(messages)])
+        self.assertTrue((schema_id, None, None, 'lazy') in serializer.id_to_decoder_func)
+
+        int_id = client.register('ints', Util.parse_schema_from_string('"int"'))
+        message = struct.pack('>bI', 0, int_id) + '\x02'
+        self.assertRaises(SerializerError, serializer.decode_message, message, lazy=True)
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestRecordView)
@@ -0,0 +1,245 @@
+import unittest2 as unittest
+import setup_test_path
+import data_gen
+import StringIO
+import cStringIO
+import collections
+import json
+
+from avro import io
+from confluent.schemaregistry.client import MockSchemaRegistryClient
+from confluent.schemaregistry.serializers import BACKENDS, MessageSerializer, SerializerError, Util
+from confluent.schemaregistry.serializers.SchemaCompiler import compile_resolver, compile_schema
+from test_fast_encode import CASES, UNION_CASES, slow_encode
+
+def _record(name, *fields):
+    return { 'type' : 'record', 'name' : name, 'fields' : list(fields) }
+
+# (writer schema, reader schema, records) resolved with the avro schema resolution rules
+RESOLUTION_CASES = [
+    ('"int"', '"long"', [1, -2 ** 31]),
+    ('"int"', '"double"', [3]),
+    ('"long"', '"float"', [2 ** 40]),
+    ('"float"', '"double"', [1.5]),
+    ('"long"', '["null", "string", "double"]', [7]),
+    ('["null", "int"]', '["null", "long"]', [None, 5]),
+    ('{"type" : "enum", "name" : "E", "symbols" : ["A", "B"]}',
+     '{"type" : "enum", "name" : "E", "symbols" : ["C", "B", "A"]}', ['A', 'B']),
+    (json.dumps({ 'type' : 'map', 'values' : { 'type' : 'array', 'items' :
+        _record('P', { 'name' : 'a', 'type' : 'int' }, { 'name' : 'b', 'type' : 'int' }) } }),
+     json.dumps({ 'type' : 'map', 'values' : { 'type' : 'array', 'items' :
+        _record('P', { 'name' : 'b', 'type' : 'long' }) } }),
+     [{ 'k' : [{ 'a' : 1, 'b' : 2 }, { 'a' : 3, 'b' : 4 }], 'l' : [] }]),
+    # fields removed, added with defaults and reordered
+    (json.dumps(_record('R', { 'name' : 'a', 'type' : 'int' },
+                  { 'name' : 'b', 'type' : { 'type' : 'array', 'items' : 'string' } },
+                  { 'name' : 'c', 'type' : { 'type' : 'map', 'values' : ['null', 'bytes'] } },
+                  { 'name' : 'old', 'type' : 'string' },
+                  { 'name' : 'd', 'type' : _record('S', { 'name' : 'x', 'type' : 'double' }) })),
+     json.dumps(_record('R', { 'name' : 'old', 'type' : 'string' },
+                  { 'name' : 'a', 'type' : 'long' },
+                  { 'name' : 'e', 'type' : 'int', 'default' : 3 },
+                  { 'name' : 'f', 'type' : { 'type' : 'array', 'items' : 'int' }, 'default' : [1] })),
+     [{ 'a' : 1, 'b' : ['x', 'y'], 'c' : { 'k' : None, 'l' : 'v' }, 'old' : 'o', 'd' : { 'x' : 2.5 } },
+      { 'a' : 2, 'b' : [], 'c' : { }, 'old' : '', 'd' : { 'x' : 0.0 } }]),
+]
+
+def slow_decode(schema, data, reader=None):
+    reader = io.DatumReader(schema, reader)
+    return reader.read(io.BinaryDecoder(cStringIO.StringIO(data)))
+
+class TestSchemaCompiler(unittest.TestCase):
+
+    def test_same_as_avro(self):
+        for schema_str, records in CASES + UNION_CASES:
+            schema = Util.parse_schema_from_string(schema_str)
+            codec = compile_schema(schema)
+            for record in records:
+                expected = slow_encode(schema, record)
+                encoded = codec.encode(record)
+                self.assertEqual(encoded, expected, "%s %r" % (schema_str, record))
+                self.assertEqual(codec.decode(encoded), (slow_decode(schema, expected),
+                                                         len(expected)))
+
+    def test_memoized(self):
+        schema = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.assertTrue(compile_schema(schema) is compile_schema(schema))
+
+    def test_invalid(self):
+        codec = compile_schema(Util.parse_schema_from_string('["null", "long"]'))
+        self.assertRaises(io.AvroTypeException, codec.encode, 'nope')
+
+    def test_invalid_values(self):
+        # values avro.io.DatumWriter rejects, and edge cases it accepts
+        cases = [
+            ('"null"', [0, ''], []),
+            ('"boolean"', [1, None, 'x'], []),
+            ('"int"', [2 ** 40, 2 ** 31, 1.5, '1', None], [True, -2 ** 31, 2 ** 31 - 1]),
+            ('"long"', [2 ** 70, -2 ** 63 - 1, 1.5, None], [2 ** 63 - 1, False]),
+            ('"float"', ['1', None], [1, 2 ** 40, True]),
+            ('"double"', ['1', None, []], [3, 1.5]),
+            ('"bytes"', [u'abc', 5, None], ['']),
+            ('"string"', [5, None, ['a']], ['abc', u'\xe9']),
+            ('{"type" : "fixed", "name" : "F", "size" : 4}', ['ab', 'abcde', u'abcd', None], ['abcd']),
+            ('{"type" : "enum", "name" : "E", "symbols" : ["A", "B"]}', ['C', None, ['A'], 0], [u'A']),
+            ('{"type" : "array", "items" : "int"}', [(1, 2), [1, 'x'], None], [[]]),
+            ('{"type" : "map", "values" : "int"}', [[], { 1 : 1 }, { 'a' : 'x' }], [{ u'a' : 1 }]),
+            (json.dumps(_record('R', { 'name' : 'a', 'type' : 'int' }, { 'name' : 'b', 'type' : ['null', 'int'] })),
+             [[], { 'b' : 1 }, { 'a' : 'x' }, None], [{ 'a' : 1 }, collections.OrderedDict(a=1, b=2)]),
+            ('["null", "int"]', [2 ** 40, 'x'], [None, 1]),
+        ]
+        for schema_str, invalid, valid in cases:
+            schema = Util.parse_schema_from_string(schema_str)
+            codec = compile_schema(schema)
+            for value in invalid:
+                self.assertRaises(io.AvroTypeException, slow_encode, schema, value)
+                self.assertRaises(io.AvroTypeException, codec.encode, value)
+            for value in valid:
+                self.assertEqual(codec.encode(value), slow_encode(schema, value), "%s %r" % (schema_str, value))
+
+    def test_read_in_place(self):
+        class NoRead(StringIO.StringIO):
+            def read(self, n=-1):
+                raise AssertionError("payload copied")
+        schema = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        codec = compile_schema(schema)
+        encoded = [ codec.encode(r) for r in data_gen.ADVANCED_ITEMS ]
+        payload = NoRead(''.join(encoded))
+        for record, data in zip(data_gen.ADVANCED_ITEMS, encoded):
+            start = payload.tell()
+            self.assertEqual(codec.read(payload), record)
+            self.assertEqual(payload.tell(), start + len(data))
+        payload = cStringIO.StringIO('x' + encoded[0] + encoded[1])
+        payload.seek(1)
+        self.assertEqual(codec.read(payload), data_gen.ADVANCED_ITEMS[0])
+        self.assertEqual(payload.tell(), 1 + len(encoded[0]))
+
+    def test_serializer_backend(self):
+        client = MockSchemaRegistryClient()
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        schema_id = client.register('test', adv)
+        compiled = MessageSerializer(client, backend='compiled')
+        avro = MessageSerializer(client, backend='avro')
+        for record in data_gen.ADVANCED_ITEMS:
+            message = compiled.encode_record_with_schema_id(schema_id, record)
+            self.assertEqual(message, avro.encode_record_with_schema_id(schema_id, record))
+            self.assertEqual(compiled.decode_message(message), record)
+            self.assertEqual(compiled.decode_message(bytearray(message)), record)
+            self.assertEqual(avro.decode_message(message), record)
+
+        messages = compiled.encode_records(schema_id, data_gen.ADVANCED_ITEMS)
+        self.assertEqual(compiled.decode_messages(messages), (data_gen.ADVANCED_ITEMS, { }))
+        packed = ''.join(messages)
+        for buf in (packed, bytearray(packed), buffer(packed), memoryview(packed)):
+            self.assertEqual(compiled.decode_message_from(buf, len(messages[0])),
+                             (data_gen.ADVANCED_ITEMS[1], len(messages[1])))
+        self.assertEqual(compiled.decode_messages([ buffer(m) for m in messages ]),
+                         (data_gen.ADVANCED_ITEMS, { }))
+        self.assertRaises(SerializerError, MessageSerializer, client, backend='nope')
+
+    def test_resolution_same_as_avro(self):
+        for writer_str, reader_str, records in RESOLUTION_CASES:
+            writer = Util.parse_schema_from_string(writer_str)
+            reader = Util.parse_schema_from_string(reader_str)
+            codec = compile_resolver(writer, reader)
+            for record in records:
+                data = slow_encode(writer, record)
+                self.assertEqual(codec.decode(data), (slow_decode(writer, data, reader), len(data)),
+                                 "%s %s %r" % (writer_str, reader_str, record))
+        self.assertTrue(compile_resolver(writer) is compile_schema(writer))
+        # field aliases, promotions of items and between string and bytes are newer than avro.io
+        renamed = compile_resolver(Util.parse_schema_from_string(json.dumps(
+            _record('R', { 'name' : 'old', 'type' : 'int' }))), Util.parse_schema_from_string(json.dumps(
+            _record('R', { 'name' : 'new', 'type' : 'int', 'aliases' : ['old'] }))))
+        self.assertEqual(renamed.decode('\x02'), ({ 'new' : 1 }, 1))
+        items = compile_resolver(Util.parse_schema_from_string('{"type" : "array", "items" : "int"}'),
+                                 Util.parse_schema_from_string('{"type" : "array", "items" : "double"}'))
+        self.assertEqual(items.decode('\x04\x02\x04\x00'), ([1.0, 2.0], 4))
+        string = Util.parse_schema_from_string('"string"')
+        raw = Util.parse_schema_from_string('"bytes"')
+        self.assertEqual(compile_resolver(string, raw).decode('\x04\xc3\xa9'), ('\xc3\xa9', 3))
+        self.assertEqual(compile_resolver(raw, string).decode('\x04\xc3\xa9'), (u'\xe9', 3))
+
+    def test_resolution_errors(self):
+        def resolver(writer, reader, fields=None):
+            return compile_resolver(Util.parse_schema_from_string(json.dumps(writer)),
+                                    Util.parse_schema_from_string(json.dumps(reader)), fields)
+        self.assertRaises(io.SchemaResolutionException, resolver, 'long', 'int')
+        self.assertRaises(io.SchemaResolutionException, resolver,
+                          _record('R', { 'name' : 'a', 'type' : 'int' }),
+                          _record('R', { 'name' : 'b', 'type' : 'int' }))
+        self.assertRaises(io.SchemaResolutionException, resolver,
+                          _record('R', { 'name' : 'a', 'type' : 'int' }),
+                          _record('R', { 'name' : 'a', 'type' : 'int' }), ['b'])
+        self.assertRaises(io.SchemaResolutionException, resolver, 'int', 'int', ['a'])
+        # failures that depend on the data are raised when decoding
+        codec = resolver(['int', 'string'], 'long')
+        self.assertEqual(codec.decode('\x00\x04'), (2, 2))
+        self.assertRaises(io.SchemaResolutionException, codec.decode, '\x02\x02a')
+        codec = resolver({ 'type' : 'enum', 'name' : 'E', 'symbols' : ['A', 'B'] },
+                         { 'type' : 'enum', 'name' : 'E', 'symbols' : ['A'] })
+        self.assertEqual(codec.decode('\x00'), ('A', 1))
+        self.assertRaises(io.SchemaResolutionException, codec.decode, '\x02')
+
+    def test_projection(self):
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        codec = compile_resolver(adv, fields=['name', 'family'])
+        self.assertTrue('def s' in codec.source)
+        for record in data_gen.ADVANCED_ITEMS:
+            data = slow_encode(adv, record)
+            expected = { 'name' : record['name'], 'family' : record['family'] }
+            self.assertEqual(codec.decode(data), (expected, len(data)))
+
+    def test_skip_sized_blocks(self):
+        writer = Util.parse_schema_from_string(json.dumps(
+            _record('R', { 'name' : 'a', 'type' : { 'type' : 'array', 'items' : 'long' } },
+                         { 'name' : 'b', 'type' : 'int' })))
+        codec = compile_resolver(writer, fields=['b'])
+        # a block of 2 items with its byte size, then a block of 1 without
+        data = '\x03\x04\x02\x04' + '\x02\x06' + '\x00' + '\x0a'
+        self.assertEqual(codec.decode(data), ({ 'b' : 5 }, len(data)))
+
+    def test_serializer_reader_schema(self):
+        client = MockSchemaRegistryClient()
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        schema_id = client.register('test', adv)
+        reader = json.loads(data_gen.ADVANCED_SCHEMA)
+        reader['fields'] = reader['fields'][:3] + [ { 'name' : 'extra', 'type' : 'int', 'default' : 1 } ]
+        reader = Util.parse_schema_from_string(json.dumps(reader))
+        for backend in BACKENDS:
+            serializer = MessageSerializer(client, backend=backend)
+            messages = serializer.encode_records(schema_id, data_gen.ADVANCED_ITEMS)
+            for record, message in zip(data_gen.ADVANCED_ITEMS, messages):
+                expected = dict(record, extra=1)
+                del expected['family']
+                self.assertEqual(serializer.decode_message(message, reader), expected)
+                self.assertEqual(serializer.decode_message(bytearray(message), fields=['number']),
+                                 { 'number' : record['number'] })
+                self.assertEqual(serializer.decode_message(message), record)
+            records, errors = serializer.decode_messages(messages, reader_schema=reader, fields=['extra'])
+            self.assertEqual((records, errors), ([ { 'extra' : 1 } ] * len(messages), { }))
+            self.assertTrue((schema_id, Util.full_fingerprint(reader), None, None) in serializer.id_to_decoder_func)
+            self.assertTrue((schema_id, None, ('number',), None) in serializer.id_to_decoder_func)
+            self.assertRaises(SerializerError, serializer.decode_message, messages[0], fields=['nope'])
+
+    def test_serializer_reader_attributes(self):
+        # readers differing only by defaults or aliases get their own decoders
+        client = MockSchemaRegistryClient()
+        writer = Util.parse_schema_from_string(json.dumps(_record('R', { 'name' : 'x', 'type' : 'int' })))
+        schema_id = client.register('test', writer)
+        serializer = MessageSerializer(client, max_codecs=2)
+        message = serializer.encode_record_with_schema_id(schema_id, { 'x' : 5 })
+        def reader(**extra):
+            return Util.parse_schema_from_string(json.dumps(_record('R', dict({ 'name' : 'z', 'type' : 'int',
+                                                                                 'default' : 9 }, **extra))))
+        for lazy in (False, True):
+            for default, aliases, expected in [(1, [], 1), (2, [], 2), (9, [], 9), (9, ['x'], 5)]:
+                decoded = serializer.decode_message(message, reader(default=default, aliases=aliases),
+                                                    lazy=lazy)
+                self.assertEqual(decoded, { 'z' : expected })
+        # kept in the serializer's bounded cache, not on the schema
+        self.assertEqual(len(serializer.id_to_decoder_func), 2)
+        self.assertFalse(set(['_compiled_resolvers', '_compiled_views']) & set(writer.__dict__))
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestSchemaCompiler)
@@ -0,0 +1,54 @@
+import unittest2 as unittest
+import setup_test_path
+import threading
+import time
+
+from confluent.schemaregistry.SingleFlight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = []
+
+    def _slow(self, value):
+        self.calls.append(value)
+        time.sleep(0.2)
+        if value == 'error':
+            raise ValueError(value)
+        return value
+
+    def _run(self, key, value, results):
+        try:
+            results.append(self.flights.do(key, self._slow, value))
+        except ValueError as e:
+            results.append(e)
+
+    def _run_threads(self, key, value, count=8):
+        results = []
+        threads = [ threading.Thread(target=self._run, args=(key, value, results))
+                    for i in range(count) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_coalesce(self):
+        results = self._run_threads('a', 'value')
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, ['value'])
+        self.assertEqual(self.flights.in_flight(), 0)
+        # finished calls are not remembered
+        self.assertEqual(self.flights.do('a', lambda: 'again'), 'again')
+
+    def test_error(self):
+        results = self._run_threads('a', 'error')
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(isinstance(results[0], ValueError))
+        self.assertEqual(self.calls, ['error'])
+        self.assertEqual(self.flights.in_flight(), 0)
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestSingleFlight)
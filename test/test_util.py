@@ -1,5 +1,9 @@
 import unittest2 as unittest
 import data_gen
+import json
+import os
+import shutil
+import tempfile
 
 from avro import schema
 from confluent.schemaregistry.serializers import Util
@@ -13,5 +17,66 @@ class TestUtil(unittest.TestCase):
         parsed = Util.parse_schema_from_file(data_gen.get_schema_path('adv_schema.avsc'))
         self.assertTrue(isinstance(parsed, schema.Schema))
 
+    def test_parse_cache(self):
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        self.assertTrue(Util.parse_schema_from_string(data_gen.BASIC_SCHEMA) is parsed)
+        # whitespace and key order do not matter
+        reordered = json.dumps(json.loads(data_gen.BASIC_SCHEMA), indent=4, sort_keys=True)
+        self.assertTrue(Util.parse_schema_from_string(reordered) is parsed)
+        self.assertRaises(Exception, Util.parse_schema_from_string, '{"type" : "nope"}')
+
+    def test_file_cache(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'schema.avsc')
+            with open(path, 'w') as f:
+                f.write('"int"')
+            parsed = Util.parse_schema_from_file(path)
+            self.assertTrue(Util.parse_schema_from_file(path) is parsed)
+            with open(path, 'w') as f:
+                f.write('"long"')
+            os.utime(path, (0, 0))
+            self.assertEqual(Util.parse_schema_from_file(path).type, 'long')
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_canonical_form(self):
+        parsed = Util.parse_schema_from_string('{"type" : "int", "doc" : "an int"}')
+        self.assertEqual(Util.canonical_form(parsed), '"int"')
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        expected = ('{"name":"python.test.basic.basic","type":"record","fields":['
+                    '{"name":"number","type":["long","null"]},'
+                    '{"name":"name","type":["string"]}]}')
+        self.assertEqual(Util.canonical_form(parsed), expected)
+
+    def test_fingerprint(self):
+        # values from the avro specification test suite
+        self.assertEqual(Util.fingerprint(schema.parse('"int"')), 8247732601305521295)
+        self.assertEqual(Util.fingerprint(schema.parse('"null"')), 7195948357588979594)
+
+        parsed = Util.parse_schema_from_string(data_gen.BASIC_SCHEMA)
+        # same structure, different docs and namespace spelling
+        other = Util.parse_schema_from_string(json.dumps({
+            "name" : "python.test.basic.basic",
+            "type" : "record",
+            "fields" : [
+                { "name" : "number", "type" : ["long", "null"] },
+                { "name" : "name", "type" : ["string"], "doc" : "other doc" }
+            ]
+        }))
+        self.assertEqual(Util.fingerprint(parsed), Util.fingerprint(other))
+        adv = Util.parse_schema_from_string(data_gen.ADVANCED_SCHEMA)
+        self.assertNotEqual(Util.fingerprint(parsed), Util.fingerprint(adv))
+
+    def test_full_fingerprint(self):
+        def field(**extra):
+            return Util.parse_schema_from_string(json.dumps({
+                "type" : "record", "name" : "R",
+                "fields" : [ dict({ "name" : "a", "type" : "int" }, **extra) ] }))
+        plain, default, aliased = field(), field(default=1), field(aliases=["b"])
+        self.assertEqual(Util.fingerprint(plain), Util.fingerprint(default))
+        self.assertEqual(len(set(Util.full_fingerprint(s) for s in (plain, default, aliased))), 3)
+        self.assertEqual(Util.full_fingerprint(field(default=1)), Util.full_fingerprint(default))
+
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(TestUtil)